@@ -1,6 +1,7 @@
 import os
+import threading
 import pandas as pd
-from flask import Flask, render_template, redirect, url_for, flash, request
+from flask import Flask, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import LoginManager, current_user, login_user, logout_user, login_required
 from werkzeug.urls import url_parse
 
@@ -68,17 +69,98 @@ def register():
     
     return render_template('register.html', title='Register', form=form)
 
+ROUTES_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'optimiser', 'sample_routes.csv')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class DataFrameCache:
+    """Process-level cache of a CSV file, reloaded only when its mtime or size changes"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # (signature, frame, sorted frames of that frame), swapped in one assignment on reload
+        self._state = (None, None, {})
+
+    def _current(self):
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        state = self._state
+        if signature != state[0]:
+            with self._lock:
+                # Another thread may have reloaded while we waited for the lock
+                state = self._state
+                if signature != state[0]:
+                    state = (signature, pd.read_csv(self.path), {})
+                    self._state = state
+        return state[1], state[2]
+
+    def get(self):
+        return self._current()[0]
+
+    def sorted_by(self, column, ascending=True):
+        """Return the frame sorted by column, memoising each sort order until the next reload"""
+        df, sorted_frames = self._current()
+        if column not in df.columns:
+            return df
+        key = (column, ascending)
+        if key not in sorted_frames:
+            sorted_frames[key] = df.sort_values(column, ascending=ascending, kind='mergesort',
+                                                ignore_index=True)
+        return sorted_frames[key]
+
+
+routes_cache = DataFrameCache(ROUTES_CSV)
+
+
+def get_routes_page(args):
+    """Slice one page of the cached routes frame using page/per_page/sort/order query args"""
+    df = routes_cache.get()
+    sort = args.get('sort', '')
+    order = args.get('order', 'asc')
+    if sort in df.columns:
+        df = routes_cache.sorted_by(sort, ascending=(order != 'desc'))
+    else:
+        sort = ''
+
+    per_page = min(max(args.get('per_page', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    total = len(df)
+    pages = max((total + per_page - 1) // per_page, 1)
+    page = min(max(args.get('page', 1, type=int), 1), pages)
+
+    start = (page - 1) * per_page
+    page_df = df.iloc[start:start + per_page]
+    # NaN is not valid JSON, so blank cells become None
+    rows = page_df.astype(object).where(page_df.notna(), None).to_dict('records')
+
+    return {
+        'columns': df.columns.tolist(),
+        'rows': rows,
+        'page': page,
+        'per_page': per_page,
+        'pages': pages,
+        'total': total,
+        'sort': sort,
+        'order': order,
+    }
+
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    # Load the flight data from CSV
-    csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 
-                          'optimiser', 'sample_routes.csv')
-    
-    df = pd.read_csv(csv_path)
-    return render_template('dashboard.html', title='Flight Data Dashboard', 
-                           routes=df.to_dict('records'),
-                           columns=df.columns.tolist())
+    # Only the requested page of the cached flight data is rendered
+    data = get_routes_page(request.args)
+    return render_template('dashboard.html', title='Flight Data Dashboard',
+                           routes=data['rows'],
+                           columns=data['columns'],
+                           pagination=data)
+
+@app.route('/api/routes')
+@login_required
+def routes_api():
+    """JSON endpoint for lazily loading pages of the dashboard table"""
+    return jsonify(get_routes_page(request.args))
 
 @app.before_first_request
 def create_tables():
@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'optimiser.logs.RequestIdMiddleware',  # X-Request-ID on every response and log record
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add whitenoise for static files
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -56,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'optimiser.profiling.ProfilingMiddleware',  # Opt-in: ?profile=1 for staff, or the X-Profile header
 ]
 
 ROOT_URLCONF = 'flightcode.urls'
@@ -94,6 +96,28 @@ else:
         }
     }
 
+# Shared cache for all workers: Redis when REDIS_URL is set (needs the redis package),
+# otherwise each process has its own in-memory cache
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+            'KEY_PREFIX': 'flightcode',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# In-process LRU in front of the shared cache for read-heavy views (see optimiser/caching.py)
+TIERED_CACHE_LOCAL_ENTRIES = int(os.environ.get('TIERED_CACHE_LOCAL_ENTRIES', 2000))
+TIERED_CACHE_LOCAL_TTL = int(os.environ.get('TIERED_CACHE_LOCAL_TTL', 60))
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -125,5 +149,51 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Emission records are queued in memory and written in batches by a background thread
+EMISSION_WRITE_BEHIND = {
+    'ENABLED': os.environ.get('EMISSION_WRITE_BEHIND', 'True').lower() == 'true',
+    'MAX_SIZE': int(os.environ.get('EMISSION_WRITE_BEHIND_MAX_SIZE', 10000)),
+    'BATCH_SIZE': int(os.environ.get('EMISSION_WRITE_BEHIND_BATCH_SIZE', 500)),
+    'FLUSH_INTERVAL': float(os.environ.get('EMISSION_WRITE_BEHIND_FLUSH_INTERVAL', 2.0)),
+}
+
+# Background job queue, run with `python manage.py runworker`
+JOB_WORKER_PROCESSES = int(os.environ.get('JOB_WORKER_PROCESSES', 2))
+JOB_RETRY_DELAY = 30  # seconds, doubled after each failed attempt
+
+# On-demand profiling of requests and management commands (see optimiser/profiling.py)
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')  # send as "X-Profile: <token>" or "<token>:sample"
+
+# Structured JSON logs, written by a background thread (see optimiser/logs.py)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_SAMPLING = {
+    # Fraction of records kept per event; warnings and errors are always kept
+    'http.request': float(os.environ.get('LOG_SAMPLE_HTTP', 1.0)),
+    'optimise.request': float(os.environ.get('LOG_SAMPLE_OPTIMISE', 0.1)),
+    'optimise.lookup': float(os.environ.get('LOG_SAMPLE_OPTIMISE_LOOKUP', 0.01)),
+}
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {'()': 'optimiser.logs.RequestIdFilter'},
+        'sampling': {'()': 'optimiser.logs.SamplingFilter', 'rates': LOG_SAMPLING},
+    },
+    'handlers': {
+        'async_json': {
+            'class': 'optimiser.logs.AsyncHandler',
+            'max_size': int(os.environ.get('LOG_QUEUE_SIZE', 10000)),
+            'filters': ['request_id', 'sampling'],
+        },
+    },
+    'root': {'handlers': ['async_json'], 'level': LOG_LEVEL},
+    'loggers': {
+        'django': {'level': os.environ.get('DJANGO_LOG_LEVEL', 'INFO').upper()},
+        'optimiser': {'level': os.environ.get('OPTIMISER_LOG_LEVEL', LOG_LEVEL).upper()},
+    },
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
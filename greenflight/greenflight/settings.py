@@ -93,6 +93,22 @@ STATIC_URL = 'static/'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Emission records are queued in memory and written in batches by a background thread
+EMISSION_WRITE_BEHIND = {
+    'ENABLED': True,
+    'MAX_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 2.0,
+}
+
+# Routes computed for unknown (origin, destination, aircraft) requests. They are only saved
+# when PERSIST is true; computed routes and unknown cities are cached for the given seconds
+COMPUTED_ROUTES = {
+    'PERSIST': False,
+    'CACHE_TTL': 3600,
+    'NEGATIVE_CACHE_TTL': 300,
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
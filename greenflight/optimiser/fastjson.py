@@ -0,0 +1,89 @@
+"""
+Fast serialisation for large API responses: FieldPlan, the orjson and msgpack
+renderers and fast_response() for plain Django views.
+
+FieldPlan and the renderers are a copy of optimiser/fastjson.py in the flightcode
+project, which explains them. Both projects have an app named optimiser, so
+neither can import the other's. Change both copies together.
+"""
+from django.http import HttpResponse
+from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+
+class FieldPlan:
+    """Precompiled list of output keys and the model attributes they come from"""
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.keys = tuple(fields)
+        # Foreign keys are output as their id, read from the <name>_id column
+        self.columns = tuple(
+            model._meta.get_field(name).attname for name in fields
+        )
+
+    def rows(self, queryset):
+        """List of dicts for every row of the queryset, from one values_list() query"""
+        keys = self.keys
+        return [dict(zip(keys, row)) for row in queryset.values_list(*self.columns)]
+
+
+def _default(value):
+    # Decimals, lazy translation strings, querysets and the like: same as DRF's JSON output
+    return JSONEncoder().default(value)
+
+
+if orjson is not None:
+    class ORJSONRenderer(BaseRenderer):
+        """JSON with orjson, several times faster than the standard library encoder"""
+        media_type = 'application/json'
+        format = 'json'
+        charset = None
+
+        def render(self, data, accepted_media_type=None, renderer_context=None):
+            if data is None:
+                return b''
+            return orjson.dumps(data, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+else:
+    ORJSONRenderer = JSONRenderer
+
+
+if msgpack is not None:
+    class MessagePackRenderer(BaseRenderer):
+        """Binary MessagePack responses for clients that ask for application/msgpack"""
+        media_type = 'application/msgpack'
+        format = 'msgpack'
+        charset = None
+        render_style = 'binary'
+
+        def render(self, data, accepted_media_type=None, renderer_context=None):
+            if data is None:
+                return b''
+            return msgpack.packb(data, default=_default, use_bin_type=True)
+else:
+    MessagePackRenderer = None
+
+
+# For views with heavy responses: fast JSON first (the default), the browsable API for
+# browsers, then MessagePack when it is installed
+FAST_RENDERERS = [ORJSONRenderer, BrowsableAPIRenderer] + ([MessagePackRenderer] if MessagePackRenderer else [])
+
+
+def fast_response(request, data, status=200):
+    """HttpResponse negotiated from the Accept header: MessagePack when asked for and available, else JSON"""
+    accept = request.headers.get('Accept', '')
+    if MessagePackRenderer and any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES):
+        return HttpResponse(MessagePackRenderer().render(data), content_type='application/msgpack', status=status)
+    return HttpResponse(ORJSONRenderer().render(data), content_type='application/json', status=status)
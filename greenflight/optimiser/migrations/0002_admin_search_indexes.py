@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimiser', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flightroute',
+            index=models.Index(fields=['destination'], name='flightroute_destination_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flightroute',
+            index=models.Index(fields=['aircraft_type'], name='flightroute_aircraft_idx'),
+        ),
+    ]
@@ -1,7 +1,45 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.utils import timezone
+import hashlib
 import math
 
+from .utils import DEFAULT_CO2_PER_KG_FUEL, DEFAULT_FUEL_DENSITY
+
+AIRPORT_COORDS = {
+    'entebbe': (0.0424, 32.4435),
+    'nairobi': (-1.3192, 36.9276),
+    # Add more airports as needed
+}
+
+KNOWN_CITIES_KEY = 'computed_route:known_cities'
+
+
+class InvalidRouteError(ValueError):
+    """Raised for a route whose origin or destination is not a known city"""
+
+
+def computed_route_settings():
+    options = {'PERSIST': False, 'CACHE_TTL': 3600, 'NEGATIVE_CACHE_TTL': 300}
+    options.update(getattr(settings, 'COMPUTED_ROUTES', {}))
+    return options
+
+
+def route_cache_key(origin, destination, aircraft_type):
+    raw = '|'.join(value.lower() for value in (origin, destination, aircraft_type))
+    return 'computed_route:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def unknown_city_key(city):
+    return 'computed_route:unknown:' + hashlib.md5(city.lower().encode()).hexdigest()
+
+
+def city_key(city):
+    return ' '.join(city.split()).lower()
+
 
 class FlightRoute(models.Model):
     origin = models.CharField(max_length=100)
@@ -15,64 +53,115 @@ class FlightRoute(models.Model):
     
     class Meta:
         unique_together = ['origin', 'destination', 'aircraft_type']
+        # origin is searched through the unique index above; these serve the admin search
+        indexes = [
+            models.Index(fields=['destination'], name='flightroute_destination_idx'),
+            models.Index(fields=['aircraft_type'], name='flightroute_aircraft_idx'),
+        ]
     
     @classmethod
-    def get_or_calculate_route(cls, origin, destination, aircraft_type):
-        """Get existing route or calculate a new one"""
-        try:
-            return cls.objects.get(
+    def get_or_calculate_route(cls, origin, destination, aircraft_type, persist=None):
+        """
+        Get existing route or calculate a new one.
+
+        Computed routes are only saved when persist (default: COMPUTED_ROUTES['PERSIST'])
+        is true; otherwise an unsaved instance is returned. Unsaved computed routes are
+        cached, and unknown cities are rejected from the cache before any route query,
+        whatever the other city or aircraft. Stored routes are always read from the
+        table, so a deleted or edited route is never served from the cache. Raises
+        InvalidRouteError for an unknown origin or destination.
+        """
+        options = computed_route_settings()
+        if persist is None:
+            persist = options['PERSIST']
+        origin, destination, aircraft_type = (' '.join(value.split()) for value in (origin, destination, aircraft_type))
+        if not (cls.is_known_city(origin) and cls.is_known_city(destination)):
+            raise InvalidRouteError(f'Unknown route: {origin} → {destination}')
+        key = route_cache_key(origin, destination, aircraft_type)
+
+        cached = cache.get(key)
+        if cached is not None and not persist:
+            return cls(**cached)
+
+        route = cls.objects.filter(
+            origin__iexact=origin,
+            destination__iexact=destination,
+            aircraft_type__iexact=aircraft_type
+        ).first()
+        if route is None:
+            # Try to find a route with any aircraft type first
+            similar_route = cls.objects.filter(
                 origin__iexact=origin,
-                destination__iexact=destination,
-                aircraft_type__iexact=aircraft_type
+                destination__iexact=destination
+            ).first()
+
+            if similar_route:
+                # Use distance from similar route but different fuel burn
+                distance = similar_route.distance_km
+            else:
+                # Calculate distance if no similar route exists
+                distance = cls.calculate_distance(origin, destination)
+
+            fields = {
+                'origin': origin.title(),
+                'destination': destination.title(),
+                'aircraft_type': aircraft_type,
+            }
+            defaults = {
+                'distance_km': distance,
+                'fuel_burn_per_km': cls.get_aircraft_fuel_burn(aircraft_type),
+            }
+            if persist:
+                # get_or_create refetches when a concurrent request inserted the same row first
+                route, _ = cls.objects.get_or_create(**fields, defaults=defaults)
+            else:
+                route = cls(**fields, **defaults)
+
+            if route.pk is None:
+                cache.set(key, {
+                    'origin': route.origin,
+                    'destination': route.destination,
+                    'distance_km': route.distance_km,
+                    'aircraft_type': route.aircraft_type,
+                    'fuel_burn_per_km': route.fuel_burn_per_km,
+                }, options['CACHE_TTL'])
+        return route
+
+    @classmethod
+    def is_known_city(cls, city):
+        """
+        A city is known if it has coordinates or appears in any stored route.
+        Unknown cities are remembered for NEGATIVE_CACHE_TTL under their own key.
+        """
+        city = city_key(city)
+        if city in AIRPORT_COORDS:
+            return True
+        if cache.get(unknown_city_key(city)):
+            return False
+        if city in cls.known_cities():
+            return True
+        cache.set(unknown_city_key(city), True, computed_route_settings()['NEGATIVE_CACHE_TTL'])
+        return False
+
+    @classmethod
+    def known_cities(cls):
+        """Lower-cased origins and destinations of the stored routes, cached for CACHE_TTL"""
+        cities = cache.get(KNOWN_CITIES_KEY)
+        if cities is None:
+            names = cls.objects.values_list('origin', flat=True).union(
+                cls.objects.values_list('destination', flat=True)
             )
-        except cls.DoesNotExist:
-            # Try to find a route with any aircraft type first
-            try:
-                similar_route = cls.objects.filter(
-                    origin__iexact=origin,
-                    destination__iexact=destination
-                ).first()
-                
-                if similar_route:
-                    # Use distance from similar route but different fuel burn
-                    distance = similar_route.distance_km
-                else:
-                    # Calculate distance if no similar route exists
-                    distance = cls.calculate_distance(origin, destination)
-                
-                fuel_burn = cls.get_aircraft_fuel_burn(aircraft_type)
-                
-                return cls.objects.create(
-                    origin=origin.title(),
-                    destination=destination.title(),
-                    distance_km=distance,
-                    aircraft_type=aircraft_type,
-                    fuel_burn_per_km=fuel_burn
-                )
-            except Exception as e:
-                # Log the error and create with defaults
-                print(f"Error creating route: {e}")
-                return cls.objects.create(
-                    origin=origin.title(),
-                    destination=destination.title(),
-                    distance_km=1000.0,  # Default distance
-                    aircraft_type=aircraft_type,
-                    fuel_burn_per_km=cls.get_aircraft_fuel_burn(aircraft_type)
-                )
+            cities = {city_key(name) for name in names}
+            cache.set(KNOWN_CITIES_KEY, cities, computed_route_settings()['CACHE_TTL'])
+        return cities
     
     @staticmethod
     def calculate_distance(origin, destination):
         """Calculate approximate distance between airports (placeholder)"""
         # This is a simplified calculation - in production you'd use actual airport coordinates
-        airport_coords = {
-            'entebbe': (0.0424, 32.4435),
-            'nairobi': (-1.3192, 36.9276),
-            # Add more airports as needed
-        }
-        
-        if origin.lower() in airport_coords and destination.lower() in airport_coords:
-            lat1, lon1 = airport_coords[origin.lower()]
-            lat2, lon2 = airport_coords[destination.lower()]
+        if origin.lower() in AIRPORT_COORDS and destination.lower() in AIRPORT_COORDS:
+            lat1, lon1 = AIRPORT_COORDS[origin.lower()]
+            lat2, lon2 = AIRPORT_COORDS[destination.lower()]
             
             # Haversine formula for great circle distance
             R = 6371  # Earth's radius in km
@@ -99,10 +188,25 @@ class FlightRoute(models.Model):
         return fuel_burns.get(aircraft_type.lower(), 3.0)  # Default fuel burn
     
     def calculate_co2_emissions(self):
-        """Calculate CO2 emissions for this route"""
-        # 1 liter of jet fuel produces approximately 2.52 kg of CO2
+        """Calculate CO2 emissions for this route, with the same factors as estimate_emissions"""
         total_fuel = self.distance_km * self.fuel_burn_per_km
-        return total_fuel * 2.52
+        return total_fuel * DEFAULT_FUEL_DENSITY * DEFAULT_CO2_PER_KG_FUEL
+
+
+@receiver(post_save, sender=FlightRoute)
+def forget_computed_route(sender, instance, **kwargs):
+    """
+    A stored route replaces any computed copy cached for it, and makes its cities known.
+    Stored routes are never cached, so deletes need no receiver (and stay fast deletes);
+    a city whose last route was deleted stays known until KNOWN_CITIES_KEY expires.
+    """
+    cache.delete(route_cache_key(*(' '.join(value.split()) for value in (
+        instance.origin, instance.destination, instance.aircraft_type))))
+    cities = {city_key(instance.origin), city_key(instance.destination)}
+    cache.delete_many([unknown_city_key(city) for city in cities])
+    known = cache.get(KNOWN_CITIES_KEY)
+    if known is not None and not cities <= known:
+        cache.delete(KNOWN_CITIES_KEY)
 
 
 class EmissionRecord(models.Model):
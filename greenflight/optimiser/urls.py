@@ -3,4 +3,5 @@ from . import views
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('api/optimise-flight/', views.optimise_flight_view, name='optimise_flight'),
 ]
@@ -3,7 +3,7 @@ Utility functions for flight emission calculations.
 """
 
 # Default emission factors
-DEFAULT_CO2_PER_KG_FUEL = 3.15  # kg CO2 per kg of aviation fuel
+DEFAULT_CO2_PER_KG_FUEL = 3.16  # kg CO2 per kg of aviation fuel (ICAO)
 DEFAULT_FUEL_DENSITY = 0.8  # kg per liter (typical for Jet A-1)
 DEFAULT_CO2_PER_PASSENGER_KM = 0.09  # kg CO2 per passenger-km (simple default)
 DEFAULT_PASSENGERS = 150
@@ -20,7 +20,7 @@ def estimate_emissions(distance_km, fuel_burn_per_km, passengers=DEFAULT_PASSENG
         distance_km (float): Flight distance in kilometers
         fuel_burn_per_km (float): Fuel consumption in liters per km
         passengers (int): Number of passengers (default: 150)
-        co2_per_kg_fuel (float): CO2 emission factor in kg per kg fuel (default: 3.15)
+        co2_per_kg_fuel (float): CO2 emission factor in kg per kg fuel (default: 3.16)
         fuel_density (float): Fuel density in kg/liter (default: 0.8)
         use_simple_method (bool): Use simple passenger-km method instead of fuel-based
         
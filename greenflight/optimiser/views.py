@@ -1,15 +1,24 @@
 from django.http import JsonResponse, HttpResponse
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
+from django.db.models import Case, F, IntegerField, Value, When
 import json
-from .models import FlightRoute, PassengerEcoScore, EmissionRecord
+from .models import FlightRoute, PassengerEcoScore, InvalidRouteError
 from .serializers import FlightRouteSerializer, PassengerEcoScoreSerializer
 from .utils import estimate_emissions, calculate_per_passenger_emissions
+from .writebehind import emission_writer
+from .fastjson import FieldPlan, FAST_RENDERERS, fast_response
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
 # Create your views here.
 
+MAX_ALTERNATIVES = 20  # cap on the optional alternatives list of optimise_flight_view
+
+# List responses are built straight from query tuples instead of through serializers
+ROUTE_PLAN = FieldPlan(FlightRoute, FlightRouteSerializer.Meta.fields)
+ROUTE_API_PLAN = FieldPlan(FlightRoute, ['id', 'origin', 'destination', 'aircraft_type', 'distance_km', 'fuel_burn_per_km'])
+
 def home_view(request):
     """Render the home template"""
     return render(request, 'optimiser/home.html')
@@ -17,13 +26,17 @@ def home_view(request):
 
 def health_check_view(request):
     """Basic health check endpoint"""
-    return JsonResponse({'status': 'healthy'}, status=200)
+    return JsonResponse({
+        'status': 'healthy',
+        'emission_writer': emission_writer.stats()
+    }, status=200)
 
 
 def optimise_flight_view(request):
     """
     POST /api/optimise-flight/
-    Accepts origin, destination, aircraft_type and returns optimized emissions data
+    Accepts origin, destination, aircraft_type and returns optimized emissions data.
+    An optional "alternatives": k adds the k lowest-emission other aircraft for the route.
     """
     if request.method == 'POST':
         data = json.loads(request.body)
@@ -38,38 +51,50 @@ def optimise_flight_view(request):
             )
         
         try:
-            # Find the requested route
-            route = FlightRoute.objects.get(
-                origin__iexact=origin,
-                destination__iexact=destination,
-                aircraft_type__iexact=aircraft_type
+            top_k = min(max(int(data.get('alternatives', 0)), 0), MAX_ALTERNATIVES)
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'alternatives must be an integer'}, status=400)
+        
+        try:
+            # One query returns the requested route first, then the other aircraft on
+            # the pair ranked by total fuel, so the best alternative is the second row
+            candidates = list(
+                FlightRoute.objects.filter(
+                    origin__iexact=origin,
+                    destination__iexact=destination
+                ).annotate(
+                    total_fuel=F('distance_km') * F('fuel_burn_per_km'),
+                    is_alternative=Case(
+                        When(aircraft_type__iexact=aircraft_type, then=Value(0)),
+                        default=Value(1),
+                        output_field=IntegerField()
+                    )
+                ).order_by('is_alternative', 'total_fuel', 'id')[:max(top_k, 1) + 1]
             )
             
+            if not candidates or candidates[0].is_alternative:
+                raise FlightRoute.DoesNotExist
+            route, alternatives = candidates[0], candidates[1:]
+            
             # Calculate original emissions
             original_fuel, original_co2 = estimate_emissions(
                 route.distance_km, 
                 route.fuel_burn_per_km
             )
             
-            # Find more efficient alternatives (same route, different aircraft)
-            alternative_routes = FlightRoute.objects.filter(
-                origin__iexact=origin,
-                destination__iexact=destination
-            ).exclude(id=route.id)
-            
-            best_alternative = None
-            best_fuel = original_fuel
-            best_co2 = original_co2
-            
-            for alt_route in alternative_routes:
+            ranked = []
+            for alt_route in alternatives:
                 alt_fuel, alt_co2 = estimate_emissions(
                     alt_route.distance_km,
                     alt_route.fuel_burn_per_km
                 )
-                if alt_co2 < best_co2:
-                    best_alternative = alt_route
-                    best_fuel = alt_fuel
-                    best_co2 = alt_co2
+                ranked.append((alt_route, alt_fuel, alt_co2))
+            
+            best_alternative = None
+            best_fuel = original_fuel
+            best_co2 = original_co2
+            if ranked and ranked[0][2] < original_co2:
+                best_alternative, best_fuel, best_co2 = ranked[0]
             
             # If no better alternative found, apply 10% optimization factor
             if not best_alternative:
@@ -82,7 +107,7 @@ def optimise_flight_view(request):
             fuel_saved = original_fuel - optimized_fuel
             co2_saved = original_co2 - optimized_co2
             
-            return JsonResponse({
+            response = {
                 'route': f"{route.origin} → {route.destination}",
                 'original': {
                     'aircraft_type': route.aircraft_type,
@@ -97,7 +122,20 @@ def optimise_flight_view(request):
                 'fuel_saved': round(fuel_saved, 2),
                 'co2_saved': round(co2_saved, 2),
                 'savings_percentage': round((co2_saved / original_co2) * 100, 1) if original_co2 > 0 else 0
-            })
+            }
+            
+            if top_k:
+                response['alternatives'] = [
+                    {
+                        'aircraft_type': alt_route.aircraft_type,
+                        'fuel': alt_fuel,
+                        'co2': alt_co2,
+                        'co2_saved': round(original_co2 - alt_co2, 2)
+                    }
+                    for alt_route, alt_fuel, alt_co2 in ranked[:top_k]
+                ]
+            
+            return JsonResponse(response)
             
         except FlightRoute.DoesNotExist:
             return JsonResponse(
@@ -117,9 +155,7 @@ def route_list_view(request):
     GET /api/routes/
     List all available flight routes
     """
-    queryset = FlightRoute.objects.all()
-    serializer = FlightRouteSerializer(queryset, many=True)
-    return JsonResponse(serializer.data, safe=False)
+    return fast_response(request, ROUTE_PLAN.rows(FlightRoute.objects.all()))
 
 
 def passenger_score_view(request):
@@ -175,18 +211,26 @@ def optimize_flight(request):
                     'error': 'Missing required fields'
                 }, status=400)
             
-            # Get or create the flight route
-            route = FlightRoute.get_or_calculate_route(origin, destination, aircraft_type)
+            # Get the stored flight route or compute one
+            try:
+                route = FlightRoute.get_or_calculate_route(origin, destination, aircraft_type)
+            except InvalidRouteError as e:
+                return JsonResponse({
+                    'success': False,
+                    'error': str(e)
+                }, status=400)
             
             # Calculate emissions
             co2_emissions = route.calculate_co2_emissions()
             
-            # Create emission record
-            EmissionRecord.objects.create(
-                flight=route,
-                co2_kg=co2_emissions,
-                fuel_saved_liters=0.0  # Implement optimization logic here
-            )
+            # Queue the emission record, it is written in a batch in the background.
+            # Computed routes that were not saved have nothing to attach a record to
+            if route.pk is not None:
+                emission_writer.add(
+                    flight=route,
+                    co2_kg=co2_emissions,
+                    fuel_saved_liters=0.0  # Implement optimization logic here
+                )
             
             return JsonResponse({
                 'success': True,
@@ -196,7 +240,8 @@ def optimize_flight(request):
                     'aircraft_type': route.aircraft_type,
                     'distance_km': route.distance_km,
                     'co2_kg': co2_emissions,
-                    'fuel_burn_per_km': route.fuel_burn_per_km
+                    'fuel_burn_per_km': route.fuel_burn_per_km,
+                    'computed': route.pk is None
                 }
             })
             
@@ -210,18 +255,11 @@ def optimize_flight(request):
 
 class FlightRouteAPI(APIView):
     """API for flight route operations"""
+    renderer_classes = FAST_RENDERERS
     
     def get(self, request):
         """Get all flight routes"""
-        routes = FlightRoute.objects.all()
-        data = [{
-            'id': route.id,
-            'origin': route.origin,
-            'destination': route.destination,
-            'aircraft_type': route.aircraft_type,
-            'distance_km': route.distance_km,
-            'fuel_burn_per_km': route.fuel_burn_per_km
-        } for route in routes]
+        data = ROUTE_API_PLAN.rows(FlightRoute.objects.all())
         
         return Response({
             'success': True,
@@ -0,0 +1,39 @@
+"""
+Gunicorn settings for the flightcode web service.
+
+The application is loaded once in the master (preload_app) and warmed up there,
+so every worker forked from it, including replacements and new workers after an
+autoscale event, starts with modules imported, templates compiled and catalog
+indexes built. See optimiser/warmup.py.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+# Seconds before a silent worker is killed; keep it well above FLEET_REQUEST_TIME_LIMIT,
+# the longest solve a request may run
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is imported and before any worker forks
+    if server.cfg.preload_app:
+        from optimiser.warmup import warm_up
+        warm_up(log=server.log.info)
+
+
+def pre_fork(server, worker):
+    # Never hand a database connection opened in the master to a worker
+    if server.cfg.preload_app:
+        from django.db import connections
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    # Without preloading each worker warms itself up before taking requests
+    if not worker.cfg.preload_app:
+        from optimiser.warmup import warm_up
+        warm_up(log=worker.log.info)
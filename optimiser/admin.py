@@ -0,0 +1,155 @@
+"""
+Admin for the route catalog and emission records.
+
+Both tables hold millions of rows, so nothing here may scan them:
+  - page counts come from the PostgreSQL planner's estimate, not COUNT(*)
+  - search only does exact matches that an index answers: an id, or an airport
+    or aircraft type name looked up in the small reference tables
+  - list filters are built from the small tables, not SELECT DISTINCT
+  - foreign keys use raw id inputs instead of a <select> of every row
+  - bulk actions are single set-based statements, not a loop over instances
+"""
+import json
+
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections, models
+from django.utils.functional import cached_property
+
+from .factors import recompute_emissions
+from .models import (
+    FlightRoute, EmissionRecord, Airport, AircraftType, AircraftEfficiency, efficiency_expression, name_key,
+)
+
+EXACT_COUNT_THRESHOLD = 10000  # below this estimate the exact COUNT(*) is cheap, so it is used
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose count is the planner's row estimate on PostgreSQL. The estimate
+    comes from table statistics, so large changelists no longer wait on COUNT(*);
+    page numbers near the end may be slightly off. Other databases count exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if connections[queryset.db].vendor == 'postgresql':
+            plan = json.loads(queryset.explain(format='json'))
+            estimate = int(plan[0]['Plan']['Plan Rows'])
+            if estimate >= EXACT_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # The "N total" link next to the search box is another COUNT(*) of the whole table
+    show_full_result_count = False
+    list_per_page = 50
+
+    def get_actions(self, request):
+        # The built-in delete action loads and lists every selected object before asking
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description='Delete selected %(verbose_name_plural)s in one statement', permissions=['delete'])
+    def delete_in_bulk(self, request, queryset):
+        deleted, by_model = queryset.delete()
+        details = ', '.join(f'{count} {label.split(".")[-1]}' for label, count in by_model.items() if count)
+        self.message_user(request, f'Deleted {deleted} rows ({details or "nothing"})', messages.SUCCESS)
+
+
+class AircraftTypeFilter(admin.SimpleListFilter):
+    """Filter on the aircraft key, listing the small AircraftType table"""
+    title = 'aircraft type'
+    parameter_name = 'aircraft'
+
+    def lookups(self, request, model_admin):
+        return AircraftType.objects.order_by('name').values_list('pk', 'name')
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(aircraft_id=self.value())
+        return queryset
+
+
+@admin.register(Airport)
+class AirportAdmin(admin.ModelAdmin):
+    """Small table: names, codes and the coordinates behind nearest-airport suggestions"""
+    list_display = ('name', 'iata', 'latitude', 'longitude')
+    list_editable = ('iata', 'latitude', 'longitude')
+    list_filter = (('latitude', admin.EmptyFieldListFilter),)
+    search_fields = ('name', 'iata')
+
+
+@admin.register(FlightRoute)
+class FlightRouteAdmin(ScalableAdmin):
+    list_display = ('id', 'origin', 'destination', 'aircraft_type', 'distance_km', 'fuel_consumption_kg',
+                    'efficiency_kg_per_km')
+    list_filter = (AircraftTypeFilter,)
+    search_fields = ('origin', 'destination', 'aircraft_type')
+    search_help_text = 'A route id, or the full name of an airport or aircraft type in any case'
+    readonly_fields = ('efficiency_kg_per_km', 'origin_airport', 'destination_airport', 'aircraft', 'change_version')
+    ordering = ('-id',)
+    actions = ['delete_in_bulk', 'recompute_efficiency', 'link_references']
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(pk=int(term)), False
+        key = name_key(term)
+        condition = models.Q()
+        airport = Airport.objects.filter(key=key).values_list('pk', flat=True).first()
+        if airport is not None:
+            condition |= models.Q(origin_airport_id=airport) | models.Q(destination_airport_id=airport)
+        aircraft = AircraftType.objects.filter(key=key).values_list('pk', flat=True).first()
+        if aircraft is not None:
+            condition |= models.Q(aircraft_id=aircraft)
+        if not condition:
+            return queryset.none(), False
+        return queryset.filter(condition), False
+
+    @admin.action(description='Recompute stored efficiency of selected routes', permissions=['change'])
+    def recompute_efficiency(self, request, queryset):
+        updated = queryset.update(efficiency_kg_per_km=efficiency_expression())
+        AircraftEfficiency.rebuild()
+        from .matrix import mark_changed
+        mark_changed()
+        self.message_user(request, f'Recomputed the efficiency of {updated} routes', messages.SUCCESS)
+
+    @admin.action(description='Link selected routes to their airports and aircraft type', permissions=['change'])
+    def link_references(self, request, queryset):
+        renamed = queryset.link_references()
+        self.message_user(
+            request, f'Linked the selected routes; {renamed} names changed to their canonical spelling',
+            messages.SUCCESS,
+        )
+
+
+@admin.register(EmissionRecord)
+class EmissionRecordAdmin(ScalableAdmin):
+    list_display = ('id', 'route', 'calculation_date', 'co2_kg', 'fuel_saved_kg', 'percent_improvement', 'factor')
+    list_select_related = ('route', 'factor')
+    list_filter = ('factor',)
+    raw_id_fields = ('route', 'factor')
+    search_fields = ('=id', '=route__id')
+    search_help_text = 'A record id or a route id'
+    ordering = ('-id',)
+    actions = ['delete_in_bulk', 'restate_co2']
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if not term.isdigit():
+            return queryset.none(), False
+        return queryset.filter(models.Q(pk=int(term)) | models.Q(route_id=int(term))), False
+
+    @admin.action(description='Restate CO2 of selected records with the factor in force', permissions=['change'])
+    def restate_co2(self, request, queryset):
+        changed = recompute_emissions(records=queryset)
+        self.message_user(request, f'Restated {changed} emission records', messages.SUCCESS)
@@ -0,0 +1,238 @@
+"""
+Approximate analytics over the EmissionRecord table.
+
+Exact totals and monthly trends need a full scan, which gets slow on tens of
+millions of rows. In approximate mode the same figures are estimated from a
+sample of row blocks:
+  - PostgreSQL: TABLESAMPLE SYSTEM, with each heap page as a block
+  - SQLite and others: random, non-overlapping ranges of ids
+
+Blocks, not rows, are the sampling units, so the 95% intervals still hold
+when rows written together have similar values. A recent exact
+result from the cache is returned in place of an estimate whenever there is
+one. Every exact computation refreshes that cache.
+"""
+import math
+import time
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, models
+
+from .forecasting import _month_expression, _month_index, _month_start
+from .models import EmissionRecord
+
+TARGET_ROWS = getattr(settings, 'ANALYTICS_APPROX_ROWS', 20000)  # rows read per estimate
+BLOCK_SIZE = getattr(settings, 'ANALYTICS_APPROX_BLOCK', 50)  # ids per sampled range (SQLite)
+EXACT_MAX_AGE = getattr(settings, 'ANALYTICS_EXACT_MAX_AGE', 3600)  # seconds a cached exact result may be used
+EXACT_CACHE_KEY = 'analytics:exact_summary'
+MONTHS = 12
+Z_95 = 1.959964
+
+
+def _month_label(index):
+    return _month_start(index).isoformat()
+
+
+def exact_summary(months=MONTHS):
+    """Exact totals and monthly sums; stores the result for approximate mode to fall back on"""
+    totals = EmissionRecord.objects.aggregate(
+        co2=models.Sum('co2_kg'), fuel=models.Sum('fuel_saved_kg'), count=models.Count('id')
+    )
+    monthly = (
+        EmissionRecord.objects
+        .annotate(month=_month_expression())
+        .values('month')
+        .annotate(co2_saved=models.Sum('co2_kg'), fuel_saved=models.Sum('fuel_saved_kg'), count=models.Count('id'))
+        .order_by('-month')[:months]
+    )
+    summary = {
+        'approximate': False,
+        'method': 'exact',
+        'computed_at': datetime.now(dt_timezone.utc).isoformat(),
+        'total_co2_kg': _exact(totals['co2'] or 0.0),
+        'total_fuel_saved_kg': _exact(totals['fuel'] or 0.0),
+        'count': _exact(totals['count']),
+        'monthly': [
+            {
+                'month': _month_label(_month_index(row['month'])),
+                'co2_saved': row['co2_saved'] or 0.0,
+                'fuel_saved': row['fuel_saved'] or 0.0,
+                'count': row['count'],
+            }
+            for row in monthly
+        ],
+    }
+    cache.set(EXACT_CACHE_KEY, (time.time(), summary), None)
+    return summary
+
+
+def _exact(value):
+    return {'value': value, 'lower': value, 'upper': value}
+
+
+def cached_exact_summary(max_age=EXACT_MAX_AGE):
+    """The last exact summary if it is at most max_age seconds old, else None"""
+    entry = cache.get(EXACT_CACHE_KEY)
+    if entry is None or time.time() - entry[0] > max_age:
+        return None
+    stored_at, summary = entry
+    return dict(summary, method='cached-exact', age_seconds=round(time.time() - stored_at))
+
+
+def analytics_summary(approximate=False, max_age=EXACT_MAX_AGE, target_rows=TARGET_ROWS):
+    """
+    Totals and monthly trend of EmissionRecord. With approximate=True, use a fresh
+    cached exact result if there is one, otherwise estimate from a sample.
+    """
+    if not approximate:
+        return exact_summary()
+    cached = cached_exact_summary(max_age)
+    if cached is not None:
+        return cached
+    return sampled_summary(target_rows)
+
+
+def sampled_summary(target_rows=TARGET_ROWS, months=MONTHS):
+    """Estimate the summary from a block sample of about target_rows rows"""
+    started = time.perf_counter()
+    if connection.vendor == 'postgresql':
+        sample = _tablesample(target_rows)
+    else:
+        sample = _id_blocks(target_rows)
+    if sample is None:
+        # Too small to be worth sampling
+        return exact_summary(months)
+
+    method, design, blocks, month_keys, co2, fuel = sample
+
+    # Cluster totals: one row per sampled block that returned rows, one column per month
+    block_ids, block_of_row = np.unique(blocks, return_inverse=True)
+    month_ids, month_of_row = np.unique(month_keys, return_inverse=True)
+    shape = (len(block_ids), max(len(month_ids), 1))
+
+    def cluster_totals(values):
+        flat = np.bincount(block_of_row * shape[1] + month_of_row, weights=values, minlength=shape[0] * shape[1])
+        return flat.reshape(shape)
+
+    per_block = {'co2': cluster_totals(co2), 'fuel': cluster_totals(fuel), 'count': cluster_totals(np.ones(len(co2)))}
+
+    if 'sampling_probability' in design:
+        # Each block was kept independently (TABLESAMPLE SYSTEM): Horvitz-Thompson for Poisson sampling
+        fraction = design['sampling_probability']
+
+        def estimate(totals):
+            value = totals.sum(axis=0) / fraction
+            variance = (1 - fraction) / fraction ** 2 * (totals ** 2).sum(axis=0)
+            return _with_interval(value, variance)
+    else:
+        # A fixed number of blocks drawn without replacement; blocks with no rows count as zeros
+        sampled, population = design['sampled_blocks'], design['population_blocks']
+        fraction = sampled / population
+
+        def estimate(totals):
+            padded = np.vstack([totals, np.zeros((sampled - totals.shape[0], totals.shape[1]))])
+            value = population * padded.mean(axis=0)
+            variance = population ** 2 * (1 - fraction) * padded.var(axis=0, ddof=1) / sampled
+            return _with_interval(value, variance)
+
+    def interval(key):
+        value, lower, upper = estimate(per_block[key].sum(axis=1, keepdims=True))
+        return {'value': float(value[0]), 'lower': float(lower[0]), 'upper': float(upper[0])}
+
+    monthly = []
+    if len(month_ids):
+        co2_value, co2_lower, co2_upper = estimate(per_block['co2'])
+        fuel_value, _, _ = estimate(per_block['fuel'])
+        count_value, _, _ = estimate(per_block['count'])
+        for position in np.argsort(month_ids)[::-1][:months]:
+            monthly.append({
+                'month': _month_label(int(month_ids[position])),
+                'co2_saved': float(co2_value[position]),
+                'co2_lower': float(co2_lower[position]),
+                'co2_upper': float(co2_upper[position]),
+                'fuel_saved': float(fuel_value[position]),
+                'count': int(round(count_value[position])),
+            })
+
+    return {
+        'approximate': True,
+        'method': method,
+        'confidence': 0.95,
+        'sample_fraction': round(fraction, 6),
+        'sample_rows': int(len(co2)),
+        'took_ms': round((time.perf_counter() - started) * 1000, 1),
+        'total_co2_kg': interval('co2'),
+        'total_fuel_saved_kg': interval('fuel'),
+        'count': interval('count'),
+        'monthly': monthly,
+    }
+
+
+def _with_interval(value, variance):
+    spread = Z_95 * np.sqrt(np.maximum(variance, 0))
+    return value, np.maximum(value - spread, 0), value + spread
+
+
+def _id_blocks(target_rows):
+    """
+    Sample random, non-overlapping ranges of BLOCK_SIZE ids. Ids that were never used
+    or were deleted just make a block smaller, so the estimates stay unbiased.
+    """
+    # Two single-ended lookups: SQLite only answers MIN/MAX from the index one at a time
+    ids = EmissionRecord.objects.order_by().values_list('id', flat=True)
+    bounds = {'first': ids.aggregate(value=models.Min('id'))['value'], 'last': ids.aggregate(value=models.Max('id'))['value']}
+    if bounds['first'] is None:
+        return None
+    span = bounds['last'] - bounds['first'] + 1
+    population_blocks = math.ceil(span / BLOCK_SIZE)
+    wanted = math.ceil(target_rows / BLOCK_SIZE)
+    if wanted * 2 >= population_blocks:
+        return None
+
+    starts = np.sort(np.random.default_rng().choice(population_blocks, size=wanted, replace=False))
+    starts = bounds['first'] + starts * BLOCK_SIZE
+    ranges = models.Q()
+    for start in starts.tolist():
+        ranges |= models.Q(id__gte=start, id__lt=start + BLOCK_SIZE)
+    rows = list(
+        EmissionRecord.objects.filter(ranges)
+        .annotate(month=_month_expression())
+        .values_list('id', 'month', 'co2_kg', 'fuel_saved_kg')
+    )
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    blocks = (ids - bounds['first']) // BLOCK_SIZE
+    design = {'sampled_blocks': wanted, 'population_blocks': population_blocks}
+    return _sample_arrays('id-blocks', design, blocks, rows)
+
+
+def _tablesample(target_rows):
+    """Sample heap pages with TABLESAMPLE SYSTEM; the page number comes from ctid"""
+    table = EmissionRecord._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples, relpages FROM pg_class WHERE oid = %s::regclass', [table])
+        row = cursor.fetchone()
+        reltuples, relpages = row or (0, 0)
+        if reltuples <= target_rows * 2 or relpages <= 1:
+            return None
+        percent = min(100.0, 100.0 * target_rows / reltuples)
+        qn = connection.ops.quote_name
+        cursor.execute(
+            f"SELECT (ctid::text::point)[0]::bigint, "
+            f"to_char({qn('calculation_date')} AT TIME ZONE 'UTC', 'YYYY-MM'), "
+            f"{qn('co2_kg')}, {qn('fuel_saved_kg')} "
+            f"FROM {qn(table)} TABLESAMPLE SYSTEM (%s)",
+            [percent],
+        )
+        rows = cursor.fetchall()
+    blocks = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    return _sample_arrays('tablesample', {'sampling_probability': percent / 100}, blocks, rows)
+
+
+def _sample_arrays(method, design, blocks, rows):
+    months = np.fromiter((_month_index(row[1]) for row in rows), dtype=np.int64, count=len(rows))
+    co2 = np.fromiter((row[2] or 0.0 for row in rows), dtype=float, count=len(rows))
+    fuel = np.fromiter((row[3] or 0.0 for row in rows), dtype=float, count=len(rows))
+    return method, design, blocks, months, co2, fuel
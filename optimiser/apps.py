@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+class OptimiserConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'optimiser'
+    
+    def ready(self):
+        import optimiser.signals
@@ -0,0 +1,190 @@
+"""
+Two-tier cache for read-heavy view helpers.
+
+Values are kept in a small in-process LRU in front of the shared Django cache
+(Redis when REDIS_URL is set, see CACHES in flightcode/settings.py). A hit in
+the LRU costs a dict lookup and no network round trip. A miss there falls back
+to the shared cache, and only a miss in both runs the computation. Concurrent
+misses on the same key share one computation through coalescing.coalesce.
+
+Entries do not all expire at the same moment. Each entry stores how long it
+took to compute, and a read may recompute it early with a probability that
+rises as expiry gets closer, more so for slow computations ("XFetch",
+Vattani et al., Optimal Probabilistic Cache Stampede Prevention). One reader
+usually refreshes a hot key shortly before it expires, instead of every worker
+missing on it together. A worker whose own copy is due checks the shared cache
+first and adopts a refresh another worker has already published.
+
+Keys belong to a namespace with a version number kept in the shared cache.
+bump(namespace), called from model signals, moves the namespace to a new
+version, so old entries are never read again and simply age out. Each process
+checks a namespace's version at most every VERSION_CHECK_INTERVAL seconds, so
+other workers see a bump within that time. The process that made the change
+sees it at once.
+
+    @cached('catalog', ttl=300)
+    def airport_names():
+        ...
+"""
+import functools
+import hashlib
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .coalescing import coalesce
+
+LOCAL_MAX_ENTRIES = getattr(settings, 'TIERED_CACHE_LOCAL_ENTRIES', 2000)
+LOCAL_MAX_TTL = getattr(settings, 'TIERED_CACHE_LOCAL_TTL', 60)  # seconds a value stays in the process without a shared read
+DEFAULT_TTL = getattr(settings, 'TIERED_CACHE_TTL', 300)
+BETA = getattr(settings, 'TIERED_CACHE_BETA', 1.0)  # > 1 refreshes earlier, < 1 later
+VERSION_CHECK_INTERVAL = 2  # seconds between reads of a namespace version from the shared cache
+VERSION_KEY = 'tiered:version:%s'
+
+# Namespaces, bumped from models.py and signals.py
+CATALOG = 'catalog'  # routes, airports and aircraft types
+EMISSIONS = 'emissions'  # emission records
+ECO_SCORE = 'eco_score:%s'  # one passenger's eco score, by user id
+REFERENCES = 'references'  # ids of airport and aircraft type names, see ReferenceName
+
+
+class LocalLRU:
+    """Thread-safe, bounded map of key -> (value, deadline); the least recently used entry goes first"""
+
+    def __init__(self, max_entries=LOCAL_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            if item[1] <= now:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+local = LocalLRU()
+
+
+def version(namespace):
+    """The current version of namespace, as this process last saw it"""
+    current = local.get(('version', namespace))
+    if current is None:
+        key = VERSION_KEY % namespace
+        current = cache.get(key)
+        if current is None:
+            # Start from the clock rather than 0: if the shared cache evicts the
+            # version, restarting at 0 could bring back entries of an old version
+            cache.add(key, int(time.time() * 1000), None)
+            current = cache.get(key, 0)
+        local.set(('version', namespace), current, VERSION_CHECK_INTERVAL)
+    return current
+
+
+def bump(namespace):
+    """Invalidate every entry of namespace, once the current transaction commits"""
+
+    def publish():
+        key = VERSION_KEY % namespace
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000), None)
+        local.delete(('version', namespace))
+
+    transaction.on_commit(publish)
+
+
+def _key(namespace, parts):
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+    return f'tiered:{namespace}:{version(namespace)}:{digest}'
+
+
+def _expires_early(entry, now):
+    """XFetch: True with a probability that rises towards expiry and with the compute time"""
+    _, delta, expires_at = entry
+    return now - delta * BETA * math.log(1.0 - random.random()) >= expires_at
+
+
+def get_or_compute(namespace, parts, compute, ttl=DEFAULT_TTL):
+    """
+    compute() through both cache tiers, keyed by namespace and parts (any repr-able
+    value). compute must return picklable data, since it is shared through the cache.
+    """
+    key = _key(namespace, parts)
+    now = time.time()
+    entry = local.get(key)
+    if entry is not None and not _expires_early(entry, now):
+        return entry[0]
+
+    shared = cache.get(key)
+    if shared is not None and (entry is None or shared[2] > entry[2]):
+        # Another worker already refreshed it, or this process has no copy yet
+        entry = shared
+        if not _expires_early(entry, now):
+            local.set(key, entry, min(LOCAL_MAX_TTL, max(entry[2] - now, 0.0)))
+            return entry[0]
+
+    def refresh():
+        started = time.time()
+        value = compute()
+        finished = time.time()
+        fresh = (value, finished - started, finished + ttl)
+        cache.set(key, fresh, ttl)
+        return fresh
+
+    fresh = coalesce(('tiered', key), refresh, ttl=1)
+    local.set(key, fresh, min(LOCAL_MAX_TTL, ttl))
+    return fresh[0]
+
+
+def cached(namespace, ttl=DEFAULT_TTL, key=None):
+    """
+    Decorator for a helper whose result depends only on its arguments and on the
+    data of namespace. key(*args, **kwargs) can replace the arguments as cache key.
+    The undecorated function stays available as .uncached.
+    """
+
+    def decorator(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            parts = key(*args, **kwargs) if key is not None else (args, sorted(kwargs.items()))
+            return get_or_compute(namespace, (name, parts), lambda: func(*args, **kwargs), ttl)
+
+        wrapper.uncached = func
+        wrapper.namespace = namespace
+        return wrapper
+
+    return decorator
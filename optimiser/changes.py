@@ -0,0 +1,117 @@
+"""
+Change feed of the route catalog, for clients that keep their own copy of it.
+
+Every write to FlightRoute stamps the routes it touches with the next version
+of the 'flightroute' ChangeCounter. A deleted route leaves a RouteTombstone with
+that version. Routes inserted by raw SQL have no version, and join the feed when
+`manage.py link_routes` stamps them. Versions become visible in order (see ChangeCounter), so a client
+that has read everything up to a version never misses a change below it.
+
+A client starts from since=0, which returns the whole catalog, and follows
+'next' until has_more is false. After that it polls with the 'next' it was last
+given. Routes and tombstones are read by keyset on (change_version, id), so a
+page costs the same whatever the size of the catalog. A poll with nothing new
+costs three indexed lookups. One write can stamp many routes with the same
+version, so a cursor inside a version also carries the last id read ('after').
+
+Tombstones older than TOMBSTONE_DAYS are pruned by
+`manage.py prune_route_tombstones`. A client whose cursor is older than the
+newest pruned tombstone may have missed deletes, and is told to start again
+from since=0.
+"""
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import FlightRoute, RouteTombstone, ChangeCounter, ROUTE_CHANGES, ROUTE_CHANGES_PRUNED
+from .serializers import FlightRouteSerializer
+
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+TOMBSTONE_DAYS = getattr(settings, 'ROUTE_TOMBSTONE_DAYS', 30)
+ROUTE_FIELDS = tuple(FlightRouteSerializer.Meta.fields)  # 'id' first
+
+
+class ResyncRequired(Exception):
+    pass
+
+
+def _after(queryset, id_field, since, after, upto, fields, limit):
+    """
+    Up to limit values_list rows of queryset after the cursor and up to version upto,
+    in (change_version, id) order. The rest of version since and the later versions
+    are read separately: each is a range scan of the index, which a single OR
+    condition would not be.
+    """
+    later = queryset.filter(change_version__gt=since, change_version__lte=upto).order_by('change_version', id_field)
+    if after is None or since > upto:
+        yield from later.values_list(*fields)[:limit]
+        return
+    rest = queryset.filter(change_version=since, **{f'{id_field}__gt': after}).order_by(id_field)
+    count = 0
+    for row in rest.values_list(*fields)[:limit]:
+        count += 1
+        yield row
+    if count < limit:
+        yield from later.values_list(*fields)[:limit - count]
+
+
+def route_changes(since=0, after=None, limit=DEFAULT_LIMIT):
+    """
+    Routes changed and deleted after the cursor (since, after), oldest change first,
+    with the cursor to ask for next
+    """
+    limit = min(max(int(limit), 1), MAX_LIMIT)
+    # Read first: every version up to it has committed, so it is safe to move the cursor to.
+    # Both reads below stop at it, so a write committing between them cannot be
+    # skipped by a cursor that one of them has already moved past.
+    version = ChangeCounter.current(ROUTE_CHANGES)
+    if since > 0 and since < ChangeCounter.current(ROUTE_CHANGES_PRUNED):
+        raise ResyncRequired('Deletes after this version have been pruned; start again from since=0')
+    if since >= version and after is None:
+        return {'version': version, 'changes': [], 'has_more': False, 'next': {'since': min(since, version)}}
+
+    upserts = (
+        (row[0], row[1], dict(zip(ROUTE_FIELDS, row[1:]), op='upsert', version=row[0]))
+        for row in _after(
+            FlightRoute.objects.all(), 'id', since, after, version, ('change_version',) + ROUTE_FIELDS, limit + 1,
+        )
+    )
+    deletes = (
+        (change_version, pk, {'op': 'delete', 'version': change_version, 'id': pk,
+                              'origin': origin, 'destination': destination, 'aircraft_type': aircraft_type})
+        for change_version, pk, origin, destination, aircraft_type in _after(
+            RouteTombstone.objects.all(), 'route_id', since, after, version,
+            ('change_version', 'route_id', 'origin', 'destination', 'aircraft_type'), limit + 1,
+        )
+    )
+    changes = []
+    has_more = False
+    for change_version, pk, change in heapq.merge(upserts, deletes, key=lambda item: item[:2]):
+        if len(changes) == limit:
+            has_more = True
+            break
+        changes.append(change)
+        since, after = change_version, pk
+
+    if has_more:
+        cursor = {'since': since, 'after': after}
+    else:
+        cursor = {'since': version}
+    return {'version': version, 'changes': changes, 'has_more': has_more, 'next': cursor}
+
+
+def prune_tombstones(days=TOMBSTONE_DAYS):
+    """Delete tombstones older than days; returns the number deleted"""
+    old = RouteTombstone.objects.filter(deleted_at__lt=timezone.now() - timedelta(days=days))
+    with transaction.atomic():
+        newest = old.aggregate(version=models.Max('change_version'))['version']
+        if newest is None:
+            return 0
+        deleted, _ = old.delete()
+        ChangeCounter.objects.get_or_create(name=ROUTE_CHANGES_PRUNED)
+        ChangeCounter.objects.filter(name=ROUTE_CHANGES_PRUNED, value__lt=newest).update(value=newest)
+    return deleted
@@ -0,0 +1,121 @@
+"""
+Single-flight request coalescing.
+
+Concurrent callers asking for the same key share one computation: threads in
+the same process wait on the leader's result, and other workers wait on a
+cache-backed lock and pick the result up from the cache once it is published.
+Results are kept for a short TTL so bursts on a hot key hit the cache.
+"""
+import hashlib
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+
+RESULT_TTL = getattr(settings, 'SINGLE_FLIGHT_RESULT_TTL', 5)  # seconds a shared result stays fresh
+LOCK_TTL = 30  # seconds before an abandoned cross-worker lock expires
+WAIT_TIMEOUT = 10  # seconds a follower waits before computing on its own
+POLL_INTERVAL = 0.05
+
+_MISSING = object()
+
+# Delete the lock only if it still holds our token, in one step
+_RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+
+class _InFlight:
+    """A computation in progress in this process"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def _cache_key(prefix, key):
+    digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+    return f'singleflight:{prefix}:{digest}'
+
+
+def coalesce(key, compute, ttl=None):
+    """
+    Return compute() for key, sharing one in-flight computation between concurrent callers.
+    compute must return picklable data since results are shared through the cache.
+    """
+    ttl = RESULT_TTL if ttl is None else ttl
+    result_key = _cache_key('result', key)
+
+    cached = cache.get(result_key, _MISSING)
+    if cached is not _MISSING:
+        return cached
+
+    with _in_flight_lock:
+        call = _in_flight.get(key)
+        is_leader = call is None
+        if is_leader:
+            call = _InFlight()
+            _in_flight[key] = call
+
+    if not is_leader:
+        # Another thread in this process is already computing this key
+        if call.done.wait(WAIT_TIMEOUT):
+            if call.error is not None:
+                raise call.error
+            return call.result
+        return compute()
+
+    try:
+        call.result = _compute_once_across_workers(key, result_key, compute, ttl)
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        call.done.set()
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+
+
+def _compute_once_across_workers(key, result_key, compute, ttl):
+    """Compute under a cache lock so only one worker does the work for key"""
+    lock_key = _cache_key('lock', key)
+    # Plain ints are stored unpickled by the Redis backend, so the release script can compare them
+    token = secrets.randbits(62)
+    deadline = time.monotonic() + WAIT_TIMEOUT
+
+    while not cache.add(lock_key, token, LOCK_TTL):
+        # Another worker holds the lock - wait for it to publish the result
+        time.sleep(POLL_INTERVAL)
+        cached = cache.get(result_key, _MISSING)
+        if cached is not _MISSING:
+            return cached
+        if time.monotonic() >= deadline:
+            return compute()
+
+    try:
+        result = compute()
+        cache.set(result_key, result, ttl)
+        return result
+    finally:
+        _release(lock_key, token)
+
+
+def _release(lock_key, token):
+    """
+    Drop the lock if this caller still holds it. A computation that outlived
+    LOCK_TTL must not delete the lock another worker has taken since.
+    """
+    from django.core.cache.backends.redis import RedisCache
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if isinstance(backend, RedisCache):
+        full_key = backend.make_and_validate_key(lock_key)
+        backend._cache.get_client(full_key, write=True).eval(_RELEASE_SCRIPT, 1, full_key, token)
+    elif cache.get(lock_key) == token:
+        # Not atomic, but these backends are local to the process or only used in development
+        cache.delete(lock_key)
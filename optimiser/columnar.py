@@ -0,0 +1,256 @@
+"""
+Columnar (pandas / Arrow) extracts of the optimiser tables.
+
+Rows are pulled straight from database cursor batches into DataFrames without
+instantiating any Django models, so large tables can be exported to Parquet or
+analysed with vectorised pandas operations.
+"""
+import os
+import shutil
+
+from django.db import connection
+
+from .models import FlightRoute, EmissionRecord
+
+DEFAULT_CHUNK_SIZE = 50000
+
+ROUTE_COLUMNS = ['id', 'origin', 'destination', 'aircraft_type', 'distance_km', 'fuel_consumption_kg']
+EMISSION_COLUMNS = ['id', 'route_id', 'calculation_date', 'co2_kg', 'fuel_saved_kg', 'percent_improvement']
+
+# Partition layout used for the Parquet datasets
+ROUTE_PARTITIONS = ['aircraft_type']
+EMISSION_PARTITIONS = ['year', 'month']
+
+
+def _iter_cursor_batches(queryset, columns, chunk_size):
+    """Yield lists of raw row tuples for the queryset, fetched in batches from the cursor"""
+    sql, params = queryset.values_list(*columns).order_by('id').query.sql_with_params()
+    # chunked_cursor() is a server-side cursor on PostgreSQL, so memory stays bounded
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+
+def _routes_batch_to_frame(rows):
+    import pandas as pd
+
+    frame = pd.DataFrame.from_records(rows, columns=ROUTE_COLUMNS)
+    frame['distance_km'] = frame['distance_km'].astype('float64')
+    frame['fuel_consumption_kg'] = frame['fuel_consumption_kg'].astype('float64')
+    return frame
+
+
+def _emissions_batch_to_frame(rows):
+    import pandas as pd
+
+    frame = pd.DataFrame.from_records(rows, columns=EMISSION_COLUMNS)
+    # SQLite hands back ISO strings, PostgreSQL aware datetimes - normalise both to UTC
+    frame['calculation_date'] = pd.to_datetime(frame['calculation_date'], utc=True, format='ISO8601')
+    for column in ('co2_kg', 'fuel_saved_kg', 'percent_improvement'):
+        frame[column] = frame[column].astype('float64')
+    return frame
+
+
+def iter_route_frames(queryset=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield FlightRoute rows as DataFrames of at most chunk_size rows"""
+    queryset = FlightRoute.objects.all() if queryset is None else queryset
+    for rows in _iter_cursor_batches(queryset, ROUTE_COLUMNS, chunk_size):
+        yield _routes_batch_to_frame(rows)
+
+
+def iter_emission_frames(queryset=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield EmissionRecord rows as DataFrames of at most chunk_size rows"""
+    queryset = EmissionRecord.objects.all() if queryset is None else queryset
+    for rows in _iter_cursor_batches(queryset, EMISSION_COLUMNS, chunk_size):
+        yield _emissions_batch_to_frame(rows)
+
+
+def _concat(frames, columns):
+    import pandas as pd
+
+    frames = list(frames)
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def routes_frame(queryset=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Load FlightRoute rows into a single DataFrame"""
+    return _concat(iter_route_frames(queryset, chunk_size), ROUTE_COLUMNS)
+
+
+def emissions_frame(queryset=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Load EmissionRecord rows into a single DataFrame"""
+    return _concat(iter_emission_frames(queryset, chunk_size), EMISSION_COLUMNS)
+
+
+def _write_dataset(frames, path, partition_cols, prepare=None):
+    """
+    Write the DataFrame chunks as a partitioned Parquet dataset at path, returns rows written.
+    The dataset is written next to path and then replaces it, so parts and partitions
+    of an earlier export never mix with the new rows.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    partial = f'{path}.partial'
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    written = 0
+    for index, frame in enumerate(frames):
+        if prepare:
+            frame = prepare(frame)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        pq.write_to_dataset(
+            table,
+            root_path=partial,
+            partition_cols=partition_cols,
+            basename_template=f'part-{index:05d}-{{i}}.parquet',
+            # Each chunk adds files to the partitions of earlier chunks
+            existing_data_behavior='overwrite_or_ignore',
+        )
+        written += len(frame)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(partial, path)
+    return written
+
+
+def _add_period_columns(frame):
+    frame['year'] = frame['calculation_date'].dt.year.astype('int32')
+    frame['month'] = frame['calculation_date'].dt.month.astype('int32')
+    return frame
+
+
+def export_parquet(output_dir, chunk_size=DEFAULT_CHUNK_SIZE, tables=('routes', 'emissions')):
+    """
+    Export the route catalog and emission history as partitioned Parquet datasets.
+    Routes are partitioned by aircraft type and emissions by year/month.
+    Returns a dict of table name to number of rows written.
+    """
+    counts = {}
+    if 'routes' in tables:
+        counts['routes'] = _write_dataset(
+            iter_route_frames(chunk_size=chunk_size),
+            os.path.join(output_dir, 'routes'),
+            ROUTE_PARTITIONS,
+        )
+    if 'emissions' in tables:
+        counts['emissions'] = _write_dataset(
+            iter_emission_frames(chunk_size=chunk_size),
+            os.path.join(output_dir, 'emissions'),
+            EMISSION_PARTITIONS,
+            prepare=_add_period_columns,
+        )
+    return counts
+
+
+def read_parquet(output_dir):
+    """Load a dataset written by export_parquet back into (routes, emissions) DataFrames"""
+    import pandas as pd
+
+    routes_path = os.path.join(output_dir, 'routes')
+    emissions_path = os.path.join(output_dir, 'emissions')
+    routes = pd.read_parquet(routes_path) if os.path.exists(routes_path) else pd.DataFrame(columns=ROUTE_COLUMNS)
+    emissions = pd.read_parquet(emissions_path) if os.path.exists(emissions_path) else pd.DataFrame(columns=EMISSION_COLUMNS)
+    # Partition columns come back as categoricals
+    if 'aircraft_type' in routes:
+        routes['aircraft_type'] = routes['aircraft_type'].astype(str)
+    return routes, emissions
+
+
+def route_efficiency(routes):
+    """Return a copy of the routes frame with a kg-per-km efficiency column"""
+    routes = routes.copy()
+    routes['efficiency'] = routes['fuel_consumption_kg'] / routes['distance_km']
+    return routes
+
+
+def monthly_totals(emissions):
+    """Sum CO2, fuel saved and record counts per calendar month, oldest first"""
+    import pandas as pd
+
+    if emissions.empty:
+        return pd.DataFrame(columns=['month', 'co2_saved', 'fuel_saved', 'count'])
+    month = emissions['calculation_date'].dt.tz_convert('UTC').dt.tz_localize(None).dt.to_period('M').dt.to_timestamp()
+    grouped = emissions.groupby(month).agg(
+        co2_saved=('co2_kg', 'sum'),
+        fuel_saved=('fuel_saved_kg', 'sum'),
+        count=('id', 'count'),
+    )
+    grouped.index.name = 'month'
+    return grouped.reset_index().sort_values('month')
+
+
+def analytics_summary(routes, emissions):
+    """
+    Compute the analytics dashboard figures from DataFrames.
+    Mirrors the context built by the analytics_dashboard view.
+    """
+    total_co2_saved = float(emissions['co2_kg'].sum()) if not emissions.empty else 0
+    total_fuel_saved = float(emissions['fuel_saved_kg'].sum()) if not emissions.empty else 0
+
+    routes = route_efficiency(routes)
+    efficient_routes = routes.nsmallest(10, 'efficiency')
+    top_aircraft = routes.groupby('aircraft_type')['efficiency'].mean().nsmallest(5)
+
+    # Newest 12 months first, like the ORM query
+    monthly = monthly_totals(emissions).sort_values('month', ascending=False).head(12)
+
+    return {
+        'total_co2_saved': total_co2_saved,
+        'total_fuel_saved': total_fuel_saved,
+        'trees_planted': int(total_co2_saved / 21),
+        'car_km_avoided': int(total_co2_saved * 4.3),
+        'efficient_routes': efficient_routes.to_dict('records'),
+        'monthly_data': monthly.to_dict('records'),
+        'top_aircraft': list(top_aircraft.items()),
+        'emissions_count': int(len(emissions)),
+    }
+
+
+def predictive_summary(routes, emissions, horizon=6):
+    """
+    Compute the predictive analysis payload from DataFrames.
+    Fits the same linear trend over monthly CO2 totals as the predictive_analysis view.
+    """
+    import numpy as np
+
+    co2_values = [float(v) for v in monthly_totals(emissions)['co2_saved']]
+    months = list(range(len(co2_values)))
+
+    predictions = [0] * horizon
+    monthly_improvement = 0
+    best_aircraft = []
+
+    if len(months) >= 3:
+        slope, intercept = np.polyfit(np.array(months, dtype=float), np.array(co2_values), 1)
+        future = np.arange(len(months), len(months) + horizon)
+        predictions = [max(0, float(p)) for p in slope * future + intercept]
+
+        current_month_avg = sum(co2_values[-3:]) / 3
+        predicted_month_avg = sum(predictions) / len(predictions)
+        monthly_improvement = predicted_month_avg - current_month_avg
+
+        efficiencies = route_efficiency(routes).groupby('aircraft_type')['efficiency'].mean()
+        best_aircraft = list(efficiencies.nsmallest(3).index)
+
+    return {
+        'historical_data': {
+            'months': months,
+            'co2_saved': co2_values,
+        },
+        'predictions': {
+            'months': list(range(len(months), len(months) + horizon)),
+            'co2_saved': predictions,
+        },
+        'insights': {
+            'monthly_improvement': round(monthly_improvement, 2),
+            'projected_annual_savings': round(monthly_improvement * 12, 2),
+            'best_aircraft_recommendations': best_aircraft,
+            'confidence_score': min(len(months) * 10, 100),
+        },
+    }
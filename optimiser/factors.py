@@ -0,0 +1,108 @@
+"""
+Versioned CO2 emission factors.
+
+EmissionFactor rows say how many kg of CO2 a kg of fuel produces from a given
+date on. New emissions use the factor in force today and record it on the
+EmissionRecord. When the methodology changes, add a factor and run
+`manage.py recompute_emissions`. It restates stored co2_kg values with
+set-based UPDATEs over id ranges and never loads the records into Python.
+"""
+import time
+from datetime import datetime, time as dt_time, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Max, Min, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import EmissionFactor, EmissionRecord
+
+DEFAULT_CO2_PER_KG_FUEL = 3.16  # used when no factor has been recorded yet
+CURRENT_TTL = 60  # seconds a worker keeps the current factor before looking again
+
+_current = {'factor': None, 'expires': 0.0}
+
+
+def current_factor():
+    """The factor in force today, or None if the table is empty"""
+    now = time.monotonic()
+    if now >= _current['expires']:
+        _current['factor'] = EmissionFactor.objects.filter(
+            effective_from__lte=timezone.now().date()
+        ).order_by('-effective_from').first()
+        _current['expires'] = now + CURRENT_TTL
+    return _current['factor']
+
+
+def clear_current():
+    _current['expires'] = 0.0
+
+
+def current_co2_per_kg_fuel():
+    factor = current_factor()
+    return factor.co2_per_kg_fuel if factor else DEFAULT_CO2_PER_KG_FUEL
+
+
+def _midnight(day):
+    return datetime.combine(day, dt_time.min, tzinfo=dt_timezone.utc)
+
+
+def _factor_in_force(factors, field):
+    """
+    CASE expression mapping calculation_date to the value of `field` ('id' or
+    'co2_per_kg_fuel') of the factor in force at that time. Records older than the
+    first factor use the first factor.
+    """
+    output = FloatField() if field == 'co2_per_kg_fuel' else None
+    whens = [
+        When(calculation_date__lt=_midnight(following.effective_from), then=Value(getattr(factor, field)))
+        for factor, following in zip(factors, factors[1:])
+    ]
+    return Case(*whens, default=Value(getattr(factors[-1], field)), output_field=output)
+
+
+def recompute_emissions(since=None, until=None, chunk_size=50000, dry_run=False, progress=None, records=None):
+    """
+    Restate co2_kg of every record in [since, until), or of the records queryset, with
+    the factor in force on its calculation date. Records already on that factor are
+    left alone. Each chunk of ids is one UPDATE in its own transaction:
+
+        co2_kg = co2_kg * new factor / factor it was calculated with
+
+    Returns the number of records changed (or that would change, with dry_run).
+    """
+    factors = list(EmissionFactor.objects.order_by('effective_from'))
+    if not factors:
+        return 0
+
+    target_id = _factor_in_force(factors, 'id')
+    records = (EmissionRecord.objects.all() if records is None else records).exclude(factor_id=target_id)
+    if since:
+        records = records.filter(calculation_date__gte=_midnight(since))
+    if until:
+        records = records.filter(calculation_date__lt=_midnight(until))
+    if dry_run:
+        return records.count()
+
+    bounds = EmissionRecord.objects.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return 0
+    old_value = Coalesce(
+        Subquery(EmissionFactor.objects.filter(pk=OuterRef('factor_id')).values('co2_per_kg_fuel')[:1]),
+        Value(DEFAULT_CO2_PER_KG_FUEL),
+        output_field=FloatField(),
+    )
+    new_value = _factor_in_force(factors, 'co2_per_kg_fuel')
+
+    changed = 0
+    for start in range(bounds['first'], bounds['last'] + 1, chunk_size):
+        with transaction.atomic():
+            # Both SET expressions read the row as it was, so old_value sees the old factor_id
+            changed += records.filter(id__gte=start, id__lt=start + chunk_size).update(
+                co2_kg=F('co2_kg') * new_value / old_value,
+                factor_id=target_id,
+            )
+        if progress:
+            progress((start - bounds['first'] + chunk_size) / (bounds['last'] - bounds['first'] + 1), changed)
+    clear_current()
+    return changed
@@ -0,0 +1,245 @@
+"""
+Fleet assignment across the route network.
+
+compare_aircraft_efficiency picks the best aircraft for each pair on its own,
+as if every airline had unlimited aircraft of every type. assign_fleet shares a
+limited fleet between all pairs at once. It is a linear program solved by HiGHS
+through scipy.optimize:
+
+  x[p, t]   flights of pair p flown by type t, one variable per FlightRoute
+            candidate whose type is in the fleet
+  u[p]      flights of pair p left unflown
+
+  minimise    sum cost[p, t] * x[p, t] + penalty * sum u[p]
+  subject to  sum_t x[p, t] + u[p] = flights[p]                        every pair
+              sum_p hours[p, t] * x[p, t] <= count[t] * hours_per_aircraft  every type
+
+Each flight's block hours are its distance at CRUISE_KMH plus a turnaround.
+The penalty is set well above the cost of any single flight. The solver therefore
+leaves a flight unflown only when the fleet is short of hours. The matrices are
+sparse, with one column per candidate, so thousands of pairs solve in about a
+second. With integer=True (the default) flights are whole numbers. That makes it a
+MILP, solved to within MIP_GAP of the optimum or stopped at time_limit with the
+best assignment found so far.
+"""
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .factors import current_co2_per_kg_fuel
+from .models import FlightRoute
+from .search import get_index
+
+CRUISE_KMH = getattr(settings, 'FLEET_CRUISE_KMH', 800.0)
+TURNAROUND_HOURS = getattr(settings, 'FLEET_TURNAROUND_HOURS', 1.0)
+HOURS_PER_AIRCRAFT = getattr(settings, 'FLEET_HOURS_PER_AIRCRAFT', 84.0)  # block hours per aircraft per period (12 h a day for a week)
+TIME_LIMIT = getattr(settings, 'FLEET_TIME_LIMIT', 30.0)  # seconds for the integer solve
+# Solves inside a web request get less: gunicorn kills a worker after its timeout (see gunicorn.conf.py)
+REQUEST_TIME_LIMIT = getattr(settings, 'FLEET_REQUEST_TIME_LIMIT', 10.0)
+MIP_GAP = getattr(settings, 'FLEET_MIP_GAP', 0.01)  # integer solve stops within 1% of the best possible
+MAX_PAIRS = getattr(settings, 'FLEET_MAX_PAIRS', 20000)
+PENALTY_FACTOR = 10.0  # unmet flight cost, as a multiple of the dearest candidate flight
+OBJECTIVES = ('co2', 'fuel')
+
+
+class FleetInputError(ValueError):
+    pass
+
+
+def block_hours(distance_km):
+    return distance_km / CRUISE_KMH + TURNAROUND_HOURS
+
+
+def _resolve(name, field):
+    name = str(name or '').strip()
+    return get_index().resolve(name, field) or name
+
+
+def _parse_fleet(fleet):
+    if not isinstance(fleet, dict):
+        raise FleetInputError('fleet must map aircraft types to numbers of aircraft')
+    counts = {}
+    for aircraft_type, count in fleet.items():
+        try:
+            count = int(count)
+        except (TypeError, ValueError):
+            raise FleetInputError(f'Fleet count for {aircraft_type} must be an integer')
+        if count < 0:
+            raise FleetInputError(f'Fleet count for {aircraft_type} must not be negative')
+        aircraft_type = _resolve(aircraft_type, 'aircraft_type')
+        counts[aircraft_type] = counts.get(aircraft_type, 0) + count
+    if not counts:
+        raise FleetInputError('fleet must list at least one aircraft type')
+    return counts
+
+
+def _parse_demand(demand):
+    flights = {}
+    for item in demand or []:
+        try:
+            pair = (_resolve(item['origin'], 'origin'), _resolve(item['destination'], 'destination'))
+            count = float(item['flights'])
+        except (KeyError, TypeError, ValueError):
+            raise FleetInputError('Each demand entry needs origin, destination and a number of flights')
+        if count < 0:
+            raise FleetInputError(f'Flights for {pair[0]}-{pair[1]} must not be negative')
+        flights[pair] = flights.get(pair, 0.0) + count
+    if not flights:
+        raise FleetInputError('demand must list at least one origin-destination pair')
+    if len(flights) > MAX_PAIRS:
+        raise FleetInputError(f'At most {MAX_PAIRS} pairs can be assigned at once')
+    return flights
+
+
+def _candidates(pairs, aircraft_types):
+    """The lowest-fuel FlightRoute for every (pair, type) that exists, from one query"""
+    origins = {origin for origin, _ in pairs}
+    destinations = {destination for _, destination in pairs}
+    rows = FlightRoute.objects.filter(
+        aircraft_type__in=aircraft_types, origin__in=origins, destination__in=destinations
+    ).values_list('id', 'origin', 'destination', 'aircraft_type', 'distance_km', 'fuel_consumption_kg')
+    best = {}
+    for route_id, origin, destination, aircraft_type, distance_km, fuel_kg in rows.iterator(chunk_size=5000):
+        if (origin, destination) not in pairs:
+            continue
+        key = (origin, destination, aircraft_type)
+        if key not in best or fuel_kg < best[key][2]:
+            best[key] = (route_id, distance_km, fuel_kg)
+    return best
+
+
+def assign_fleet(fleet, demand, objective='co2', hours_per_aircraft=HOURS_PER_AIRCRAFT,
+                 integer=True, time_limit=TIME_LIMIT):
+    """
+    Assign aircraft to routes so that total CO2 (or fuel) is lowest.
+
+    fleet: {aircraft_type: number of aircraft}
+    demand: [{'origin', 'destination', 'flights'}], flights per period
+    hours_per_aircraft: block hours each aircraft can fly in that period
+
+    Returns the assignments, unmet flights, fleet utilisation and totals.
+    """
+    from scipy.optimize import Bounds, LinearConstraint, linprog, milp
+    from scipy.sparse import coo_matrix
+
+    if objective not in OBJECTIVES:
+        raise FleetInputError(f'objective must be one of {", ".join(OBJECTIVES)}')
+    if not hours_per_aircraft > 0:
+        raise FleetInputError('hours_per_aircraft must be positive')
+    counts = _parse_fleet(fleet)
+    flights = _parse_demand(demand)
+    if integer and any(count != int(count) for count in flights.values()):
+        raise FleetInputError('flights must be whole numbers unless integer is false')
+    started = time.perf_counter()
+
+    pairs = list(flights)
+    pair_index = {pair: i for i, pair in enumerate(pairs)}
+    types = list(counts)
+    type_index = {aircraft_type: i for i, aircraft_type in enumerate(types)}
+    candidates = _candidates(pair_index, types)
+    keys = list(candidates)
+
+    co2_per_kg_fuel = current_co2_per_kg_fuel()
+    n, n_pairs = len(keys), len(pairs)
+    route_ids = np.array([candidates[key][0] for key in keys], dtype=np.int64)
+    distance = np.array([candidates[key][1] for key in keys], dtype=float)
+    fuel = np.array([candidates[key][2] for key in keys], dtype=float)
+    hours = block_hours(distance)
+    cost = fuel * co2_per_kg_fuel if objective == 'co2' else fuel
+    rows = np.array([pair_index[key[:2]] for key in keys], dtype=np.int64)
+    cols = np.array([type_index[key[2]] for key in keys], dtype=np.int64)
+    demand_flights = np.array([flights[pair] for pair in pairs], dtype=float)
+
+    penalty = PENALTY_FACTOR * (cost.max() if n else 1.0)
+    c = np.concatenate([cost, np.full(n_pairs, penalty)])
+    variables = np.arange(n + n_pairs)
+    # Every pair's flights are flown by some type or left unmet
+    a_demand = coo_matrix(
+        (np.ones(n + n_pairs), (np.concatenate([rows, np.arange(n_pairs)]), variables)),
+        shape=(n_pairs, n + n_pairs),
+    ).tocsr()
+    # No type flies more hours than its aircraft have
+    a_hours = coo_matrix((hours, (cols, np.arange(n))), shape=(len(types), n + n_pairs)).tocsr()
+    available = np.array([counts[t] for t in types], dtype=float) * hours_per_aircraft
+
+    if integer:
+        result = milp(
+            c,
+            integrality=np.ones(n + n_pairs),
+            bounds=Bounds(0, np.inf),
+            constraints=[
+                LinearConstraint(a_demand, demand_flights, demand_flights),
+                LinearConstraint(a_hours, -np.inf, available),
+            ],
+            options={'time_limit': time_limit, 'mip_rel_gap': MIP_GAP},
+        )
+    else:
+        result = linprog(
+            c, A_ub=a_hours, b_ub=available, A_eq=a_demand, b_eq=demand_flights,
+            bounds=(0, None), method='highs',
+        )
+    if result.x is None:
+        raise RuntimeError(f'Fleet assignment failed: {result.message}')
+
+    solution = np.round(result.x, 6)
+    if integer:
+        solution = np.round(solution)
+    x, unmet = solution[:n], solution[n:]
+
+    assignments = []
+    for k in np.flatnonzero(x > 0):
+        origin, destination, aircraft_type = keys[k]
+        assignments.append({
+            'origin': origin,
+            'destination': destination,
+            'aircraft_type': aircraft_type,
+            'route_id': int(route_ids[k]),
+            'flights': float(x[k]),
+            'block_hours': round(float(x[k] * hours[k]), 2),
+            'fuel_kg': round(float(x[k] * fuel[k]), 2),
+            'co2_kg': round(float(x[k] * fuel[k] * co2_per_kg_fuel), 2),
+        })
+    assignments.sort(key=lambda item: (item['origin'], item['destination'], -item['flights']))
+
+    hours_used = np.bincount(cols, weights=x * hours, minlength=len(types))
+    # What every pair would emit with its single best aircraft and no fleet limit
+    best_cost = np.full(n_pairs, np.inf)
+    np.minimum.at(best_cost, rows, fuel)
+    served = np.isfinite(best_cost)
+    unconstrained_fuel = float((best_cost[served] * demand_flights[served]).sum())
+    total_fuel = float(x @ fuel)
+
+    return {
+        'status': 'optimal' if result.status == 0 else result.message,
+        'objective': objective,
+        'integer': integer,
+        'solve_ms': round((time.perf_counter() - started) * 1000, 1),
+        'co2_per_kg_fuel': co2_per_kg_fuel,
+        'totals': {
+            'pairs': n_pairs,
+            'candidates': n,
+            'flights': float(demand_flights.sum()),
+            'flights_assigned': float(x.sum()),
+            'flights_unmet': float(unmet.sum()),
+            'fuel_kg': round(total_fuel, 2),
+            'co2_kg': round(total_fuel * co2_per_kg_fuel, 2),
+            'unconstrained_co2_kg': round(unconstrained_fuel * co2_per_kg_fuel, 2),
+        },
+        'assignments': assignments,
+        'unmet': [
+            {'origin': pairs[p][0], 'destination': pairs[p][1], 'flights': float(unmet[p]),
+             'no_candidate': not served[p]}
+            for p in np.flatnonzero(unmet > 0)
+        ],
+        'fleet': [
+            {
+                'aircraft_type': aircraft_type,
+                'count': counts[aircraft_type],
+                'hours_available': round(float(available[i]), 2),
+                'hours_used': round(float(hours_used[i]), 2),
+                'utilisation': round(float(hours_used[i] / available[i]), 4) if available[i] else 0.0,
+            }
+            for i, aircraft_type in enumerate(types)
+        ],
+    }
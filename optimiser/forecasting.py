@@ -0,0 +1,261 @@
+"""
+Batched monthly CO2 forecasts for many series at once.
+
+Every series at a level (all routes, each origin/destination pair, each
+aircraft type) shares the same monthly time axis. That means one design matrix
+(intercept, linear trend and Fourier seasonal terms) serves them all, and a
+single least-squares solve fits every series together:
+
+    B = lstsq(X, Y)    X: months x terms,  Y: months x series
+
+Prediction intervals come from each series' residual variance and the shared
+(X'X)^-1. Refreshing thousands of series costs about as much as one grouped
+query plus a small matrix solve.
+"""
+from datetime import date, datetime, timezone as dt_timezone
+
+import numpy as np
+from django.db import connection, models, transaction
+from django.db.models.functions import Substr, TruncMonth
+from django.utils import timezone
+
+from .models import FlightRoute, EmissionRecord, EmissionForecast
+
+LEVELS = {
+    'TOTAL': [],
+    'ROUTE': ['origin', 'destination'],
+    'AIRCRAFT': ['aircraft_type'],
+}
+DEFAULT_HISTORY = 24  # months of history used for fitting
+DEFAULT_HORIZON = 6  # months forecast
+MIN_ACTIVE_MONTHS = 3  # series with fewer months of activity are skipped
+INTERVAL = 0.95
+
+
+def _month_index(value):
+    if isinstance(value, str):
+        return int(value[:4]) * 12 + int(value[5:7]) - 1
+    return value.year * 12 + value.month - 1
+
+
+def _month_start(index):
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _month_expression():
+    if connection.vendor == 'sqlite':
+        # SQLite keeps UTC datetimes as text; slicing 'YYYY-MM' avoids a Python function call per row
+        return Substr('calculation_date', 1, 7)
+    return TruncMonth('calculation_date', tzinfo=dt_timezone.utc)
+
+
+def monthly_matrices(levels, history=DEFAULT_HISTORY):
+    """
+    Return (first month index, {level: (series keys, Y)}) where Y[t, s] is the CO2 of
+    series s in month t, over at most the last `history` complete months up to the
+    latest record. The current month is left out: it is still filling up, and its
+    partial total would pull every trend down.
+    One grouped query by (route, month) serves every level; the per-level sums are
+    done in NumPy.
+    """
+    bounds = EmissionRecord.objects.aggregate(
+        earliest=models.Min('calculation_date'), latest=models.Max('calculation_date')
+    )
+    last = _month_index(bounds['latest']) if bounds['latest'] is not None else None
+    if last is not None:
+        last = min(last, _month_index(timezone.now().astimezone(dt_timezone.utc)) - 1)
+    if last is None or last < _month_index(bounds['earliest']):
+        return 0, {level: ([], np.zeros((0, 0))) for level in levels}
+
+    # Months before the first record would only add zeros that drag the trend down
+    history = min(history, last - _month_index(bounds['earliest']) + 1)
+    first = last - history + 1
+    rows = list(
+        EmissionRecord.objects
+        .filter(
+            calculation_date__gte=datetime(first // 12, first % 12 + 1, 1, tzinfo=dt_timezone.utc),
+            calculation_date__lt=datetime((last + 1) // 12, (last + 1) % 12 + 1, 1, tzinfo=dt_timezone.utc),
+        )
+        .annotate(month=_month_expression())
+        .values('route_id', 'month')
+        .annotate(co2=models.Sum('co2_kg'))
+        .order_by()
+        .values_list('route_id', 'month', 'co2')
+    )
+    route_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    months = np.fromiter((_month_index(row[1]) - first for row in rows), dtype=np.int64, count=len(rows))
+    co2 = np.fromiter((row[2] or 0.0 for row in rows), dtype=float, count=len(rows))
+
+    fields = sorted({field for level in levels for field in LEVELS[level]})
+    labels = {}
+    if fields and len(rows):
+        labels = {row[0]: row[1:] for row in FlightRoute.objects.values_list('id', *fields).iterator(chunk_size=10000)}
+    size = int(route_ids.max()) + 1 if len(rows) else 0
+
+    matrices = {}
+    for level in levels:
+        positions = [fields.index(field) for field in LEVELS[level]]
+        keys = {}
+        # Dense lookup from route id to this level's series column
+        column_of_route = np.zeros(size, dtype=np.int64)
+        for route_id in np.unique(route_ids).tolist():
+            label = labels.get(route_id, ())
+            key = tuple(label[i] for i in positions) if label else ()
+            column_of_route[route_id] = keys.setdefault(key, len(keys))
+        columns = column_of_route[route_ids]
+        flat = np.bincount(months * len(keys) + columns, weights=co2, minlength=history * len(keys))
+        matrices[level] = (list(keys), flat.reshape(history, len(keys)))
+    return first, matrices
+
+
+def design_matrix(months, period=12, harmonics=None):
+    """Intercept, trend and sin/cos seasonal terms; seasonality only when there is history to fit it"""
+    t = np.asarray(months, dtype=float)
+    if harmonics is None:
+        n = len(t)
+        harmonics = 2 if n >= 24 else 1 if n >= 12 else 0
+    columns = [np.ones_like(t), t]
+    for k in range(1, harmonics + 1):
+        angle = 2 * np.pi * k * t / period
+        columns += [np.sin(angle), np.cos(angle)]
+    return np.column_stack(columns), harmonics
+
+
+def _t_quantile(probability, dof):
+    try:
+        from scipy.stats import t as student_t
+        return float(student_t.ppf(probability, dof))
+    except ImportError:
+        return 1.959964  # normal approximation
+
+
+def fit_forecasts(Y, horizon=DEFAULT_HORIZON, interval=INTERVAL):
+    """
+    Fit every column of Y in one least-squares solve.
+    Returns (predicted, lower, upper), each of shape (horizon, series), clipped at zero.
+    """
+    history, series = Y.shape
+    X, harmonics = design_matrix(np.arange(history))
+    # Drop seasonal terms if they would leave too few residual degrees of freedom
+    while X.shape[1] >= history - 1 and harmonics > 0:
+        X, harmonics = design_matrix(np.arange(history), harmonics=harmonics - 1)
+    terms = X.shape[1]
+    dof = max(history - terms, 1)
+
+    coefficients, _, _, _ = np.linalg.lstsq(X, Y, rcond=None)
+    residuals = Y - X @ coefficients
+    sigma2 = (residuals ** 2).sum(axis=0) / dof
+
+    future, _ = design_matrix(np.arange(history, history + horizon), harmonics=harmonics)
+    predicted = future @ coefficients
+    # Leverage of each future month: x0' (X'X)^-1 x0, shared by all series
+    leverage = np.einsum('ij,jk,ik->i', future, np.linalg.pinv(X.T @ X), future)
+    spread = _t_quantile(0.5 + interval / 2, dof) * np.sqrt(np.outer(1 + leverage, sigma2))
+
+    return (
+        np.maximum(predicted, 0),
+        np.maximum(predicted - spread, 0),
+        np.maximum(predicted + spread, 0),
+    )
+
+
+def refresh_forecasts(levels=None, history=DEFAULT_HISTORY, horizon=DEFAULT_HORIZON,
+                      min_active_months=MIN_ACTIVE_MONTHS, batch_size=5000, progress=None):
+    """Recompute forecasts for the given levels and replace the stored rows. Returns row counts per level."""
+    levels = levels or list(LEVELS)
+    stamp = connection.ops.adapt_datetimefield_value(timezone.now())
+    counts = {}
+    if progress:
+        progress(0.0, 'Summing monthly emissions')
+    first, matrices = monthly_matrices(levels, history)
+
+    for position, level in enumerate(levels):
+        if progress:
+            progress(position / len(levels), f'Forecasting {level.lower()} series')
+        keys, Y = matrices[level]
+        active = (Y > 0).sum(axis=0) >= min_active_months if len(keys) else np.zeros(0, dtype=bool)
+        keys = [key for key, keep in zip(keys, active) if keep]
+        Y = Y[:, active]
+
+        months_fitted = Y.shape[0]
+
+        rows = []
+        if keys and months_fitted >= 3:
+            predicted, lower, upper = fit_forecasts(Y, horizon)
+            months = [
+                connection.ops.adapt_datefield_value(_month_start(first + months_fitted + step))
+                for step in range(horizon)
+            ]
+            predicted, lower, upper = (np.round(values, 2).tolist() for values in (predicted, lower, upper))
+            for column, key in enumerate(keys):
+                origin, destination, aircraft_type = _series_fields(level, key)
+                for step, month in enumerate(months):
+                    rows.append((
+                        level, origin, destination, aircraft_type, month,
+                        predicted[step][column], lower[step][column], upper[step][column],
+                        months_fitted, stamp,
+                    ))
+
+        with transaction.atomic():
+            EmissionForecast.objects.filter(level=level).delete()
+            _insert_forecasts(rows, batch_size)
+        counts[level] = len(rows) // horizon
+
+    if progress:
+        progress(1.0, 'Forecasts refreshed')
+    return counts
+
+
+def _series_fields(level, key):
+    """(origin, destination, aircraft_type) labels of a series"""
+    if level == 'ROUTE':
+        return key[0], key[1], ''
+    if level == 'AIRCRAFT':
+        return '', '', key[0]
+    return '', '', ''
+
+
+INSERT_FIELDS = ['level', 'origin', 'destination', 'aircraft_type', 'month', 'predicted_co2_kg',
+                 'lower_co2_kg', 'upper_co2_kg', 'history_months', 'fitted_at']
+
+
+def _insert_forecasts(rows, batch_size):
+    """
+    Plain executemany inserts: a refresh writes hundreds of thousands of rows and
+    building model instances for bulk_create costs far more than the fit itself.
+    """
+    qn = connection.ops.quote_name
+    columns = [EmissionForecast._meta.get_field(field).column for field in INSERT_FIELDS]
+    sql = (
+        f'INSERT INTO {qn(EmissionForecast._meta.db_table)} ({", ".join(qn(c) for c in columns)}) '
+        f'VALUES ({", ".join(["%s"] * len(columns))})'
+    )
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[start:start + batch_size])
+
+
+SERIES_ORDER = ('origin', 'destination', 'aircraft_type', 'month')
+
+
+def forecast_payload(rows):
+    """Group stored forecast rows (ordered by SERIES_ORDER) into one entry per series for the API"""
+    series = {}
+    for row in rows:
+        key = (row.level, row.origin, row.destination, row.aircraft_type)
+        entry = series.setdefault(key, {
+            'level': row.level,
+            'origin': row.origin or None,
+            'destination': row.destination or None,
+            'aircraft_type': row.aircraft_type or None,
+            'fitted_at': row.fitted_at,
+            'months': [],
+            'predicted_co2_kg': [],
+            'lower_co2_kg': [],
+            'upper_co2_kg': [],
+        })
+        entry['months'].append(row.month.strftime('%Y-%m'))
+        entry['predicted_co2_kg'].append(row.predicted_co2_kg)
+        entry['lower_co2_kg'].append(row.lower_co2_kg)
+        entry['upper_co2_kg'].append(row.upper_co2_kg)
+    return list(series.values())
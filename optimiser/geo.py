@@ -0,0 +1,188 @@
+"""
+Nearest-airport lookups for route-not-found responses.
+
+Served origins and destinations are placed in BallTrees using haversine
+distance, and served origin/destination pairs are placed in a KD-tree over
+their unit-sphere positions. A miss then costs a few tree queries in memory
+instead of full DISTINCT scans, and the response only lists the K closest
+alternatives. The trees are rebuilt whenever the typeahead index is rebuilt,
+so they follow the same invalidation as the route catalog, and when airport
+coordinates change.
+
+Coordinates come from the latitude and longitude of the Airport table, set in
+the admin or with `manage.py load_airports`. Served cities without them are
+left out of the trees and logged.
+"""
+import logging
+import threading
+
+import numpy as np
+from django.db.models import Count
+
+from .models import FlightRoute, Airport
+from .search import get_index, normalise
+
+logger = logging.getLogger(__name__)
+
+try:
+    from sklearn.neighbors import BallTree, KDTree
+except ImportError:  # fall back to brute force numpy distances
+    BallTree = KDTree = None
+
+EARTH_RADIUS_KM = 6371.0
+DEFAULT_K = 5
+
+class _Locations:
+    """(lat, lon) in degrees of a city name or IATA code, from the Airport table"""
+
+    def __init__(self):
+        self.by_key = {}
+        self.by_code = {}
+        airports = Airport.objects.filter(latitude__isnull=False, longitude__isnull=False)
+        for key, iata, latitude, longitude in airports.values_list('key', 'iata', 'latitude', 'longitude'):
+            self.by_key[key] = (latitude, longitude)
+            if iata:
+                self.by_code.setdefault(normalise(iata), (latitude, longitude))
+
+    def __call__(self, name):
+        key = normalise(name)
+        return self.by_key.get(key) or self.by_code.get(key)
+
+
+def _unit_vectors(points):
+    """Degrees (n, 2) -> points on the unit sphere (n, 3)"""
+    lat, lon = np.radians(points[:, 0]), np.radians(points[:, 1])
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+class _CityTree:
+    """Haversine nearest-neighbour search over one set of served cities"""
+
+    def __init__(self, names, locate):
+        located = [(name, locate(name)) for name in names]
+        self.names = [name for name, point in located if point]
+        self.points = np.radians(np.array([point for _, point in located if point], dtype=float).reshape(-1, 2))
+        self.tree = BallTree(self.points, metric='haversine') if BallTree and len(self.names) else None
+
+    def nearest(self, point, k):
+        k = min(k, len(self.names))
+        if not k:
+            return []
+        query = np.radians(np.array([point], dtype=float))
+        if self.tree is not None:
+            distances, indices = self.tree.query(query, k=k)
+            distances, indices = distances[0], indices[0]
+        else:
+            lat1, lon1 = query[0]
+            lat2, lon2 = self.points[:, 0], self.points[:, 1]
+            a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+            all_distances = 2 * np.arcsin(np.sqrt(a))
+            indices = np.argsort(all_distances)[:k]
+            distances = all_distances[indices]
+        return [
+            {'name': self.names[i], 'distance_km': round(float(d) * EARTH_RADIUS_KM, 1)}
+            for d, i in zip(distances, indices)
+        ]
+
+
+class _PairTree:
+    """Nearest served (origin, destination) pairs, measured end to end"""
+
+    def __init__(self, pairs, locate):
+        located = [(pair, locate(pair[0]), locate(pair[1])) for pair in pairs]
+        located = [(pair, o, d) for pair, o, d in located if o and d]
+        self.pairs = [pair for pair, _, _ in located]
+        if self.pairs:
+            origins = _unit_vectors(np.array([o for _, o, _ in located], dtype=float))
+            destinations = _unit_vectors(np.array([d for _, _, d in located], dtype=float))
+            self.vectors = np.hstack([origins, destinations])
+        else:
+            self.vectors = np.empty((0, 6))
+        self.tree = KDTree(self.vectors) if KDTree and self.pairs else None
+
+    def nearest(self, origin_point, destination_point, k):
+        k = min(k, len(self.pairs))
+        if not k:
+            return []
+        query = np.hstack([
+            _unit_vectors(np.array([origin_point], dtype=float)),
+            _unit_vectors(np.array([destination_point], dtype=float)),
+        ])
+        if self.tree is not None:
+            _, indices = self.tree.query(query, k=k)
+            indices = indices[0]
+        else:
+            indices = np.argsort(np.linalg.norm(self.vectors - query, axis=1))[:k]
+
+        results = []
+        for i in indices:
+            vector = self.vectors[i]
+            origin, destination = self.pairs[i]
+            results.append({
+                'origin': origin,
+                'destination': destination,
+                'origin_offset_km': round(float(_chord_to_km(np.linalg.norm(vector[:3] - query[0, :3]))), 1),
+                'destination_offset_km': round(float(_chord_to_km(np.linalg.norm(vector[3:] - query[0, 3:]))), 1),
+            })
+        return results
+
+
+class GeoIndex:
+    def __init__(self, origins, destinations, pairs, locate=None):
+        self.locate = locate or _Locations()
+        self.origins = _CityTree(origins, self.locate)
+        self.destinations = _CityTree(destinations, self.locate)
+        self.pairs = _PairTree(pairs, self.locate)
+        self.unlocated = sorted({name for name in [*origins, *destinations] if not self.locate(name)})
+        if self.unlocated:
+            logger.warning(
+                '%d served cities have no coordinates and get no nearest-airport suggestions: %s%s',
+                len(self.unlocated), ', '.join(self.unlocated[:20]), ' ...' if len(self.unlocated) > 20 else '',
+                extra={'event': 'geo.unlocated', 'count': len(self.unlocated)},
+            )
+
+    def alternatives(self, origin, destination, k=DEFAULT_K):
+        """Nearest served origins, destinations and routes for a requested pair"""
+        origin_point = self.locate(origin)
+        destination_point = self.locate(destination)
+        return {
+            'nearest_origins': self.origins.nearest(origin_point, k) if origin_point else [],
+            'nearest_destinations': self.destinations.nearest(destination_point, k) if destination_point else [],
+            'nearest_routes': (
+                self.pairs.nearest(origin_point, destination_point, k)
+                if origin_point and destination_point else []
+            ),
+        }
+
+
+_lock = threading.Lock()
+_state = {'source': None, 'index': None}
+
+
+def mark_stale():
+    """Rebuild the index on next use, e.g. after airport coordinates changed"""
+    _state['source'] = None
+
+
+def get_geo_index():
+    """Return the geo index, rebuilding it when the typeahead index has been rebuilt"""
+    source = get_index()
+    if _state['source'] is not source:
+        with _lock:
+            if _state['source'] is not source:
+                pairs = FlightRoute.objects.values_list('origin', 'destination').annotate(routes=Count('id')).order_by()
+                _state['index'] = GeoIndex(
+                    source.top('origin', None),
+                    source.top('destination', None),
+                    [(origin, destination) for origin, destination, _ in pairs],
+                )
+                _state['source'] = source
+    return _state['index']
+
+
+def nearest_alternatives(origin, destination, k=DEFAULT_K):
+    return get_geo_index().alternatives(origin, destination, k)
@@ -0,0 +1,289 @@
+"""
+Lightweight background job queue stored in the application database.
+
+Jobs are rows in the Job table. Web requests enqueue them and `manage.py runworker`
+claims and runs them, so long operations do not need an external broker and do
+not tie up web workers. Failed jobs are retried with exponential backoff and
+each job kind can be limited to a number of concurrently running jobs.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, models, transaction
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+RETRY_DELAY = getattr(settings, 'JOB_RETRY_DELAY', 30)  # seconds, doubled on each attempt
+HEARTBEAT_INTERVAL = getattr(settings, 'JOB_HEARTBEAT_INTERVAL', 60)  # seconds between refreshes of locked_at
+STALE_AFTER = getattr(settings, 'JOB_STALE_AFTER', 600)  # seconds without a heartbeat before a RUNNING job is presumed dead
+CONCURRENCY_OVERRIDES = getattr(settings, 'JOB_CONCURRENCY', {})
+
+_registry = {}
+
+
+class JobContext:
+    """Handed to job handlers so they can report progress"""
+
+    def __init__(self, job):
+        self.job = job
+
+    def progress(self, fraction, message=''):
+        """Record progress as a fraction between 0 and 1"""
+        fraction = min(max(float(fraction), 0.0), 1.0)
+        Job.objects.filter(pk=self.job.pk).update(
+            progress=fraction, progress_message=message[:255], locked_at=timezone.now()
+        )
+        self.job.progress = fraction
+        self.job.progress_message = message
+
+    def save_artifact(self, data):
+        """Store a file produced by the job (e.g. a PDF) so web workers can serve it"""
+        Job.objects.filter(pk=self.job.pk).update(artifact=data)
+
+
+def job(kind, concurrency=None, max_attempts=3):
+    """
+    Register a function as the handler for a job kind.
+    The handler is called as handler(context, **payload) and its return value
+    (which must be JSON serialisable) is stored as the job result.
+    """
+    def decorator(func):
+        _registry[kind] = {
+            'handler': func,
+            'concurrency': CONCURRENCY_OVERRIDES.get(kind, concurrency),
+            'max_attempts': max_attempts,
+        }
+        return func
+    return decorator
+
+
+def _load_handlers():
+    # Handlers register themselves when the tasks module is imported
+    from . import tasks  # noqa: F401
+
+
+def enqueue(kind, payload=None, user=None, unique=False):
+    """
+    Queue a job and return it.
+    With unique=True an already queued or running job of the same kind, payload and
+    creator is returned instead.
+    """
+    _load_handlers()
+    if kind not in _registry:
+        raise ValueError(f'Unknown job kind: {kind}')
+    payload = payload or {}
+    created_by = user if user is not None and user.is_authenticated else None
+
+    if unique:
+        existing = Job.objects.defer('artifact').filter(
+            kind=kind, payload=payload, created_by=created_by, status__in=['QUEUED', 'RUNNING']
+        ).order_by('id').first()
+        if existing:
+            return existing
+
+    return Job.objects.create(
+        kind=kind,
+        payload=payload,
+        created_by=created_by,
+        max_attempts=_registry[kind]['max_attempts'],
+    )
+
+
+def _concurrency_limits():
+    return {kind: entry['concurrency'] for kind, entry in _registry.items() if entry['concurrency']}
+
+
+def _kinds_at_limit(limits):
+    """Job kinds that already have as many running jobs as they are allowed"""
+    if not limits:
+        return set()
+    running = Job.objects.filter(status='RUNNING', kind__in=limits).values('kind').annotate(count=models.Count('id'))
+    return {row['kind'] for row in running if row['count'] >= limits[row['kind']]}
+
+
+def _lock_kind(kind):
+    """
+    Hold claims of kind in other workers until the current transaction ends, so
+    the running count and the claim cannot interleave. SQLite needs no lock: it
+    runs one writing transaction at a time and fails the others as locked.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [f'optimiser.job:{kind}'])
+
+
+def claim(worker_id, kinds=None):
+    """Atomically mark the next runnable job as RUNNING for this worker, or return None"""
+    _load_handlers()
+    limits = _concurrency_limits()
+    kinds = set(kinds or _registry) & set(_registry)
+    # Unlocked first pass, so workers do not queue on the lock of a kind that is already full
+    kinds -= _kinds_at_limit(limits)
+    if not kinds:
+        return None
+
+    candidates = Job.objects.filter(
+        status='QUEUED', kind__in=kinds, run_after__lte=timezone.now()
+    ).order_by('run_after', 'id')
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        # Without row locks the conditional UPDATE alone decides which worker wins
+        return _claim_first(candidates, worker_id, limits)
+
+
+def _claim_first(candidates, worker_id, limits):
+    locked_kind = None
+    full = set()
+    for candidate_id, kind in candidates.values_list('id', 'kind')[:10]:
+        if kind in full:
+            continue
+        if kind in limits:
+            if locked_kind not in (None, kind):
+                # One kind lock per transaction, so two workers never wait on each other's
+                continue
+            if locked_kind is None:
+                _lock_kind(kind)
+                locked_kind = kind
+            if Job.objects.filter(kind=kind, status='RUNNING').count() >= limits[kind]:
+                full.add(kind)
+                continue
+        claimed = Job.objects.filter(pk=candidate_id, status='QUEUED').update(
+            status='RUNNING',
+            attempts=models.F('attempts') + 1,
+            locked_by=worker_id,
+            locked_at=timezone.now(),
+        )
+        if claimed:
+            return Job.objects.defer('artifact').get(pk=candidate_id)
+    return None
+
+
+def _heartbeat(job_obj, stop, interval):
+    """Refresh locked_at every interval seconds until stop is set, so the job is not requeued as stale"""
+    try:
+        while not stop.wait(interval):
+            try:
+                Job.objects.filter(pk=job_obj.pk, status='RUNNING', locked_by=job_obj.locked_by).update(
+                    locked_at=timezone.now()
+                )
+            except DatabaseError:
+                # e.g. SQLite locked by the job's own transaction - the next beat tries again
+                logger.warning('Could not refresh the lock of job %s', job_obj.pk)
+    finally:
+        # The thread has its own connection
+        connection.close()
+
+
+def run(job_obj, heartbeat_interval=HEARTBEAT_INTERVAL):
+    """Run a claimed job and record its outcome, scheduling a retry on failure"""
+    entry = _registry[job_obj.kind]
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(job_obj, stop, heartbeat_interval), daemon=True)
+    beat.start()
+    try:
+        result = entry['handler'](JobContext(job_obj), **job_obj.payload)
+    except Exception as e:
+        logger.exception('Job %s (%s) failed', job_obj.pk, job_obj.kind)
+        fields = {'error': traceback.format_exc(), 'locked_by': '', 'locked_at': None}
+        if job_obj.attempts < job_obj.max_attempts:
+            fields.update(
+                status='QUEUED',
+                run_after=timezone.now() + timedelta(seconds=RETRY_DELAY * 2 ** (job_obj.attempts - 1)),
+                progress_message=f'Retrying after error: {e}'[:255],
+            )
+        else:
+            fields.update(status='FAILED', finished_at=timezone.now())
+        Job.objects.filter(pk=job_obj.pk).update(**fields)
+        return False
+    finally:
+        stop.set()
+        beat.join()
+
+    Job.objects.filter(pk=job_obj.pk).update(
+        status='SUCCEEDED',
+        result=result,
+        progress=1.0,
+        error='',
+        locked_by='',
+        locked_at=None,
+        finished_at=timezone.now(),
+    )
+    return True
+
+
+def requeue_stale(stale_after=STALE_AFTER):
+    """Put RUNNING jobs whose worker has stopped sending heartbeats back on the queue"""
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    return Job.objects.filter(status='RUNNING', locked_at__lt=cutoff).update(
+        status='QUEUED', locked_by='', locked_at=None, run_after=timezone.now()
+    )
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def work(kinds=None, poll_interval=1.0, should_stop=None, once=False):
+    """
+    Claim and run jobs until should_stop() returns True.
+    With once=True the loop exits as soon as the queue has nothing runnable.
+    """
+    _load_handlers()
+    name = worker_id()
+    should_stop = should_stop or (lambda: False)
+    processed = 0
+    checked_stale_at = time.monotonic()
+
+    while not should_stop():
+        close_old_connections()
+        try:
+            # Jobs of a worker process that died while this one lives on
+            if time.monotonic() - checked_stale_at >= HEARTBEAT_INTERVAL:
+                checked_stale_at = time.monotonic()
+                requeued = requeue_stale()
+                if requeued:
+                    logger.warning('Worker %s requeued %s stale jobs', name, requeued)
+            job_obj = claim(name, kinds)
+        except DatabaseError:
+            # e.g. SQLite reporting the database as locked - try again shortly
+            logger.exception('Worker %s could not claim a job', name)
+            time.sleep(poll_interval)
+            continue
+        if job_obj is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        logger.info('Worker %s running job %s (%s)', name, job_obj.pk, job_obj.kind)
+        run(job_obj)
+        processed += 1
+
+    return processed
+
+
+def job_status(job_obj):
+    """Serialise a job for the status endpoints"""
+    return {
+        'id': job_obj.id,
+        'kind': job_obj.kind,
+        'status': job_obj.status,
+        'progress': round(job_obj.progress * 100, 1),
+        'message': job_obj.progress_message,
+        'attempts': job_obj.attempts,
+        'max_attempts': job_obj.max_attempts,
+        'result': job_obj.result,
+        'error': job_obj.error.strip().splitlines()[-1] if job_obj.error else '',
+        'created_at': job_obj.created_at,
+        'finished_at': job_obj.finished_at,
+    }
@@ -0,0 +1,210 @@
+"""
+Structured, asynchronous logging.
+
+Log calls only copy the record onto an in-memory queue. A background listener
+thread formats each record as one JSON line and writes it out, so request
+threads never wait on stdout. The queue is bounded: when it is full, the
+record is dropped and counted instead of blocking the request.
+
+Every record carries the id of the request it was logged from. The id is set by
+RequestIdMiddleware, taken from the X-Request-ID header or generated, and
+returned in the response. Events name what happened, e.g.
+logger.info('...', extra={'event': 'optimise.request', 'origin': ...}).
+Extra fields become keys of the JSON line. Busy events can be sampled with
+settings.LOG_SAMPLING = {'optimise.request': 0.1}. Sampling is decided per
+request, so a sampled request keeps all of its events. Warnings and errors
+are never sampled out.
+
+All of this is wired up by the LOGGING setting in flightcode/settings.py.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from django.core.signals import request_finished
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+_VALID_ID = re.compile(r'^[A-Za-z0-9._:-]{1,64}$')
+
+# Attributes every LogRecord has; anything else on a record came from extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+def get_request_id():
+    """Id of the request being handled by this thread or task, or None"""
+    return _request_id.get()
+
+
+class RequestIdMiddleware:
+    """Give every request an id for its log records and echo it in X-Request-ID"""
+
+    log = logging.getLogger('optimiser.requests')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        incoming = request.headers.get('X-Request-ID', '')
+        request.request_id = incoming if _VALID_ID.match(incoming) else uuid.uuid4().hex
+        # Cleared by request_finished rather than here, so that django.request's
+        # records, logged after the middleware returns, still get the id
+        _request_id.set(request.request_id)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        response['X-Request-ID'] = request.request_id
+        self.log.info('%s %s %s', request.method, request.path, response.status_code, extra={
+            'event': 'http.request',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+        })
+        return response
+
+
+def _clear_request_id(**kwargs):
+    _request_id.set(None)
+
+
+request_finished.connect(_clear_request_id, dispatch_uid='optimiser.logs.clear_request_id')
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request id. Handler filters run in the thread that logged"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = _request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of the records of busy events. rates maps an event name
+    to the fraction kept; events not listed are always kept, and so is anything
+    at WARNING or above.
+    """
+
+    def __init__(self, rates=None, name=''):
+        super().__init__(name)
+        self.rates = {event: float(rate) for event, rate in (rates or {}).items()}
+
+    def filter(self, record):
+        rate = self.rates.get(getattr(record, 'event', None))
+        if rate is None or rate >= 1.0 or record.levelno >= logging.WARNING:
+            return True
+        request_id = getattr(record, 'request_id', None) or _request_id.get()
+        if request_id:
+            # The same draw for every event of a request: its records are kept or dropped together
+            draw = zlib.crc32(request_id.encode()) / 0xFFFFFFFF
+        else:
+            draw = random.random()
+        if draw >= rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event, message, request_id and the extra fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': getattr(record, 'event', None),
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class AsyncHandler(QueueHandler):
+    """
+    Queue records and write them from a listener thread. The listener is started on
+    the first record and again in a forked child (the parent's thread does not exist
+    there), and drained when the process exits.
+    """
+
+    def __init__(self, stream='stdout', max_size=10000):
+        self.max_size = max_size
+        self.target = logging.StreamHandler(sys.stderr if stream == 'stderr' else sys.stdout)
+        self.target.setFormatter(JsonFormatter())
+        self._start_lock = threading.Lock()
+        self.dropped = 0
+        super().__init__(None)
+        self._reset()
+        atexit.register(self.stop)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self.queue = queue.Queue(maxsize=self.max_size)
+        self._listener = None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._listener is not None:
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._reset()
+            if self._listener is None:
+                self._listener = QueueListener(self.queue, self.target)
+                self._listener.start()
+
+    def setFormatter(self, fmt):
+        # Formatting happens in the listener thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Merge the arguments and render any traceback now: the record is read later,
+        # by another thread, after the objects they refer to may have changed
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.target.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        self._ensure_started()
+        super().emit(record)
+
+    def stop(self):
+        """Write out whatever is still queued and stop the listener thread"""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+        self.target.flush()
+
+    def close(self):
+        self.stop()
+        super().close()
@@ -0,0 +1,87 @@
+import csv
+import json
+from django.core.management.base import BaseCommand, CommandError
+from optimiser.fleet import assign_fleet, FleetInputError, HOURS_PER_AIRCRAFT, TIME_LIMIT, OBJECTIVES
+from optimiser.models import FlightRoute
+
+class Command(BaseCommand):
+    help = 'Assign a limited fleet to routes so that total CO2 (or fuel) is lowest'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fleet', help='CSV with aircraft_type,count columns')
+        parser.add_argument('--aircraft', action='append', default=[], metavar='TYPE=COUNT',
+                            help='Aircraft available, may be repeated (added to --fleet)')
+        parser.add_argument('--demand', help='CSV with origin,destination,flights columns (default: every stored pair)')
+        parser.add_argument('--flights', type=int, default=7, help='Flights per pair when --demand is not given')
+        parser.add_argument('--objective', choices=OBJECTIVES, default='co2')
+        parser.add_argument('--hours-per-aircraft', type=float, default=HOURS_PER_AIRCRAFT,
+                            help='Block hours each aircraft can fly in the period')
+        parser.add_argument('--relaxed', action='store_true', help='Allow fractional flights (LP only, faster)')
+        parser.add_argument('--time-limit', type=float, default=TIME_LIMIT, help='Seconds for the integer solve')
+        parser.add_argument('--output', help='Write the assignments to this CSV file')
+        parser.add_argument('--json', action='store_true', help='Print the full result as JSON')
+
+    def _read_csv(self, path, columns):
+        try:
+            with open(path, newline='') as f:
+                rows = list(csv.DictReader(f))
+        except OSError as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+        if rows and not set(columns) <= set(rows[0]):
+            raise CommandError(f'{path} needs the columns {", ".join(columns)}')
+        return rows
+
+    def handle(self, *args, **options):
+        fleet = {}
+        if options['fleet']:
+            for row in self._read_csv(options['fleet'], ('aircraft_type', 'count')):
+                fleet[row['aircraft_type']] = fleet.get(row['aircraft_type'], 0) + int(row['count'])
+        for item in options['aircraft']:
+            aircraft_type, _, count = item.rpartition('=')
+            if not aircraft_type or not count.isdigit():
+                raise CommandError(f'--aircraft expects TYPE=COUNT, got {item}')
+            fleet[aircraft_type] = fleet.get(aircraft_type, 0) + int(count)
+
+        if options['demand']:
+            demand = self._read_csv(options['demand'], ('origin', 'destination', 'flights'))
+        else:
+            pairs = FlightRoute.objects.values_list('origin', 'destination').distinct().order_by()
+            demand = [{'origin': o, 'destination': d, 'flights': options['flights']} for o, d in pairs]
+
+        try:
+            result = assign_fleet(
+                fleet,
+                demand,
+                objective=options['objective'],
+                hours_per_aircraft=options['hours_per_aircraft'],
+                integer=not options['relaxed'],
+                time_limit=options['time_limit'],
+            )
+        except FleetInputError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            fields = ['origin', 'destination', 'aircraft_type', 'route_id', 'flights', 'block_hours', 'fuel_kg', 'co2_kg']
+            with open(options['output'], 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(result['assignments'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+
+        for row in result['fleet']:
+            self.stdout.write(
+                f"{row['aircraft_type']}: {row['count']} aircraft, "
+                f"{row['hours_used']:.0f}/{row['hours_available']:.0f} h ({row['utilisation']:.0%})"
+            )
+        totals = result['totals']
+        self.stdout.write(
+            f"{totals['flights_assigned']:.0f} of {totals['flights']:.0f} flights assigned over {totals['pairs']} pairs, "
+            f"{totals['flights_unmet']:.0f} unmet"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['status']} in {result['solve_ms'] / 1000:.1f}s: {totals['co2_kg']:.0f} kg CO2 "
+            f"({totals['fuel_kg']:.0f} kg fuel)"
+        ))
@@ -4,7 +4,19 @@ from django.db import connection, ProgrammingError
 class Command(BaseCommand):
     help = 'Ensures the database is properly set up with required tables'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--background', action='store_true',
+                            help='Apply migrations now and queue the table checks as a background job')
+
     def handle(self, *args, **options):
+        if options['background']:
+            from django.core.management import call_command
+            from optimiser.jobs import enqueue
+            call_command('migrate', '--noinput')
+            job = enqueue('ensure_database_setup', unique=True)
+            self.stdout.write(self.style.SUCCESS(f'Queued database setup checks as job {job.id}'))
+            return
+        
         self.stdout.write('Checking database setup...')
         
         # Check if FlightRoute table exists
@@ -0,0 +1,39 @@
+import json
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    help = 'Export flight routes and emission records as partitioned Parquet datasets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', type=str, default='exports/parquet', help='Directory to write the datasets to')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Rows fetched from the database per batch')
+        parser.add_argument('--tables', nargs='+', choices=['routes', 'emissions'], default=['routes', 'emissions'],
+                            help='Tables to export')
+        parser.add_argument('--summary', action='store_true',
+                            help='Print the analytics and predictive summaries computed from the exported data')
+
+    def handle(self, *args, **options):
+        try:
+            import pandas  # noqa: F401
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            self.stdout.write(self.style.ERROR(f'Missing required package: {e.name}'))
+            self.stdout.write('Please install the required packages with: pip install pandas pyarrow')
+            return
+
+        from optimiser.columnar import export_parquet, read_parquet, analytics_summary, predictive_summary
+
+        output_dir = options['output_dir']
+        self.stdout.write(f'Exporting {", ".join(options["tables"])} to {output_dir}...')
+
+        counts = export_parquet(output_dir, chunk_size=options['chunk_size'], tables=options['tables'])
+        for table, count in counts.items():
+            self.stdout.write(self.style.SUCCESS(f'Wrote {count} {table} rows'))
+
+        if options['summary']:
+            routes, emissions = read_parquet(output_dir)
+            summary = {
+                'analytics': analytics_summary(routes, emissions),
+                'predictive': predictive_summary(routes, emissions),
+            }
+            self.stdout.write(json.dumps(summary, indent=2, default=str))
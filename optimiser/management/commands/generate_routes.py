@@ -1,8 +1,9 @@
 from django.core.management.base import BaseCommand
-from optimiser.models import FlightRoute
+from optimiser.profiling import ProfileCommandMixin
+from optimiser.models import FlightRoute, Airport, AircraftType
 import itertools
 
-class Command(BaseCommand):
+class Command(ProfileCommandMixin, BaseCommand):
     help = 'Generate missing routes between all airports and aircraft combinations'
 
     def add_arguments(self, parser):
@@ -10,9 +11,9 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         # Get all distinct origins, destinations and aircraft types
-        origins = set(FlightRoute.objects.values_list('origin', flat=True).distinct())
-        destinations = set(FlightRoute.objects.values_list('destination', flat=True).distinct())
-        aircraft_types = set(FlightRoute.objects.values_list('aircraft_type', flat=True).distinct())
+        origins = set(Airport.objects.origins().values_list('name', flat=True))
+        destinations = set(Airport.objects.destinations().values_list('name', flat=True))
+        aircraft_types = set(AircraftType.objects.in_use().values_list('name', flat=True))
         
         self.stdout.write(f'Found {len(origins)} origins, {len(destinations)} destinations, and {len(aircraft_types)} aircraft types')
         
@@ -1,11 +1,16 @@
 from django.core.management.base import BaseCommand
+from optimiser.profiling import ProfileCommandMixin
 from django.db import connection, ProgrammingError
 from django.core.management import call_command
 import time
 
-class Command(BaseCommand):
+class Command(ProfileCommandMixin, BaseCommand):
     help = 'Initialize the database with required tables and sample data'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--background', action='store_true',
+                            help='Apply migrations now and queue the remaining setup as a background job')
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Starting database initialization...'))
 
@@ -16,6 +21,13 @@ class Command(BaseCommand):
         self.stdout.write('Applying migrations...')
         call_command('migrate', '--noinput')
         
+        if options['background']:
+            # The job table exists now, so the slower checks can run on the worker
+            from optimiser.jobs import enqueue
+            job = enqueue('initialize_database', unique=True)
+            self.stdout.write(self.style.SUCCESS(f'Queued remaining initialization as job {job.id}'))
+            return
+        
         # Verify essential tables exist
         self.verify_and_create_tables()
         
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from optimiser.models import FlightRoute, AircraftEfficiency
+
+class Command(BaseCommand):
+    help = ('Link routes inserted by raw SQL (e.g. the synthesize load scripts) to their airports and '
+            'aircraft types, give them change versions and refresh what is derived from them')
+
+    def handle(self, *args, **options):
+        from optimiser.search import mark_stale
+        from optimiser.matrix import mark_changed
+        with transaction.atomic():
+            renamed = FlightRoute.objects.link_references()
+            stamped = FlightRoute.objects.stamp_unversioned()
+            AircraftEfficiency.rebuild()
+        # Raw inserts skip the signals that refresh the typeahead index and the efficiency matrix
+        mark_stale()
+        mark_changed()
+        self.stdout.write(self.style.SUCCESS(
+            f'Linked routes ({renamed} names changed to their canonical spelling), stamped {stamped} new routes'
+        ))
@@ -0,0 +1,21 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from optimiser.models import Airport
+
+class Command(BaseCommand):
+    help = 'Set airport codes and coordinates from a name,iata,latitude,longitude CSV (e.g. written by synthesize)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], newline='') as f:
+                rows = [(row['name'], row['iata'], row['latitude'], row['longitude']) for row in csv.DictReader(f)]
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f'Cannot read airports from {options["path"]}: {e}')
+        with transaction.atomic():
+            updated = Airport.objects.set_locations(rows)
+        self.stdout.write(self.style.SUCCESS(f'Located {updated} airports'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from optimiser.changes import prune_tombstones, TOMBSTONE_DAYS
+
+class Command(BaseCommand):
+    help = 'Delete the change feed records of routes deleted more than --days ago'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=TOMBSTONE_DAYS,
+                            help='Keep tombstones this many days; clients further behind must resync')
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} route tombstones'))
@@ -0,0 +1,46 @@
+import time
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from optimiser.factors import recompute_emissions
+from optimiser.models import EmissionFactor
+
+class Command(BaseCommand):
+    help = 'Restate stored EmissionRecord CO2 values with the emission factor in force on each calculation date'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--add-factor', nargs=3, metavar=('VERSION', 'CO2_PER_KG_FUEL', 'EFFECTIVE_FROM'),
+                            help='Record a new factor (effective date as YYYY-MM-DD) before recomputing')
+        parser.add_argument('--source', default='', help='Source of the factor given with --add-factor')
+        parser.add_argument('--since', type=date.fromisoformat, help='Only records calculated on or after this date')
+        parser.add_argument('--until', type=date.fromisoformat, help='Only records calculated before this date')
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Record ids per UPDATE statement')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the records that would change')
+
+    def handle(self, *args, **options):
+        if options['add_factor']:
+            version, value, effective_from = options['add_factor']
+            try:
+                factor = EmissionFactor.objects.create(
+                    version=version,
+                    co2_per_kg_fuel=float(value),
+                    effective_from=date.fromisoformat(effective_from),
+                    source=options['source'],
+                )
+            except ValueError as e:
+                raise CommandError(f'Invalid factor: {e}')
+            self.stdout.write(f'Added factor {factor}')
+
+        started = time.perf_counter()
+        changed = recompute_emissions(
+            since=options['since'],
+            until=options['until'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            progress=lambda fraction, done: self.stdout.write(f'{min(fraction, 1.0):.0%}: {done} records restated'),
+        )
+        if options['dry_run']:
+            self.stdout.write(f'{changed} records would be restated')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Restated {changed} records in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from optimiser import forecasting
+
+class Command(BaseCommand):
+    help = 'Refit monthly CO2 forecasts per route, per aircraft type and overall'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--levels', nargs='+', choices=list(forecasting.LEVELS), help='Only refresh these levels')
+        parser.add_argument('--history', type=int, default=forecasting.DEFAULT_HISTORY, help='Months of history to fit')
+        parser.add_argument('--horizon', type=int, default=forecasting.DEFAULT_HORIZON, help='Months to forecast')
+        parser.add_argument('--min-months', type=int, default=forecasting.MIN_ACTIVE_MONTHS,
+                            help='Skip series active in fewer months than this')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = forecasting.refresh_forecasts(
+            levels=options['levels'],
+            history=options['history'],
+            horizon=options['horizon'],
+            min_active_months=options['min_months'],
+            progress=lambda fraction, message: self.stdout.write(message),
+        )
+        for level, count in counts.items():
+            self.stdout.write(f'{level}: {count} series')
+        self.stdout.write(self.style.SUCCESS(f'Forecasts refreshed in {time.perf_counter() - started:.1f}s'))
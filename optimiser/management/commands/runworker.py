@@ -0,0 +1,67 @@
+import multiprocessing
+import signal
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from optimiser import jobs
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=getattr(settings, 'JOB_WORKER_PROCESSES', 2),
+                            help='Number of worker processes to run')
+        parser.add_argument('--kinds', nargs='+', help='Only run jobs of these kinds')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once there are no runnable jobs left')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+
+        requeued = jobs.requeue_stale()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale jobs'))
+
+        processes = max(options['processes'], 1)
+        self.stdout.write(self.style.SUCCESS(f'Starting {processes} job worker process(es)'))
+
+        if processes == 1:
+            processed = self.work(options)
+            self.stdout.write(self.style.SUCCESS(f'Worker stopped after {processed} jobs'))
+            return
+
+        # Children must not share the parent's database connections
+        connections.close_all()
+        pool = [
+            multiprocessing.Process(target=self.work, args=(options,), daemon=False)
+            for _ in range(processes)
+        ]
+        for process in pool:
+            process.start()
+
+        while not self.stopping and any(process.is_alive() for process in pool):
+            time.sleep(0.5)
+
+        for process in pool:
+            if process.is_alive():
+                process.terminate()
+        for process in pool:
+            process.join()
+        self.stdout.write(self.style.SUCCESS('All job workers stopped'))
+
+    def request_stop(self, signum, frame):
+        self.stopping = True
+
+    def work(self, options):
+        # Each worker process handles its own shutdown signals
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        return jobs.work(
+            kinds=options['kinds'],
+            poll_interval=options['poll_interval'],
+            should_stop=lambda: self.stopping,
+            once=options['once'],
+        )
@@ -0,0 +1,388 @@
+import csv
+import io
+import os
+import shlex
+import sys
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction, IntegrityError
+from django.db.models import Max
+from accounts.models import UserProfile
+from optimiser.models import FlightRoute, EmissionRecord, PassengerEcoScore, Airport
+from optimiser.utils import estimate_emissions
+from optimiser.factors import current_factor, DEFAULT_CO2_PER_KG_FUEL
+
+# Fuel burn in kg per km, as used by generate_routes
+AIRCRAFT = [
+    ('Boeing 737-800', 3.5),
+    ('Boeing 737-700', 3.6),
+    ('Boeing 737-900ER', 3.4),
+    ('Boeing 787-8', 3.0),
+    ('Boeing 787-9', 2.9),
+    ('Boeing 777-300ER', 3.8),
+    ('Airbus A320', 3.4),
+    ('Airbus A320neo', 3.2),
+    ('Airbus A350-900', 2.9),
+    ('Airbus A330-300', 3.3),
+    ('ATR 72-600', 2.2),
+    ('Embraer E190', 3.0),
+    ('Airbus A220-300', 2.8),
+]
+SYLLABLES = ['ka', 'lo', 'ma', 'ri', 'to', 'na', 'be', 'su', 'da', 'mi', 'ko', 'ra', 've', 'li', 'zu',
+             'po', 'an', 'el', 'or', 'ti', 'ba', 'ne', 'gu', 'sa', 'de', 'mo', 'ja', 'fe', 'ha', 'wi']
+USER_PREFIX = 'synth_'
+EARTH_RADIUS_KM = 6371.0
+
+
+def _badges(points):
+    """Badge for each points value, using the thresholds of PassengerScoreView"""
+    return np.select(
+        [points >= 1000, points >= 500, points >= 200, points >= 50],
+        ['PLATINUM', 'GOLD', 'SILVER', 'BRONZE'],
+        default='NONE',
+    )
+
+
+def _timestamps(seconds, start):
+    """Seconds after start -> 'YYYY-MM-DD HH:MM:SS' UTC strings that both SQLite and PostgreSQL accept"""
+    stamps = np.datetime64(start.replace(tzinfo=None), 's') + seconds.astype('timedelta64[s]')
+    return np.char.replace(np.datetime_as_string(stamps, unit='s'), 'T', ' ')
+
+
+class Command(BaseCommand):
+    help = 'Generate a large deterministic synthetic dataset (airports, routes, emissions, users) for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--airports', type=int, default=300, help='Number of airports')
+        parser.add_argument('--aircraft', type=int, default=len(AIRCRAFT), help='Number of aircraft types')
+        parser.add_argument('--routes', type=int, default=1_000_000, help='Number of FlightRoute rows')
+        parser.add_argument('--emissions', type=int, default=2_000_000, help='Number of EmissionRecord rows')
+        parser.add_argument('--months', type=int, default=12, help='Spread emission records over this many months')
+        parser.add_argument('--users', type=int, default=1000, help='Number of users with eco scores')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--end-date', help='Last day of generated activity, YYYY-MM-DD (default: today, UTC)')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per insert batch')
+        parser.add_argument('--output-dir', help='Also write CSV fixtures and SQLite/PostgreSQL load scripts here')
+        parser.add_argument('--no-load', action='store_true', help='Only write fixtures, do not touch the database')
+        parser.add_argument('--flush', action='store_true',
+                            help='Delete ALL existing routes and emission records, and earlier synthetic users, first')
+
+    def handle(self, *args, **options):
+        if options['no_load'] and not options['output_dir']:
+            raise CommandError('--no-load needs --output-dir')
+        if options['airports'] < 2 or options['aircraft'] < 1:
+            raise CommandError('Need at least 2 airports and 1 aircraft type')
+
+        self.batch_size = options['batch_size']
+        self.load = not options['no_load']
+        self.output_dir = options['output_dir']
+        self.files = []
+        try:
+            end_date = datetime.strptime(options['end_date'], '%Y-%m-%d') if options['end_date'] else datetime.utcnow()
+        except ValueError:
+            raise CommandError('--end-date must be YYYY-MM-DD')
+        # Timestamps are anchored to a date rather than to now so the same seed repeats exactly
+        self.end = end_date.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=dt_timezone.utc) + timedelta(days=1)
+        rng = np.random.default_rng(options['seed'])
+        self.use_copy = self.load and connection.vendor == 'postgresql'
+
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+        if self.load and options['flush']:
+            self.flush()
+
+        airports = self.make_airports(rng, options['airports'])
+        aircraft = self.make_aircraft(rng, options['aircraft'])
+        if self.output_dir:
+            self.write_airports(airports)
+
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    routes = self.write_routes(cursor, rng, airports, aircraft, options['routes'])
+                    self.write_emissions(cursor, rng, routes, options['emissions'], options['months'])
+                    self.write_users(cursor, rng, options['users'])
+                    if self.use_copy:
+                        models = [FlightRoute, EmissionRecord, User, UserProfile, PassengerEcoScore]
+                        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                            cursor.execute(sql)
+        except IntegrityError as e:
+            raise CommandError(f'Synthetic rows clash with existing data ({e}); run again with --flush')
+
+        if self.load:
+            # Raw inserts skip the save() hooks that set the airport and aircraft keys, the
+            # change versions and the per-aircraft efficiency averages, and the model signals
+            # that refresh the typeahead index and the efficiency matrix
+            Airport.objects.set_locations(airports)
+            call_command('link_routes', stdout=self.stdout)
+        if self.output_dir:
+            self.write_load_scripts()
+
+        self.stdout.write(self.style.SUCCESS(f'Synthetic dataset complete in {time.perf_counter() - started:.1f}s'))
+
+    def flush(self):
+        self.stdout.write(self.style.WARNING('Deleting existing emission records, routes and synthetic users...'))
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            # Plain DELETEs: the ORM would load every row to run cascades
+            cursor.execute(f'DELETE FROM {qn(EmissionRecord._meta.db_table)}')
+            cursor.execute(f'DELETE FROM {qn(FlightRoute._meta.db_table)}')
+        User.objects.filter(username__startswith=USER_PREFIX).delete()
+
+    def make_airports(self, rng, count):
+        """Unique pronounceable names with 3-letter codes and coordinates, spread over inhabited latitudes"""
+        names = set()
+        airports = []
+        while len(airports) < count:
+            parts = rng.choice(SYLLABLES, size=rng.integers(2, 5))
+            name = ''.join(parts).upper()
+            if name in names:
+                continue
+            names.add(name)
+            latitude = float(np.degrees(np.arcsin(rng.uniform(-0.8, 0.93))))
+            longitude = float(rng.uniform(-180, 180))
+            code = (name[0] + name[len(name) // 2] + name[-1]).upper()
+            airports.append((name, code, round(latitude, 4), round(longitude, 4)))
+        return airports
+
+    def make_aircraft(self, rng, count):
+        aircraft = AIRCRAFT[:count]
+        for number in range(len(aircraft), count):
+            aircraft.append((f'Synthetic Jet {number - len(AIRCRAFT) + 1}', round(float(rng.uniform(2.2, 3.8)), 2)))
+        return aircraft
+
+    def write_airports(self, airports):
+        path = os.path.join(self.output_dir, 'airports.csv')
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['name', 'iata', 'latitude', 'longitude'])
+            writer.writerows(airports)
+        self.stdout.write(f'Wrote {len(airports)} airports to {path}')
+
+    def write_routes(self, cursor, rng, airports, aircraft, count):
+        n_airports, n_aircraft = len(airports), len(aircraft)
+        space = n_airports * (n_airports - 1) * n_aircraft
+        if count > space:
+            self.stdout.write(self.style.WARNING(
+                f'Only {space} distinct routes exist for {n_airports} airports and {n_aircraft} aircraft; '
+                f'generating {space}'
+            ))
+            count = space
+
+        # Each index encodes one (origin, destination, aircraft) triple, so sampling without replacement keeps them unique
+        index = np.sort(rng.choice(space, size=count, replace=False))
+        aircraft_idx = index % n_aircraft
+        pair = index // n_aircraft
+        origin_idx = pair // (n_airports - 1)
+        destination_idx = pair % (n_airports - 1)
+        destination_idx += destination_idx >= origin_idx
+
+        coords = np.radians(np.array([(lat, lon) for _, _, lat, lon in airports]))
+        lat1, lon1 = coords[origin_idx, 0], coords[origin_idx, 1]
+        lat2, lon2 = coords[destination_idx, 0], coords[destination_idx, 1]
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        # Real tracks are a little longer than great circles
+        distance = np.maximum(np.round(2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a)) * 1.05), 100)
+
+        burn = np.array([rate for _, rate in aircraft])[aircraft_idx]
+        burn = np.where(distance > 5000, burn * 0.9, np.where(distance < 1000, burn * 1.1, burn))
+        fuel = np.round(distance * burn * rng.normal(1.0, 0.03, size=count))
+
+        first_id = self.first_id(FlightRoute)
+        ids = np.arange(first_id, first_id + count)
+        names = np.array([name for name, _, _, _ in airports], dtype=object)
+        aircraft_names = np.array([name for name, _ in aircraft], dtype=object)
+
+        efficiency = fuel / distance  # distances are at least 100 km
+
+        def chunks():
+            for start in range(0, count, self.batch_size):
+                end = start + self.batch_size
+                yield list(zip(
+                    ids[start:end].tolist(),
+                    names[origin_idx[start:end]].tolist(),
+                    names[destination_idx[start:end]].tolist(),
+                    aircraft_names[aircraft_idx[start:end]].tolist(),
+                    distance[start:end].tolist(),
+                    fuel[start:end].tolist(),
+                    efficiency[start:end].tolist(),
+                ))
+
+        fields = ['id', 'origin', 'destination', 'aircraft_type', 'distance_km', 'fuel_consumption_kg',
+                  'efficiency_kg_per_km']
+        self.emit(cursor, FlightRoute, fields, chunks(), count)
+        return {'ids': ids, 'fuel': fuel}
+
+    def write_emissions(self, cursor, rng, routes, count, months):
+        if not len(routes['ids']):
+            return
+        # A few popular routes account for most calculations
+        popularity = np.cumsum(rng.lognormal(0.0, 1.2, size=len(routes['ids'])))
+        popularity /= popularity[-1]
+
+        start = self.end - timedelta(days=30 * months)
+        span = int((self.end - start).total_seconds())
+        first_id = self.first_id(EmissionRecord)
+        # Fixtures written without loading may go to another database, so they carry no factor id
+        factor = current_factor() if self.load else None
+        factor_id = factor.id if factor else None
+        co2_per_kg_fuel = factor.co2_per_kg_fuel if factor else DEFAULT_CO2_PER_KG_FUEL
+
+        def chunks():
+            for offset in range(0, count, self.batch_size):
+                size = min(self.batch_size, count - offset)
+                picked = np.minimum(np.searchsorted(popularity, rng.random(size)), len(popularity) - 1)
+                fuel = routes['fuel'][picked]
+                saved = np.round(fuel * rng.beta(2, 12, size=size), 1)
+                yield list(zip(
+                    range(first_id + offset, first_id + offset + size),
+                    routes['ids'][picked].tolist(),
+                    _timestamps(np.sort(rng.integers(0, span, size=size)), start).tolist(),
+                    np.round(estimate_emissions(fuel, co2_per_kg_fuel), 1).tolist(),
+                    saved.tolist(),
+                    np.round(saved / np.maximum(fuel, 1) * 100, 2).tolist(),
+                    [factor_id] * size,
+                ))
+
+        fields = ['id', 'route', 'calculation_date', 'co2_kg', 'fuel_saved_kg', 'percent_improvement', 'factor']
+        self.emit(cursor, EmissionRecord, fields, chunks(), count)
+
+    def write_users(self, cursor, rng, count):
+        if not count:
+            return
+        first_user = self.first_id(User)
+        user_ids = np.arange(first_user, first_user + count)
+        joined = _timestamps(rng.integers(0, 365 * 86400, size=count), self.end - timedelta(days=365))
+        password = UNUSABLE_PASSWORD_PREFIX + 'synthetic'  # synthetic users cannot log in
+
+        usernames = [f'{USER_PREFIX}{user_id:07d}' for user_id in user_ids.tolist()]
+        users = [
+            (user_id, password, joined_at, False, username, '', '', f'{username}@example.com', False, True, joined_at)
+            for user_id, username, joined_at in zip(user_ids.tolist(), usernames, joined.tolist())
+        ]
+        fields = ['id', 'password', 'last_login', 'is_superuser', 'username', 'first_name', 'last_name',
+                  'email', 'is_staff', 'is_active', 'date_joined']
+        self.emit(cursor, User, fields, self.batches(users), count)
+
+        # Profiles are normally created by a post_save signal, which raw inserts do not send
+        first_profile = self.first_id(UserProfile)
+        profiles = [(first_profile + i, user_id, '', '') for i, user_id in enumerate(user_ids.tolist())]
+        self.emit(cursor, UserProfile, ['id', 'user', 'bio', 'profile_picture'], self.batches(profiles), count)
+
+        points = rng.lognormal(4.0, 1.2, size=count).astype(int)
+        co2_saved = np.round(points * 10 + rng.uniform(0, 10, size=count), 1)
+        flights = np.maximum(points // rng.integers(5, 50, size=count), 1)
+        first_score = self.first_id(PassengerEcoScore)
+        scores = list(zip(
+            range(first_score, first_score + count),
+            user_ids.tolist(),
+            points.tolist(),
+            flights.tolist(),
+            co2_saved.tolist(),
+            _badges(points).tolist(),
+        ))
+        fields = ['id', 'user', 'points', 'flights_optimized', 'total_co2_saved', 'current_badge']
+        self.emit(cursor, PassengerEcoScore, fields, self.batches(scores), count)
+
+    def batches(self, rows):
+        for start in range(0, len(rows), self.batch_size):
+            yield rows[start:start + self.batch_size]
+
+    def first_id(self, model):
+        if not self.load:
+            return 1
+        return (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+
+    def emit(self, cursor, model, fields, chunks, total):
+        """Insert chunks of row tuples into the model's table and/or append them to its CSV fixture"""
+        table = model._meta.db_table
+        columns = [model._meta.get_field(field).column for field in fields]
+        qn = connection.ops.quote_name
+        insert_sql = (
+            f'INSERT INTO {qn(table)} ({", ".join(qn(c) for c in columns)}) '
+            f'VALUES ({", ".join(["%s"] * len(columns))})'
+        )
+        copy_sql = f'COPY {qn(table)} ({", ".join(qn(c) for c in columns)}) FROM STDIN WITH (FORMAT csv)'
+
+        fixture = None
+        if self.output_dir:
+            filename = f'{table}.csv'
+            fixture = open(os.path.join(self.output_dir, filename), 'w', newline='')
+            writer = csv.writer(fixture)
+            writer.writerow(columns)
+            self.files.append((table, columns, filename))
+
+        started = time.perf_counter()
+        written = 0
+        try:
+            for rows in chunks:
+                if fixture:
+                    writer.writerows(_csv_row(row) for row in rows)
+                if self.load:
+                    if self.use_copy:
+                        buffer = io.StringIO()
+                        csv.writer(buffer).writerows(_csv_row(row) for row in rows)
+                        buffer.seek(0)
+                        cursor.copy_expert(copy_sql, buffer)
+                    else:
+                        cursor.executemany(insert_sql, rows)
+                written += len(rows)
+                if written % (self.batch_size * 20) < len(rows) or written == total:
+                    rate = written / max(time.perf_counter() - started, 1e-6)
+                    self.stdout.write(f'  {table}: {written}/{total} rows ({rate:,.0f} rows/s)')
+        finally:
+            if fixture:
+                fixture.close()
+        self.stdout.write(self.style.SUCCESS(f'{table}: {written} rows'))
+
+    def write_load_scripts(self):
+        """
+        Load scripts for the sqlite3 and psql shells, run from inside the output directory.
+        The fixtures hold raw rows, so once they are committed the scripts run manage.py to
+        link the routes to their airports and aircraft types, version them and set the
+        airport coordinates, against the database Django is configured for.
+        """
+        manage = ' '.join(shlex.quote(str(part)) for part in (sys.executable, settings.BASE_DIR / 'manage.py'))
+        fixups = [f'{manage} link_routes', f'{manage} load_airports airports.csv']
+        sqlite = ['.bail on', '.mode csv', 'PRAGMA foreign_keys = OFF;', 'BEGIN;']
+        postgres = ['\\set ON_ERROR_STOP on', "SET TIME ZONE 'UTC';", 'BEGIN;']
+        for table, columns, filename in self.files:
+            # .import into an existing table goes by position, so the columns are matched by name here
+            names = ', '.join(columns)
+            sqlite += [
+                f'.import {filename} _import_{table}',
+                f'INSERT INTO {table} ({names}) SELECT {names} FROM _import_{table};',
+                f'DROP TABLE _import_{table};',
+            ]
+            postgres.append(f"\\copy {table} ({', '.join(columns)}) FROM '{filename}' WITH (FORMAT csv, HEADER true)")
+        for table, _, _ in self.files:
+            postgres.append(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table};"
+            )
+        sqlite.append('COMMIT;')
+        postgres.append('COMMIT;')
+        sqlite.extend(f'.system {command}' for command in fixups)
+        postgres.extend(f'\\! {command}' for command in fixups)
+
+        for name, lines in (('load_sqlite.sql', sqlite), ('load_postgresql.sql', postgres)):
+            with open(os.path.join(self.output_dir, name), 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+        database = connection.settings_dict['NAME'] if connection.vendor == 'sqlite' else 'db.sqlite3'
+        self.stdout.write(
+            f'Wrote fixtures to {self.output_dir} '
+            f'(cd there and run: sqlite3 {database} < load_sqlite.sql, or psql $DATABASE_URL -f load_postgresql.sql)'
+        )
+
+
+def _csv_row(row):
+    # Booleans as 0/1, which both SQLite and PostgreSQL accept from CSV
+    return [int(value) if isinstance(value, bool) else value for value in row]
@@ -0,0 +1,242 @@
+"""
+Origin x destination matrix of the best achievable efficiency.
+
+For every city pair the matrix holds the lowest kg of fuel per km of any aircraft
+flying it, that aircraft, and how many aircraft fly the pair. A single windowed
+query ranks each pair's routes by efficiency and keeps the first. NumPy then
+pivots the rows onto a square city x city grid. The result is served dense (a
+heatmap) or as CSR arrays (only the pairs that exist).
+
+Each process keeps the matrix in memory. When a route is saved or deleted, the
+changed pairs are written to the cache under a new version number. Every
+process then re-queries only those pairs the next time it reads the matrix. A
+full rebuild happens on first use, after bulk writes, when the list of changes
+has expired, and at least every EFFICIENCY_MATRIX_MAX_AGE seconds. The last is
+the backstop for processes that cannot see each other's changes, as with the
+per-process cache used when REDIS_URL is not set.
+
+A matrix is never changed once built: an update builds a new one and swaps it
+in, so a reader always sees one consistent set of pairs and arrays.
+"""
+import hashlib
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import FlightRoute
+
+VERSION_KEY = 'efficiency_matrix:version'
+CHANGES_KEY = 'efficiency_matrix:changes:%s'
+CHANGES_TTL = 3600  # seconds a list of changed pairs is kept for other workers to catch up
+FULL_REBUILD = 'all'
+VERSION_CHECK_INTERVAL = 5  # seconds between checks for changes made by other workers
+MAX_DENSE_CITIES = getattr(settings, 'EFFICIENCY_MATRIX_MAX_DENSE', 1500)
+MAX_AGE = getattr(settings, 'EFFICIENCY_MATRIX_MAX_AGE', 600)  # seconds between full rebuilds
+MAX_CATCH_UP = 1000  # versions behind after which a full rebuild is cheaper
+PAIRS_PER_QUERY = 200  # pairs per incremental query, to keep the WHERE clause small
+
+
+def _best_rows(pairs=None):
+    """
+    (origin, destination, aircraft_type, kg_per_km, aircraft count) of the most
+    efficient aircraft of every pair, or of the given pairs only
+    """
+    routes = FlightRoute.objects.filter(efficiency_kg_per_km__isnull=False)
+    if pairs is not None:
+        condition = Q()
+        for origin, destination in pairs:
+            condition |= Q(origin=origin, destination=destination)
+        routes = routes.filter(condition)
+    pair = [F('origin'), F('destination')]
+    return (
+        routes.annotate(
+            rank=Window(RowNumber(), partition_by=pair, order_by=[F('efficiency_kg_per_km').asc(), F('id').asc()]),
+            options=Window(Count('id'), partition_by=pair),
+        )
+        .filter(rank=1)
+        .order_by()
+        .values_list('origin', 'destination', 'aircraft_type', 'efficiency_kg_per_km', 'options')
+    )
+
+
+class EfficiencyMatrix:
+    """Best efficiency per pair, with the pivoted arrays built on first use. Not changed after it is built."""
+
+    def __init__(self, best, version, built_at=None):
+        self.version = version
+        self.built_at = time.monotonic() if built_at is None else built_at  # of the last full rebuild
+        self._best = best
+        self._arrays = None
+        self._etag = None
+
+    @classmethod
+    def build(cls, rows, version):
+        return cls({(origin, destination): rest for origin, destination, *rest in rows}, version)
+
+    def updated(self, pairs, version):
+        """A new matrix with the given pairs re-queried; this one stays as it is for its readers"""
+        pairs = list(pairs)
+        best = dict(self._best)
+        for start in range(0, len(pairs), PAIRS_PER_QUERY):
+            chunk = pairs[start:start + PAIRS_PER_QUERY]
+            for pair in chunk:
+                best.pop(pair, None)
+            for origin, destination, *rest in _best_rows(chunk):
+                best[(origin, destination)] = rest
+        return EfficiencyMatrix(best, version, self.built_at)
+
+    def arrays(self):
+        """cities, aircraft types and row-sorted (origin, destination, kg/km, aircraft, options) arrays"""
+        if self._arrays is None:
+            # Threads that get here together build the same arrays; either copy may be kept
+            pairs = list(self._best)
+            values = list(self._best.values())
+            names = np.array([name for pair in pairs for name in pair], dtype=object)
+            cities, city_index = np.unique(names, return_inverse=True) if len(names) else (np.array([]), np.array([], dtype=int))
+            origin, destination = city_index[0::2], city_index[1::2]
+            aircraft_types, aircraft = np.unique(
+                np.array([value[0] for value in values], dtype=object), return_inverse=True
+            ) if values else (np.array([]), np.array([], dtype=int))
+            kg_per_km = np.array([value[1] for value in values], dtype=float)
+            options = np.array([value[2] for value in values], dtype=np.int64)
+            order = np.lexsort((destination, origin))
+            self._arrays = (
+                cities.tolist(), aircraft_types.tolist(),
+                origin[order], destination[order], kg_per_km[order], aircraft[order], options[order],
+            )
+        return self._arrays
+
+    @property
+    def etag(self):
+        """
+        Digest of the contents rather than the version: a full rebuild can pick up
+        changes the version never saw, and workers holding the same data agree on it
+        """
+        if self._etag is None:
+            cities, aircraft_types, *columns = self.arrays()
+            digest = hashlib.blake2b(repr((cities, aircraft_types)).encode('utf-8'), digest_size=12)
+            for column in columns:
+                digest.update(np.ascontiguousarray(column).tobytes())
+            self._etag = f'"matrix-{digest.hexdigest()}"'
+        return self._etag
+
+    def dense(self):
+        """Square lists for a heatmap; None where no aircraft flies the pair"""
+        cities, aircraft_types, origin, destination, kg_per_km, aircraft, options = self.arrays()
+        n = len(cities)
+        grid = np.full((n, n), None, dtype=object)
+        grid[origin, destination] = np.round(kg_per_km, 4).tolist()
+        best = np.full((n, n), None, dtype=object)
+        best[origin, destination] = aircraft.tolist()
+        return {
+            'format': 'dense',
+            'version': self.version,
+            'cities': cities,
+            'aircraft_types': aircraft_types,
+            'pairs': len(origin),
+            'kg_per_km': grid.tolist(),
+            'best_aircraft': best.tolist(),
+        }
+
+    def sparse(self):
+        """
+        Compressed sparse rows: the pairs of origin cities[i] are at
+        indptr[i]:indptr[i + 1] of indices (destinations) and the value arrays
+        """
+        cities, aircraft_types, origin, destination, kg_per_km, aircraft, options = self.arrays()
+        indptr = np.zeros(len(cities) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(origin, minlength=len(cities)), out=indptr[1:])
+        return {
+            'format': 'csr',
+            'version': self.version,
+            'cities': cities,
+            'aircraft_types': aircraft_types,
+            'shape': [len(cities), len(cities)],
+            'indptr': indptr.tolist(),
+            'indices': destination.tolist(),
+            'kg_per_km': np.round(kg_per_km, 4).tolist(),
+            'best_aircraft': aircraft.tolist(),
+            'options': options.tolist(),
+        }
+
+
+_lock = threading.Lock()
+_state = {'matrix': None, 'checked_at': 0.0}
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 0, None)
+        version = cache.get(VERSION_KEY, 0)
+    return version
+
+
+def mark_changed(pairs=None):
+    """
+    Record that routes of these (origin, destination) pairs changed, or that
+    anything may have changed when pairs is None. Applied after the transaction commits.
+    """
+    change = FULL_REBUILD if pairs is None else sorted(set(pairs))
+
+    def publish():
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, None)
+            version = 1
+        cache.set(CHANGES_KEY % version, change, CHANGES_TTL)
+        # This process catches up on its next read without waiting for the interval
+        _state['checked_at'] = 0.0
+
+    transaction.on_commit(publish)
+
+
+def route_changed(route):
+    """post_save / post_delete hook: the route's pair and, if it moved, its old pair"""
+    pairs = {(route.origin, route.destination)}
+    old = getattr(route, '_stored_pair', None)
+    if old and None not in old:
+        pairs.add(old)
+    mark_changed(pairs)
+
+
+def _catch_up(matrix, version):
+    """matrix with the changes published since its version applied, or None if a full rebuild is needed"""
+    if version < matrix.version or version - matrix.version > MAX_CATCH_UP:
+        return None
+    keys = [CHANGES_KEY % number for number in range(matrix.version + 1, version + 1)]
+    changes = cache.get_many(keys)
+    pairs = set()
+    for key in keys:
+        change = changes.get(key)
+        if change is None or change == FULL_REBUILD:
+            return None
+        pairs.update(tuple(pair) for pair in change)
+    return matrix.updated(pairs, version)
+
+
+def get_matrix():
+    """The current matrix, updated with any route changes since it was last read"""
+    now = time.monotonic()
+    matrix = _state['matrix']
+    if matrix is not None and now - _state['checked_at'] < VERSION_CHECK_INTERVAL:
+        return matrix
+    with _lock:
+        matrix = _state['matrix']
+        version = _current_version()
+        if matrix is not None and now - matrix.built_at > MAX_AGE:
+            matrix = None
+        if matrix is not None and version != matrix.version:
+            matrix = _catch_up(matrix, version)
+        if matrix is None:
+            matrix = EfficiencyMatrix.build(_best_rows().iterator(chunk_size=5000), version)
+        _state['matrix'] = matrix
+        _state['checked_at'] = now
+    return matrix
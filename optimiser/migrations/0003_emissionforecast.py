@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimiser', '0002_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmissionForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('TOTAL', 'All routes'), ('ROUTE', 'Origin and destination'), ('AIRCRAFT', 'Aircraft type')], max_length=10)),
+                ('origin', models.CharField(blank=True, max_length=100)),
+                ('destination', models.CharField(blank=True, max_length=100)),
+                ('aircraft_type', models.CharField(blank=True, max_length=100)),
+                ('month', models.DateField()),
+                ('predicted_co2_kg', models.FloatField()),
+                ('lower_co2_kg', models.FloatField()),
+                ('upper_co2_kg', models.FloatField()),
+                ('history_months', models.IntegerField()),
+                ('fitted_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['level', 'origin', 'destination', 'month'], name='optimiser_fcast_route_idx'), models.Index(fields=['level', 'aircraft_type', 'month'], name='optimiser_fcast_aircraft_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:20
+
+from django.db import migrations, models
+import datetime
+import django.db.models.deletion
+
+
+def seed_factor(apps, schema_editor):
+    """Record the 3.16 kg/kg factor existing emissions were calculated with"""
+    EmissionFactor = apps.get_model('optimiser', 'EmissionFactor')
+    EmissionRecord = apps.get_model('optimiser', 'EmissionRecord')
+    factor = EmissionFactor.objects.create(
+        version='ICAO-3.16',
+        co2_per_kg_fuel=3.16,
+        effective_from=datetime.date(1970, 1, 1),
+        source='ICAO Carbon Emissions Calculator Methodology',
+    )
+    EmissionRecord.objects.filter(factor__isnull=True).update(factor=factor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimiser', '0003_emissionforecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmissionFactor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.CharField(max_length=50, unique=True)),
+                ('co2_per_kg_fuel', models.FloatField(help_text='kg of CO2 per kg of aviation fuel burned')),
+                ('effective_from', models.DateField()),
+                ('source', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-effective_from'],
+            },
+        ),
+        migrations.AddField(
+            model_name='emissionrecord',
+            name='factor',
+            field=models.ForeignKey(blank=True, help_text='Emission factor co2_kg was calculated with', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='records', to='optimiser.emissionfactor'),
+        ),
+        migrations.RunPython(seed_factor, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:20
+
+from django.db import migrations, models
+from django.db.models.functions import NullIf
+
+
+def backfill_efficiency(apps, schema_editor):
+    """Fill the new efficiency column in one UPDATE and compute the per-aircraft averages"""
+    FlightRoute = apps.get_model('optimiser', 'FlightRoute')
+    AircraftEfficiency = apps.get_model('optimiser', 'AircraftEfficiency')
+    FlightRoute.objects.update(efficiency_kg_per_km=models.ExpressionWrapper(
+        models.F('fuel_consumption_kg') * 1.0 / NullIf(models.F('distance_km'), 0),
+        output_field=models.FloatField(),
+    ))
+    totals = FlightRoute.objects.filter(efficiency_kg_per_km__isnull=False).values('aircraft_type').annotate(
+        count=models.Count('id'), total=models.Sum('efficiency_kg_per_km')
+    ).order_by()
+    AircraftEfficiency.objects.bulk_create([
+        AircraftEfficiency(
+            aircraft_type=row['aircraft_type'],
+            route_count=row['count'],
+            efficiency_sum=row['total'],
+            avg_efficiency_kg_per_km=row['total'] / row['count'],
+        )
+        for row in totals
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimiser', '0004_emissionfactor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AircraftEfficiency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('aircraft_type', models.CharField(max_length=100, unique=True)),
+                ('route_count', models.IntegerField(default=0)),
+                ('efficiency_sum', models.FloatField(default=0)),
+                ('avg_efficiency_kg_per_km', models.FloatField(blank=True, db_index=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='flightroute',
+            name='efficiency_kg_per_km',
+            field=models.FloatField(blank=True, db_index=True, editable=False, help_text='fuel_consumption_kg / distance_km, kept up to date on save', null=True),
+        ),
+        migrations.RunPython(backfill_efficiency, migrations.RunPython.noop),
+    ]
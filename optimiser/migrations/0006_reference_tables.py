@@ -0,0 +1,140 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def _key(name):
+    return ' '.join(str(name).casefold().split())
+
+
+def fill_reference_tables(apps, schema_editor):
+    """
+    Create an Airport for every city and an AircraftType for every aircraft name,
+    merging spellings that differ only in case or spacing into the most used one.
+    Routes are rewritten to that spelling (a route that then duplicates another is
+    merged into it, with its emission records) and linked to the new rows.
+    """
+    FlightRoute = apps.get_model('optimiser', 'FlightRoute')
+    EmissionRecord = apps.get_model('optimiser', 'EmissionRecord')
+    AircraftEfficiency = apps.get_model('optimiser', 'AircraftEfficiency')
+    columns = [
+        (('origin', 'destination'), apps.get_model('optimiser', 'Airport'), ('origin_airport', 'destination_airport')),
+        (('aircraft_type',), apps.get_model('optimiser', 'AircraftType'), ('aircraft',)),
+    ]
+
+    variants = {}  # {column: {spelling: canonical}}
+    for fields, model, _ in columns:
+        counts = {}
+        for field in fields:
+            for name, routes in FlightRoute.objects.values_list(field).annotate(routes=models.Count('id')).order_by():
+                counts[name] = counts.get(name, 0) + routes
+        groups = {}
+        for name, routes in counts.items():
+            groups.setdefault(_key(name), []).append((-routes, name))
+        canonical = {}
+        rows = []
+        for key, spellings in groups.items():
+            best = min(spellings)[1]
+            rows.append(model(name=' '.join(best.split()), key=key))
+            for _, name in spellings:
+                canonical[name] = rows[-1].name
+        model.objects.bulk_create(rows)
+        for field in fields:
+            variants[field] = {name: best for name, best in canonical.items() if name != best}
+
+    # Rewrite the routes that use another spelling, one at a time (there are few)
+    changed = models.Q()
+    for field, names in variants.items():
+        if names:
+            changed |= models.Q(**{f'{field}__in': list(names)})
+    if changed:
+        for route in FlightRoute.objects.filter(changed).order_by('id'):
+            for field, names in variants.items():
+                setattr(route, field, names.get(getattr(route, field), getattr(route, field)))
+            existing = FlightRoute.objects.filter(
+                origin=route.origin, destination=route.destination, aircraft_type=route.aircraft_type
+            ).exclude(pk=route.pk).first()
+            if existing:
+                EmissionRecord.objects.filter(route_id=route.pk).update(route_id=existing.pk)
+                FlightRoute.objects.filter(pk=route.pk).delete()
+            else:
+                FlightRoute.objects.filter(pk=route.pk).update(
+                    origin=route.origin, destination=route.destination, aircraft_type=route.aircraft_type
+                )
+
+        # Aircraft names may have merged: recompute the per-aircraft averages
+        AircraftEfficiency.objects.all().delete()
+        totals = FlightRoute.objects.filter(efficiency_kg_per_km__isnull=False).values('aircraft_type').annotate(
+            count=models.Count('id'), total=models.Sum('efficiency_kg_per_km')
+        ).order_by()
+        AircraftEfficiency.objects.bulk_create([
+            AircraftEfficiency(
+                aircraft_type=row['aircraft_type'],
+                route_count=row['count'],
+                efficiency_sum=row['total'],
+                avg_efficiency_kg_per_km=row['total'] / row['count'],
+            )
+            for row in totals
+        ])
+
+    # Every name is canonical now: one UPDATE per key column
+    for fields, model, references in columns:
+        FlightRoute.objects.update(**{
+            reference: models.Subquery(model.objects.filter(name=models.OuterRef(field)).values('pk')[:1])
+            for field, reference in zip(fields, references)
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimiser', '0005_route_efficiency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AircraftType',
+            fields=[
+                ('id', models.SmallAutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('key', models.CharField(editable=False, max_length=100, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Airport',
+            fields=[
+                ('id', models.SmallAutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('key', models.CharField(editable=False, max_length=100, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='flightroute',
+            name='aircraft',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='routes', to='optimiser.aircrafttype'),
+        ),
+        migrations.AddField(
+            model_name='flightroute',
+            name='destination_airport',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='arrivals', to='optimiser.airport'),
+        ),
+        migrations.AddField(
+            model_name='flightroute',
+            name='origin_airport',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='departures', to='optimiser.airport'),
+        ),
+        migrations.RunPython(fill_reference_tables, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='flightroute',
+            index=models.Index(fields=['origin_airport', 'destination_airport', 'aircraft'], name='flightroute_reference_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:20
+
+from django.db import migrations, models
+
+
+def stamp_existing_routes(apps, schema_editor):
+    """Every existing route becomes version 1 of the change feed, in one UPDATE"""
+    FlightRoute = apps.get_model('optimiser', 'FlightRoute')
+    ChangeCounter = apps.get_model('optimiser', 'ChangeCounter')
+    if FlightRoute.objects.update(change_version=1):
+        ChangeCounter.objects.create(name='flightroute', value=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimiser', '0006_reference_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RouteTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('route_id', models.BigIntegerField()),
+                ('origin', models.CharField(max_length=100)),
+                ('destination', models.CharField(max_length=100)),
+                ('aircraft_type', models.CharField(max_length=100)),
+                ('change_version', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='flightroute',
+            name='change_version',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='Version of the last change to the route, for the change feed', null=True),
+        ),
+        migrations.RunPython(stamp_existing_routes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='flightroute',
+            index=models.Index(fields=['change_version', 'id'], name='flightroute_change_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='routetombstone',
+            index=models.Index(fields=['change_version', 'route_id'], name='routetombstone_change_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:49
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimiser', '0007_route_change_feed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emissionrecord',
+            name='calculation_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
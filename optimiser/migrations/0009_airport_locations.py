@@ -0,0 +1,102 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:50
+
+from django.db import migrations, models
+
+# City name -> (IATA code, latitude, longitude) of its main airport, formerly kept in optimiser/geo.py
+AIRPORTS = {
+    'ABIDJAN': ('ABJ', 5.2614, -3.9263),
+    'ACCRA': ('ACC', 5.6052, -0.1668),
+    'ADDIS ABABA': ('ADD', 8.9779, 38.7993),
+    'AMSTERDAM': ('AMS', 52.3105, 4.7683),
+    'ATLANTA': ('ATL', 33.6407, -84.4277),
+    'BANGKOK': ('BKK', 13.6900, 100.7501),
+    'BEIJING': ('PEK', 40.0799, 116.6031),
+    'BERLIN': ('BER', 52.3667, 13.5033),
+    'CAIRO': ('CAI', 30.1219, 31.4056),
+    'CAPE TOWN': ('CPT', -33.9715, 18.6021),
+    'CASABLANCA': ('CMN', 33.3675, -7.5898),
+    'CHICAGO': ('ORD', 41.9742, -87.9073),
+    'DAR ES SALAAM': ('DAR', -6.8781, 39.2026),
+    'DELHI': ('DEL', 28.5562, 77.1000),
+    'DENVER': ('DEN', 39.8561, -104.6737),
+    'DUBAI': ('DXB', 25.2532, 55.3657),
+    'ENTEBBE': ('EBB', 0.0424, 32.4435),
+    'FRANKFURT': ('FRA', 50.0379, 8.5622),
+    'HONG KONG': ('HKG', 22.3080, 113.9185),
+    'HOUSTON': ('IAH', 29.9902, -95.3368),
+    'ISTANBUL': ('IST', 41.2753, 28.7519),
+    'JOHANNESBURG': ('JNB', -26.1367, 28.2411),
+    'KAMPALA': ('EBB', 0.0424, 32.4435),
+    'KHARTOUM': ('KRT', 15.5895, 32.5532),
+    'KIGALI': ('KGL', -1.9686, 30.1395),
+    'KINSHASA': ('FIH', -4.3858, 15.4446),
+    'KUALA LUMPUR': ('KUL', 2.7456, 101.7072),
+    'LAGOS': ('LOS', 6.5774, 3.3212),
+    'LISBON': ('LIS', 38.7756, -9.1354),
+    'LONDON': ('LHR', 51.4700, -0.4543),
+    'LOS ANGELES': ('LAX', 33.9416, -118.4085),
+    'MADRID': ('MAD', 40.4983, -3.5676),
+    'MEXICO CITY': ('MEX', 19.4361, -99.0719),
+    'MIAMI': ('MIA', 25.7959, -80.2870),
+    'MOMBASA': ('MBA', -4.0348, 39.5942),
+    'MUMBAI': ('BOM', 19.0896, 72.8656),
+    'NAIROBI': ('NBO', -1.3192, 36.9278),
+    'NEW DELHI': ('DEL', 28.5562, 77.1000),
+    'NEW YORK': ('JFK', 40.6413, -73.7781),
+    'PARIS': ('CDG', 49.0097, 2.5479),
+    'PRAGUE': ('PRG', 50.1008, 14.2600),
+    'RIO DE JANEIRO': ('GIG', -22.8090, -43.2506),
+    'ROME': ('FCO', 41.8003, 12.2389),
+    'SAN FRANCISCO': ('SFO', 37.6213, -122.3790),
+    'SAO PAULO': ('GRU', -23.4356, -46.4731),
+    'SEATTLE': ('SEA', 47.4502, -122.3088),
+    'SEOUL': ('ICN', 37.4602, 126.4407),
+    'SHANGHAI': ('PVG', 31.1443, 121.8083),
+    'SINGAPORE': ('SIN', 1.3644, 103.9915),
+    'STOCKHOLM': ('ARN', 59.6498, 17.9238),
+    'SYDNEY': ('SYD', -33.9399, 151.1753),
+    'TOKYO': ('HND', 35.5494, 139.7798),
+    'TORONTO': ('YYZ', 43.6777, -79.6248),
+    'TUNIS': ('TUN', 36.8510, 10.2272),
+    'VANCOUVER': ('YVR', 49.1967, -123.1815),
+    'VIENNA': ('VIE', 48.1103, 16.5697),
+    'WASHINGTON': ('IAD', 38.9531, -77.4565),
+    'ZANZIBAR': ('ZNZ', -6.2220, 39.2249),
+    'ZURICH': ('ZRH', 47.4582, 8.5555),
+}
+
+
+def seed_locations(apps, schema_editor):
+    """Give the cities that had coordinates in geo.py theirs, adding the ones no route uses yet"""
+    Airport = apps.get_model('optimiser', 'Airport')
+    for name, (iata, latitude, longitude) in AIRPORTS.items():
+        key = ' '.join(name.casefold().split())
+        location = {'iata': iata, 'latitude': latitude, 'longitude': longitude}
+        if not Airport.objects.filter(key=key).update(**location):
+            Airport.objects.create(name=name, key=key, **location)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimiser', '0008_emission_calculation_date_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airport',
+            name='iata',
+            field=models.CharField(blank=True, help_text="Code of the city's main airport", max_length=3),
+        ),
+        migrations.AddField(
+            model_name='airport',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='airport',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(seed_locations, migrations.RunPython.noop),
+    ]
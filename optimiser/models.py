@@ -1,5 +1,305 @@
-from django.db import models
+import logging
+
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import NullIf
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from . import caching
+from .caching import CATALOG, EMISSIONS, bump
+
+def _column_or_value(value, field):
+    if value is None:
+        return models.F(field)
+    return value if hasattr(value, 'resolve_expression') else models.Value(value)
+
+def efficiency_expression(fuel_consumption_kg=None, distance_km=None):
+    """SQL for fuel_consumption_kg / distance_km (NULL for a zero distance), optionally with new values"""
+    fuel = _column_or_value(fuel_consumption_kg, 'fuel_consumption_kg')
+    distance = _column_or_value(distance_km, 'distance_km')
+    return models.ExpressionWrapper(fuel * 1.0 / NullIf(distance, 0), output_field=models.FloatField())
+
+logger = logging.getLogger(__name__)
+
+def name_key(name):
+    """Case- and whitespace-insensitive form of a city or aircraft name"""
+    return ' '.join(str(name).casefold().split())
+
+_reference_ids = {'version': None, 'models': {}}  # {model: {name_key: (id, name)}}, only rows that are committed
+
+def _reference_cache(model):
+    """The name -> id cache of model, emptied when any process edits or deletes a reference row"""
+    version = caching.version(caching.REFERENCES)
+    if _reference_ids['version'] != version:
+        _reference_ids['models'] = {}
+        _reference_ids['version'] = version
+    return _reference_ids['models'].setdefault(model, {})
+
+class ReferenceName(models.Model):
+    """
+    Small lookup table of names that FlightRoute rows point at with a two-byte key.
+    Each name is stored once, in the spelling it was first seen in; key is its
+    case- and whitespace-insensitive form, so "nairobi" finds NAIROBI.
+    """
+    id = models.SmallAutoField(primary_key=True)
+    name = models.CharField(max_length=100, unique=True)
+    key = models.CharField(max_length=100, unique=True, editable=False)
+    
+    def __str__(self):
+        return self.name
+    
+    def save(self, *args, **kwargs):
+        self.key = name_key(self.name)
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def lookup(cls, name):
+        """(id, canonical name) for any spelling of name, adding the name if it is new"""
+        key = name_key(name)
+        ids = _reference_cache(cls)
+        if key not in ids:
+            row, _ = cls.objects.get_or_create(key=key, defaults={'name': ' '.join(str(name).split())})
+            entry = (row.pk, row.name)
+            # Only remembered once committed, so a rollback cannot leave a dangling id behind
+            transaction.on_commit(lambda: ids.__setitem__(key, entry))
+            return entry
+        return ids[key]
+    
+    @classmethod
+    def find(cls, name):
+        """(id, canonical name) for any spelling of name, or None if it is not a known name"""
+        key = name_key(name)
+        ids = _reference_cache(cls)
+        if key not in ids:
+            row = cls.objects.filter(key=key).values_list('pk', 'name').first()
+            if row is None:
+                return None
+            entry = tuple(row)
+            transaction.on_commit(lambda: ids.__setitem__(key, entry))
+            return entry
+        return ids[key]
+    
+    class Meta:
+        abstract = True
+        ordering = ['name']
+
+class AirportQuerySet(models.QuerySet):
+    def origins(self):
+        """Airports that at least one route departs from: one index probe per airport"""
+        return self.filter(models.Exists(FlightRoute.objects.filter(origin_airport=models.OuterRef('pk'))))
+    
+    def destinations(self):
+        return self.filter(models.Exists(FlightRoute.objects.filter(destination_airport=models.OuterRef('pk'))))
+    
+    def set_locations(self, rows):
+        """
+        Set the IATA code and coordinates from (name, iata, latitude, longitude) rows,
+        adding airports that are new. Returns the number of airports updated.
+        """
+        located = {}
+        for name, iata, latitude, longitude in rows:
+            pk, _ = Airport.lookup(name)
+            located[pk] = (iata or '', float(latitude), float(longitude))
+        airports = list(Airport.objects.filter(pk__in=located))
+        for airport in airports:
+            airport.iata, airport.latitude, airport.longitude = located[airport.pk]
+        Airport.objects.bulk_update(airports, ['iata', 'latitude', 'longitude'], batch_size=1000)
+        from .geo import mark_stale
+        transaction.on_commit(mark_stale)
+        return len(airports)
+
+class Airport(ReferenceName):
+    iata = models.CharField(max_length=3, blank=True, help_text="Code of the city's main airport")
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    
+    objects = AirportQuerySet.as_manager()
+
+class AircraftTypeQuerySet(models.QuerySet):
+    def in_use(self):
+        """Aircraft types that fly at least one route"""
+        return self.filter(models.Exists(FlightRoute.objects.filter(aircraft=models.OuterRef('pk'))))
+
+class AircraftType(ReferenceName):
+    objects = AircraftTypeQuerySet.as_manager()
+
+# FlightRoute name column, its foreign key to the reference table, and that table
+REFERENCE_FIELDS = [
+    ('origin', 'origin_airport', Airport),
+    ('destination', 'destination_airport', Airport),
+    ('aircraft_type', 'aircraft', AircraftType),
+]
+
+ROUTE_CHANGES = 'flightroute'  # ChangeCounter of the route change feed
+ROUTE_CHANGES_PRUNED = 'flightroute.pruned'  # highest version of a pruned tombstone
+
+def _catalog_changed():
+    """Drop cached catalog lists and, once committed, the typeahead index of every worker"""
+    bump(CATALOG)
+    from .search import mark_stale
+    transaction.on_commit(mark_stale)
+
+class FlightRouteQuerySet(models.QuerySet):
+    """
+    Keeps the stored efficiency column, the AircraftEfficiency averages and the change
+    versions in step with bulk writes, which bypass FlightRoute.save()
+    """
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.efficiency_kg_per_km = obj.compute_efficiency()
+            obj.link_references()
+        with transaction.atomic():
+            version = ChangeCounter.advance(ROUTE_CHANGES)
+            for obj in objs:
+                obj.change_version = version
+            created = super().bulk_create(objs, *args, **kwargs)
+        AircraftEfficiency.rebuild({obj.aircraft_type for obj in objs})
+        from .matrix import mark_changed
+        mark_changed({(obj.origin, obj.destination) for obj in objs})
+        _catalog_changed()
+        return created
+    
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        fields = list(fields)
+        for field, reference, _ in REFERENCE_FIELDS:
+            if field in fields:
+                for obj in objs:
+                    obj.link_references()
+                if reference not in fields:
+                    fields.append(reference)
+        if {'fuel_consumption_kg', 'distance_km', 'aircraft_type'} & set(fields):
+            for obj in objs:
+                obj.efficiency_kg_per_km = obj.compute_efficiency()
+            if 'efficiency_kg_per_km' not in fields:
+                fields.append('efficiency_kg_per_km')
+        if 'change_version' not in fields:
+            fields.append('change_version')
+        with transaction.atomic():
+            version = ChangeCounter.advance(ROUTE_CHANGES)
+            for obj in objs:
+                obj.change_version = version
+            updated = super().bulk_update(objs, fields, *args, **kwargs)
+        if updated:
+            AircraftEfficiency.rebuild()
+            from .matrix import mark_changed
+            # The pairs routes moved away from are not known here
+            moved = {'origin', 'destination'} & set(fields)
+            mark_changed(None if moved else {(obj.origin, obj.destination) for obj in objs})
+            _catalog_changed()
+        return updated
+    
+    def update(self, **kwargs):
+        relink = False
+        for field, reference, model in REFERENCE_FIELDS:
+            if field in kwargs:
+                if isinstance(kwargs[field], str):
+                    kwargs[reference], kwargs[field] = model.lookup(kwargs[field])
+                else:
+                    # An expression: the new names are only known after the UPDATE
+                    kwargs[reference] = None
+                    relink = True
+        changes_efficiency = 'fuel_consumption_kg' in kwargs or 'distance_km' in kwargs
+        if changes_efficiency:
+            # Built from the new values: the SET clause would otherwise read the old ones
+            kwargs['efficiency_kg_per_km'] = efficiency_expression(
+                kwargs.get('fuel_consumption_kg'), kwargs.get('distance_km')
+            )
+        with transaction.atomic():
+            kwargs['change_version'] = ChangeCounter.advance(ROUTE_CHANGES)
+            updated = super().update(**kwargs)
+        if updated and (changes_efficiency or 'aircraft_type' in kwargs):
+            AircraftEfficiency.rebuild()
+        if updated and (changes_efficiency or {'aircraft_type', 'origin', 'destination'} & set(kwargs)):
+            from .matrix import mark_changed
+            mark_changed()
+        if updated:
+            _catalog_changed()
+        if relink:
+            FlightRoute.objects.link_references()
+        return updated
+    
+    update.alters_data = True
+    
+    def delete(self):
+        with transaction.atomic():
+            deleted = list(self.values_list('id', 'origin', 'destination', 'aircraft_type'))
+            if deleted:
+                version = ChangeCounter.advance(ROUTE_CHANGES)
+                RouteTombstone.objects.bulk_create([
+                    RouteTombstone(route_id=pk, origin=origin, destination=destination,
+                                   aircraft_type=aircraft_type, change_version=version)
+                    for pk, origin, destination, aircraft_type in deleted
+                ], batch_size=5000)
+            result = super().delete()
+        if result[0]:
+            AircraftEfficiency.rebuild()
+            # Their emission records went with them
+            bump(EMISSIONS)
+        return result
+    
+    delete.alters_data = True
+    delete.queryset_only = True
+    
+    def named(self, origin=None, destination=None, aircraft_type=None):
+        """
+        Routes with these names in any spelling, filtered on the reference keys so the
+        query uses flightroute_reference_idx. A name that no route has ever used
+        matches nothing without reading the routes table. Routes inserted by raw SQL
+        are only found once link_references() has run.
+        """
+        queryset = self
+        for (field, reference, model), name in zip(REFERENCE_FIELDS, (origin, destination, aircraft_type)):
+            if name is None:
+                continue
+            entry = model.find(name)
+            if entry is None:
+                return queryset.none()
+            queryset = queryset.filter(**{f'{reference}_id': entry[0]})
+        return queryset
+    
+    def stamp_unversioned(self):
+        """
+        Give routes inserted by raw SQL, which have no change version, the next one so
+        that the change feed picks them up. Returns the number of routes stamped.
+        """
+        unversioned = self.filter(change_version__isnull=True)
+        if not unversioned.exists():
+            return 0
+        with transaction.atomic():
+            # The base update: nothing but the version changes
+            return models.QuerySet.update(unversioned, change_version=ChangeCounter.advance(ROUTE_CHANGES))
+    
+    def link_references(self):
+        """
+        Fill in the reference keys of routes that have none, e.g. after raw inserts.
+        Names already in their canonical spelling are linked by one UPDATE per column;
+        other spellings are rewritten to the canonical one, one UPDATE each.
+        Returns the number of spellings that were rewritten.
+        """
+        renamed = 0
+        for field, reference, model in REFERENCE_FIELDS:
+            unlinked = self.filter(**{f'{reference}__isnull': True})
+            names = set(unlinked.order_by().values_list(field, flat=True).distinct())
+            if not names:
+                continue
+            canonical = {name: model.lookup(name) for name in names}
+            exact = [name for name, (_, spelling) in canonical.items() if name == spelling]
+            # The base update: the names do not change, so nothing else needs refreshing
+            models.QuerySet.update(unlinked.filter(**{f'{field}__in': exact}), **{
+                reference: models.Subquery(model.objects.filter(name=models.OuterRef(field)).values('pk')[:1])
+            })
+            for name, (pk, spelling) in canonical.items():
+                if name != spelling:
+                    try:
+                        with transaction.atomic():
+                            renamed += unlinked.filter(**{field: name}).update(**{field: spelling})
+                    except IntegrityError:
+                        # The canonical spelling of the route exists already; left for a person to merge
+                        logger.warning('Cannot rename %s %r to %r: the route exists already', field, name, spelling)
+        return renamed
 
 class FlightRoute(models.Model):
     origin = models.CharField(max_length=100)
@@ -7,22 +307,263 @@ class FlightRoute(models.Model):
     aircraft_type = models.CharField(max_length=100)
     distance_km = models.FloatField()
     fuel_consumption_kg = models.FloatField()
+    efficiency_kg_per_km = models.FloatField(
+        null=True, blank=True, editable=False, db_index=True,
+        help_text="fuel_consumption_kg / distance_km, kept up to date on save"
+    )
+    # Small integer keys for the three names above, set from them on save
+    origin_airport = models.ForeignKey(Airport, on_delete=models.PROTECT, related_name='departures',
+                                       null=True, blank=True, editable=False, db_index=False)
+    destination_airport = models.ForeignKey(Airport, on_delete=models.PROTECT, related_name='arrivals',
+                                            null=True, blank=True, editable=False)
+    aircraft = models.ForeignKey(AircraftType, on_delete=models.PROTECT, related_name='routes',
+                                 null=True, blank=True, editable=False)
+    change_version = models.BigIntegerField(
+        null=True, blank=True, editable=False,
+        help_text="Version of the last change to the route, for the change feed"
+    )
+    
+    objects = FlightRouteQuerySet.as_manager()
     
     def __str__(self):
         return f"{self.origin} to {self.destination} via {self.aircraft_type}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so save() and delete() can adjust the per-aircraft averages
+        instance._stored_efficiency = (
+            instance.__dict__.get('aircraft_type'), instance.__dict__.get('efficiency_kg_per_km')
+        )
+        # and so the efficiency matrix can update the pair a route moved away from
+        instance._stored_pair = (instance.__dict__.get('origin'), instance.__dict__.get('destination'))
+        return instance
+    
+    def compute_efficiency(self):
+        if not self.distance_km:
+            return None
+        return self.fuel_consumption_kg / self.distance_km
+    
+    def link_references(self):
+        """Point the reference keys at the rows for the names, and use the canonical spelling"""
+        for field, reference, model in REFERENCE_FIELDS:
+            pk, name = model.lookup(getattr(self, field))
+            setattr(self, f'{reference}_id', pk)
+            setattr(self, field, name)
+    
+    def save(self, *args, **kwargs):
+        self.efficiency_kg_per_km = self.compute_efficiency()
+        self.link_references()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'fuel_consumption_kg', 'distance_km'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'efficiency_kg_per_km'}
+        if update_fields is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {
+                reference for field, reference, _ in REFERENCE_FIELDS if field in update_fields
+            } | {'change_version'}
+        with transaction.atomic():
+            self.change_version = ChangeCounter.advance(ROUTE_CHANGES)
+            super().save(*args, **kwargs)
+            old = getattr(self, '_stored_efficiency', (None, None))
+            new = (self.aircraft_type, self.efficiency_kg_per_km)
+            if old != new:
+                AircraftEfficiency.remove(*old)
+                AircraftEfficiency.add(*new)
+        self._stored_efficiency = new
+        self._stored_pair = (self.origin, self.destination)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            tombstone = RouteTombstone(
+                route_id=self.pk, origin=self.origin, destination=self.destination,
+                aircraft_type=self.aircraft_type, change_version=ChangeCounter.advance(ROUTE_CHANGES),
+            )
+            result = super().delete(*args, **kwargs)
+            tombstone.save()
+        AircraftEfficiency.remove(*getattr(self, '_stored_efficiency', (self.aircraft_type, self.efficiency_kg_per_km)))
+        bump(EMISSIONS)
+        return result
+    
     class Meta:
         unique_together = ['origin', 'destination', 'aircraft_type']
+        indexes = [
+            models.Index(fields=['origin_airport', 'destination_airport', 'aircraft'], name='flightroute_reference_idx'),
+            models.Index(fields=['change_version', 'id'], name='flightroute_change_idx'),
+        ]
+
+class ChangeCounter(models.Model):
+    """
+    Last version handed out by a change feed. advance() is called inside the
+    transaction of the write it numbers and the row stays locked until that commits,
+    so writes commit in version order: once a version is visible, so is every lower one.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+    
+    @classmethod
+    def advance(cls, name):
+        """The next version of name"""
+        if not cls.objects.filter(name=name).update(value=models.F('value') + 1):
+            cls.objects.get_or_create(name=name)
+            cls.objects.filter(name=name).update(value=models.F('value') + 1)
+        return cls.current(name)
+    
+    @classmethod
+    def current(cls, name):
+        return cls.objects.filter(name=name).values_list('value', flat=True).first() or 0
+
+class RouteTombstone(models.Model):
+    """A deleted FlightRoute, kept for the change feed until pruned"""
+    route_id = models.BigIntegerField()
+    origin = models.CharField(max_length=100)
+    destination = models.CharField(max_length=100)
+    aircraft_type = models.CharField(max_length=100)
+    change_version = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"Deleted route {self.route_id} ({self.origin} to {self.destination} via {self.aircraft_type})"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['change_version', 'route_id'], name='routetombstone_change_idx'),
+        ]
+
+class AircraftEfficiency(models.Model):
+    """
+    Average route efficiency per aircraft type. FlightRoute.save() and delete() adjust
+    the running sums; bulk writes rebuild the affected types with one grouped query.
+    """
+    aircraft_type = models.CharField(max_length=100, unique=True)
+    route_count = models.IntegerField(default=0)
+    efficiency_sum = models.FloatField(default=0)
+    avg_efficiency_kg_per_km = models.FloatField(null=True, blank=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.aircraft_type}: {self.avg_efficiency_kg_per_km} kg/km over {self.route_count} routes"
+    
+    @classmethod
+    def _adjust(cls, aircraft_type, efficiency, sign):
+        if aircraft_type is None or efficiency is None:
+            return
+        cls.objects.get_or_create(aircraft_type=aircraft_type)
+        # SET reads the old row, so the average is computed from the adjusted sums directly
+        cls.objects.filter(aircraft_type=aircraft_type).update(
+            route_count=models.F('route_count') + sign,
+            efficiency_sum=models.F('efficiency_sum') + sign * efficiency,
+            avg_efficiency_kg_per_km=(models.F('efficiency_sum') + sign * efficiency)
+            / NullIf(models.F('route_count') + sign, 0),
+            updated_at=timezone.now(),
+        )
+    
+    @classmethod
+    def add(cls, aircraft_type, efficiency):
+        cls._adjust(aircraft_type, efficiency, 1)
+    
+    @classmethod
+    def remove(cls, aircraft_type, efficiency):
+        cls._adjust(aircraft_type, efficiency, -1)
+    
+    @classmethod
+    def rebuild(cls, aircraft_types=None):
+        """Recompute the averages from the stored route efficiencies (all types, or the given ones)"""
+        routes = FlightRoute.objects.filter(efficiency_kg_per_km__isnull=False)
+        rows = cls.objects.all()
+        if aircraft_types is not None:
+            aircraft_types = list(aircraft_types)
+            routes = routes.filter(aircraft_type__in=aircraft_types)
+            rows = rows.filter(aircraft_type__in=aircraft_types)
+        totals = routes.values('aircraft_type').annotate(
+            count=models.Count('id'), total=models.Sum('efficiency_kg_per_km')
+        ).order_by()
+        now = timezone.now()
+        averages = [
+            cls(
+                aircraft_type=row['aircraft_type'],
+                route_count=row['count'],
+                efficiency_sum=row['total'],
+                avg_efficiency_kg_per_km=row['total'] / row['count'],
+                updated_at=now,
+            )
+            for row in totals
+        ]
+        with transaction.atomic():
+            rows.delete()
+            cls.objects.bulk_create(averages)
+        return len(averages)
+
+class EmissionFactor(models.Model):
+    """
+    A CO2 emission factor and the date from which it applies. The factor in force on a
+    given date is the one with the latest effective_from on or before it.
+    """
+    version = models.CharField(max_length=50, unique=True)
+    co2_per_kg_fuel = models.FloatField(help_text="kg of CO2 per kg of aviation fuel burned")
+    effective_from = models.DateField()
+    source = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.version}: {self.co2_per_kg_fuel} kg CO2/kg fuel from {self.effective_from}"
+    
+    class Meta:
+        ordering = ['-effective_from']
+
+class EmissionRecordQuerySet(models.QuerySet):
+    """Invalidates cached emission analytics after bulk writes, which send no signals"""
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        if created:
+            bump(EMISSIONS)
+        return created
+    
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        if updated:
+            bump(EMISSIONS)
+        return updated
+    
+    def update(self, **kwargs):
+        updated = super().update(**kwargs)
+        if updated:
+            bump(EMISSIONS)
+        return updated
+    
+    update.alters_data = True
+    
+    def delete(self):
+        result = super().delete()
+        if result[0]:
+            bump(EMISSIONS)
+        return result
+    
+    delete.alters_data = True
+    delete.queryset_only = True
 
 class EmissionRecord(models.Model):
     route = models.ForeignKey(FlightRoute, on_delete=models.CASCADE, related_name='emissions')
-    calculation_date = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add: rows written behind keep the time of the request, not of the flush
+    calculation_date = models.DateTimeField(default=timezone.now, editable=False)
     co2_kg = models.FloatField()
+    factor = models.ForeignKey(EmissionFactor, on_delete=models.PROTECT, null=True, blank=True,
+                               related_name='records', help_text="Emission factor co2_kg was calculated with")
     fuel_saved_kg = models.FloatField(default=0)
     percent_improvement = models.FloatField(default=0)
     
+    objects = EmissionRecordQuerySet.as_manager()
+    
     def __str__(self):
         return f"Emissions for {self.route} on {self.calculation_date.date()}"
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        bump(EMISSIONS)
+        return result
 
 class PassengerEcoScore(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -46,3 +587,67 @@ class PassengerEcoScore(models.Model):
     
     def __str__(self):
         return f"{self.user.username}'s Eco Score: {self.points} points"
+
+class Job(models.Model):
+    """A unit of background work, queued in the database and run by `manage.py runworker`"""
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    progress = models.FloatField(default=0)
+    progress_message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    artifact = models.BinaryField(null=True, blank=True, editable=False)
+    error = models.TextField(blank=True)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"Job {self.id} ({self.kind}): {self.status}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='optimiser_job_queue_idx'),
+            models.Index(fields=['kind', 'status'], name='optimiser_job_kind_idx'),
+        ]
+
+class EmissionForecast(models.Model):
+    """Monthly CO2 forecast for one series, written by `manage.py refresh_forecasts`"""
+    LEVEL_CHOICES = [
+        ('TOTAL', 'All routes'),
+        ('ROUTE', 'Origin and destination'),
+        ('AIRCRAFT', 'Aircraft type'),
+    ]
+    
+    level = models.CharField(max_length=10, choices=LEVEL_CHOICES)
+    origin = models.CharField(max_length=100, blank=True)
+    destination = models.CharField(max_length=100, blank=True)
+    aircraft_type = models.CharField(max_length=100, blank=True)
+    month = models.DateField()
+    predicted_co2_kg = models.FloatField()
+    lower_co2_kg = models.FloatField()
+    upper_co2_kg = models.FloatField()
+    history_months = models.IntegerField()
+    fitted_at = models.DateTimeField()
+    
+    def __str__(self):
+        series = ' → '.join(filter(None, [self.origin, self.destination])) or self.aircraft_type or 'all routes'
+        return f"{series} forecast for {self.month:%Y-%m}: {self.predicted_co2_kg:.0f} kg CO2"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['level', 'origin', 'destination', 'month'], name='optimiser_fcast_route_idx'),
+            models.Index(fields=['level', 'aircraft_type', 'month'], name='optimiser_fcast_aircraft_idx'),
+        ]
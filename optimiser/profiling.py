@@ -0,0 +1,304 @@
+"""
+Opt-in profiling for requests and management commands.
+
+A profile run records CPU time (cProfile, or a low-overhead stack sampler) and
+memory allocations (tracemalloc) for one request or command. It writes the raw
+data to PROFILE_DIR next to a JSON summary that the staff profiles page reads:
+  <id>.json        summary with the top functions and allocations
+  <id>.prof        pstats file (cProfile mode), for snakeviz / pstats
+  <id>.folded      collapsed stacks (sampling mode), for flamegraph tools
+  <id>.tracemalloc tracemalloc snapshot, for tracemalloc.Snapshot.load()
+
+Requests are profiled when a staff user adds ?profile=1 (or ?profile=sample),
+or when the X-Profile header matches settings.PROFILE_TOKEN. Commands get a
+--profile option from ProfileCommandMixin.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+PROFILE_DIR = getattr(settings, 'PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+PROFILE_KEEP = getattr(settings, 'PROFILE_KEEP', 50)
+PROFILE_TOKEN = getattr(settings, 'PROFILE_TOKEN', '')
+SAMPLE_INTERVAL = getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.005)  # seconds between stack samples
+TRACEMALLOC_FRAMES = 10
+TOP_N = 25
+MODES = ('cprofile', 'sample')
+
+# cProfile and tracemalloc are process wide, so only one profile runs at a time
+_busy = threading.Lock()
+_ID_RE = re.compile(r'^[0-9a-z_-]+$')
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class _StackSampler:
+    """Samples one thread's stack on a timer and counts the collapsed stacks"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def top_functions(self, limit=TOP_N):
+        """Functions by number of samples in which they were on the stack (inclusive)"""
+        total = sum(self.stacks.values()) or 1
+        inclusive = Counter()
+        for stack, count in self.stacks.items():
+            for function in set(stack.split(';')):
+                inclusive[function] += count
+        return [
+            {'function': function, 'samples': count, 'percent': round(100.0 * count / total, 1)}
+            for function, count in inclusive.most_common(limit)
+        ]
+
+    def folded(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common())
+
+
+class Profile:
+    """
+    Context manager that profiles the enclosed block and saves the results.
+    Raises ProfilerBusy on entry if another profile is already running.
+    """
+
+    def __init__(self, label, kind='request', mode='cprofile'):
+        self.label = label
+        self.kind = kind
+        self.mode = mode if mode in MODES else 'cprofile'
+        self.id = None
+        self.summary = None
+
+    def __enter__(self):
+        if not _busy.acquire(blocking=False):
+            raise ProfilerBusy('Another profile is already running')
+        self._started_tracemalloc = not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        if self.mode == 'sample':
+            self._profiler = _StackSampler(threading.get_ident())
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            duration = time.perf_counter() - self._start
+            if self.mode == 'sample':
+                self._profiler.stop()
+            else:
+                self._profiler.disable()
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            self._save(duration, peak, snapshot, failed=exc_type is not None)
+        finally:
+            _busy.release()
+        return False
+
+    def _save(self, duration, peak, snapshot, failed):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        slug = re.sub(r'[^0-9a-z]+', '-', self.label.lower()).strip('-')[:60] or 'profile'
+        self.id = f"{self._started_at.strftime('%Y%m%d-%H%M%S-%f')}-{slug}"
+        base = os.path.join(PROFILE_DIR, self.id)
+        files = {'tracemalloc': f'{self.id}.tracemalloc'}
+
+        if self.mode == 'sample':
+            top_functions = self._profiler.top_functions()
+            with open(base + '.folded', 'w') as f:
+                f.write(self._profiler.folded())
+            files['folded'] = f'{self.id}.folded'
+        else:
+            self._profiler.dump_stats(base + '.prof')
+            files['pstats'] = f'{self.id}.prof'
+            top_functions = _top_functions(self._profiler)
+
+        # Leave our own bookkeeping out of the allocation report
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        snapshot.dump(base + '.tracemalloc')
+        top_allocations = [
+            {
+                'location': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+                'size_kb': round(stat.size / 1024, 1),
+                'count': stat.count,
+            }
+            for stat in snapshot.statistics('lineno')[:TOP_N]
+        ]
+
+        self.summary = {
+            'id': self.id,
+            'label': self.label,
+            'kind': self.kind,
+            'mode': self.mode,
+            'started_at': self._started_at.isoformat(),
+            'duration_ms': round(duration * 1000, 1),
+            'peak_memory_kb': round(peak / 1024, 1),
+            'failed': failed,
+            'top_functions': top_functions,
+            'top_allocations': top_allocations,
+            'files': files,
+        }
+        with open(base + '.json', 'w') as f:
+            json.dump(self.summary, f, indent=2)
+        prune()
+
+
+def _top_functions(profiler, limit=TOP_N):
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, lineno, name), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': f'{name} ({os.path.basename(filename)}:{lineno})',
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 2),
+            'cumtime_ms': round(cumtime * 1000, 2),
+        })
+    rows.sort(key=lambda row: row['cumtime_ms'], reverse=True)
+    return rows[:limit]
+
+
+def list_profiles(limit=PROFILE_KEEP):
+    """Saved profile summaries, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    names = sorted((n for n in os.listdir(PROFILE_DIR) if n.endswith('.json')), reverse=True)
+    profiles = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def profile_file(profile_id, filename):
+    """Path of a file belonging to a saved profile, or None"""
+    if not _ID_RE.match(profile_id) or not filename.startswith(profile_id + '.') or os.sep in filename:
+        return None
+    path = os.path.join(PROFILE_DIR, filename)
+    return path if os.path.isfile(path) else None
+
+
+def prune(keep=PROFILE_KEEP):
+    """Delete all but the newest `keep` profiles"""
+    if not os.path.isdir(PROFILE_DIR):
+        return
+    ids = sorted({name.split('.')[0] for name in os.listdir(PROFILE_DIR)}, reverse=True)
+    for old_id in ids[keep:]:
+        for name in os.listdir(PROFILE_DIR):
+            if name.split('.')[0] == old_id:
+                try:
+                    os.remove(os.path.join(PROFILE_DIR, name))
+                except OSError:
+                    pass
+
+
+def requested_mode(request):
+    """The profiling mode asked for by a request, or None if it should not be profiled"""
+    header = request.headers.get('X-Profile')
+    if header and PROFILE_TOKEN:
+        token, _, mode = header.partition(':')
+        if token == PROFILE_TOKEN:
+            return mode or 'cprofile'
+
+    flag = request.GET.get('profile')
+    if flag and request.user.is_authenticated and request.user.is_staff:
+        return 'sample' if flag == 'sample' else 'cprofile'
+    return None
+
+
+class ProfilingMiddleware:
+    """Profile individual requests on demand and report the profile id in X-Profile-Id"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = requested_mode(request)
+        if not mode:
+            return self.get_response(request)
+
+        profile = Profile(f'{request.method} {request.path}', kind='request', mode=mode)
+        try:
+            with profile:
+                response = self.get_response(request)
+        except ProfilerBusy:
+            response = self.get_response(request)
+            response['X-Profile-Id'] = 'busy'
+            return response
+        response['X-Profile-Id'] = profile.id
+        response['X-Profile-Duration-Ms'] = str(profile.summary['duration_ms'])
+        return response
+
+
+class ProfileCommandMixin:
+    """Adds --profile [cprofile|sample] to a management command"""
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.add_argument('--profile', nargs='?', const='cprofile', choices=MODES,
+                            help='Profile this run and save pstats and tracemalloc data to PROFILE_DIR')
+        return parser
+
+    def execute(self, *args, **options):
+        mode = options.get('profile')
+        if not mode:
+            return super().execute(*args, **options)
+
+        # System checks import every view module; run them first so the profile covers only the command
+        if self.requires_system_checks and not options.get('skip_checks'):
+            self.check()
+            options['skip_checks'] = True
+
+        profile = Profile(f'command {self.__module__.rsplit(".", 1)[-1]}', kind='command', mode=mode)
+        with profile:
+            result = super().execute(*args, **options)
+        summary = profile.summary
+        self.stderr.write(
+            f"Profile {profile.id}: {summary['duration_ms']} ms, peak {summary['peak_memory_kb']} KB "
+            f"(saved in {PROFILE_DIR})"
+        )
+        return result
@@ -0,0 +1,159 @@
+"""
+Sustainability report rendering.
+"""
+import io
+from datetime import datetime
+
+from .models import FlightRoute
+from .approx import analytics_summary
+
+def build_sustainability_report(progress=None, approximate=False):
+    """
+    Render the flight emissions sustainability report as PDF bytes.
+    progress is an optional callable(fraction, message) used when running as a background job.
+    With approximate=True the summary totals are estimated from a sample (see approx.py).
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    
+    progress = progress or (lambda fraction, message='': None)
+    
+    # Create a file-like buffer to receive PDF data
+    buffer = io.BytesIO()
+    
+    # Create the PDF object, using the buffer as its "file"
+    doc = SimpleDocTemplate(
+        buffer, 
+        pagesize=letter,
+        rightMargin=72, 
+        leftMargin=72,
+        topMargin=72, 
+        bottomMargin=72
+    )
+    
+    # Create styles
+    styles = getSampleStyleSheet()
+    title_style = styles['Title']
+    heading_style = styles['Heading1']
+    subheading_style = styles['Heading2']
+    normal_style = styles['Normal']
+    
+    # Add custom style for the green text
+    green_style = ParagraphStyle(
+        'GreenText', 
+        parent=normal_style,
+        textColor=colors.green
+    )
+    
+    # Container for elements to build the PDF
+    elements = []
+    
+    # Add title
+    elements.append(Paragraph("Flight Emissions Sustainability Report", title_style))
+    elements.append(Spacer(1, 0.25*inch))
+    
+    # Add date
+    elements.append(Paragraph(f"Generated on: {datetime.now().strftime('%B %d, %Y')}", normal_style))
+    elements.append(Spacer(1, 0.5*inch))
+    
+    # Add executive summary
+    elements.append(Paragraph("Executive Summary", heading_style))
+    
+    # Get summary data
+    summary = analytics_summary(approximate=approximate)
+    total_co2_saved = summary['total_co2_kg']['value']
+    total_fuel_saved = summary['total_fuel_saved_kg']['value']
+    flights_optimized = int(summary['count']['value'])
+    
+    summary_text = f"""
+    This report summarizes the environmental impact of flight optimization activities.
+    To date, we have optimized {flights_optimized} flights, resulting in:
+    
+    • <b>{total_co2_saved:.2f} kg</b> of CO₂ emissions saved
+    • <b>{total_fuel_saved:.2f} kg</b> of aviation fuel saved
+    
+    This is equivalent to planting approximately <b>{int(total_co2_saved/21)}</b> trees or removing <b>{int(total_co2_saved/4600)}</b> cars from the road for one year.
+    """
+    
+    elements.append(Paragraph(summary_text, normal_style))
+    if summary['approximate']:
+        co2 = summary['total_co2_kg']
+        elements.append(Paragraph(
+            f"Figures are estimated from a {summary['sample_fraction']:.2%} sample of emission records "
+            f"(CO₂ saved: {co2['lower']:.0f} to {co2['upper']:.0f} kg, 95% interval).",
+            normal_style
+        ))
+    elements.append(Spacer(1, 0.25*inch))
+    
+    progress(0.4, 'Summary calculated')
+    
+    # Add most efficient routes section
+    elements.append(Paragraph("Most Efficient Routes", heading_style))
+    
+    efficient_routes = FlightRoute.objects.filter(
+        efficiency_kg_per_km__isnull=False
+    ).order_by('efficiency_kg_per_km')[:5]
+    
+    # Create data for the table
+    route_data = [['Route', 'Aircraft', 'Distance (km)', 'Efficiency (kg/km)']]
+    
+    for route in efficient_routes:
+        route_data.append([
+            f"{route.origin} → {route.destination}",
+            route.aircraft_type,
+            f"{route.distance_km}",
+            f"{route.efficiency_kg_per_km:.2f}"
+        ])
+    
+    # Create the table
+    table = Table(route_data, colWidths=[2*inch, 1.5*inch, 1*inch, 1.5*inch])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgreen),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    
+    elements.append(table)
+    elements.append(Spacer(1, 0.25*inch))
+    
+    # Add recommendations
+    elements.append(Paragraph("Recommendations for Further Improvements", heading_style))
+    
+    recommendations = """
+    1. <b>Fleet Modernization:</b> Consider newer aircraft models with better fuel efficiency metrics.
+    
+    2. <b>Operational Optimizations:</b> Implement continuous descent approaches and reduced engine taxi procedures.
+    
+    3. <b>Route Planning:</b> Utilize meteorological data to plan routes that take advantage of favorable winds.
+    
+    4. <b>Sustainable Aviation Fuel:</b> Explore opportunities to incorporate sustainable aviation fuels into operations.
+    """
+    
+    elements.append(Paragraph(recommendations, normal_style))
+    elements.append(Spacer(1, 0.5*inch))
+    
+    # Certification statement
+    certification = """
+    This report is generated by the GreenFlight Optimizer platform. The data and analysis provided are based on industry-standard 
+    emissions calculations and actual flight data. This report can be used for internal sustainability tracking and external 
+    environmental impact reporting.
+    """
+    
+    elements.append(Paragraph(certification, green_style))
+    
+    # Build the PDF
+    progress(0.7, 'Rendering PDF')
+    doc.build(elements)
+    
+    # Get the value of the BytesIO buffer
+    pdf = buffer.getvalue()
+    buffer.close()
+    
+    return pdf
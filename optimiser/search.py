@@ -0,0 +1,156 @@
+"""
+In-memory typeahead index over the route catalog.
+
+The index holds every origin, destination and aircraft type with the number of
+routes that use it. Lookups are binary searches over sorted normalised keys
+(the full name and each of its tokens), so "nai", "NAI" and "Nairobi" all find
+NAIROBI and "york" finds NEW YORK. The index is built once per process and
+rebuilt lazily after the route catalog changes.
+"""
+import bisect
+import re
+import threading
+import time
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import FlightRoute, Airport, AircraftType, REFERENCE_FIELDS
+
+FIELDS = ('origin', 'destination', 'aircraft_type')
+CITY = 'city'  # origins and destinations combined
+VERSION_KEY = 'route_catalog:version'
+VERSION_CHECK_INTERVAL = 5  # seconds between checks for changes made by other workers
+MEMO_SIZE = 2048
+
+_TOKEN_RE = re.compile(r'[^0-9a-z]+')
+
+
+def normalise(text):
+    """Case- and whitespace-insensitive form of a name"""
+    return ' '.join(str(text).casefold().split())
+
+
+def tokens(text):
+    return [token for token in _TOKEN_RE.split(normalise(text)) if token]
+
+
+class SuggestIndex:
+    """Prefix and token index over (field, name, route count) entries"""
+
+    def __init__(self, counts):
+        # counts: {field: {name: route_count}}
+        self._names = {}
+        self._keys = {}
+        self._canonical = {}
+        self._memo = {}
+        for field, names in counts.items():
+            entries = sorted(names.items(), key=lambda item: (-item[1], item[0]))
+            self._names[field] = entries
+            keys = []
+            canonical = {}
+            for position, (name, count) in enumerate(entries):
+                full = normalise(name)
+                # Entries are sorted by popularity, so the first spelling seen wins
+                canonical.setdefault(full, name)
+                keys.append((full, position))
+                for token in tokens(name):
+                    if token != full:
+                        keys.append((token, position))
+            keys.sort()
+            self._keys[field] = keys
+            self._canonical[field] = canonical
+
+    def suggest(self, query, field=CITY, limit=10):
+        """Return up to limit (name, route_count) pairs matching the query prefix, most used first"""
+        prefix = normalise(query)
+        memo_key = (field, prefix, limit)
+        if memo_key in self._memo:
+            return self._memo[memo_key]
+
+        keys = self._keys.get(field, [])
+        entries = self._names.get(field, [])
+        if not prefix:
+            results = entries[:limit]
+        else:
+            matches = {}
+            start = bisect.bisect_left(keys, (prefix, -1))
+            for key, position in keys[start:]:
+                if not key.startswith(prefix):
+                    break
+                # Whole-name prefix matches rank ahead of token matches
+                rank = 0 if normalise(entries[position][0]).startswith(prefix) else 1
+                matches[position] = min(rank, matches.get(position, rank))
+            # Entry positions are already ordered by route count
+            ordered = sorted(matches, key=lambda position: (matches[position], position))
+            results = [entries[position] for position in ordered[:limit]]
+
+        if len(self._memo) >= MEMO_SIZE:
+            self._memo.clear()
+        self._memo[memo_key] = results
+        return results
+
+    def resolve(self, name, field):
+        """Map any casing/spacing of a known name to its catalog spelling, or None"""
+        return self._canonical.get(field, {}).get(normalise(name))
+
+    def top(self, field, limit=20):
+        """Most used names for a field"""
+        return [name for name, _ in self._names.get(field, [])[:limit]]
+
+
+def build_index():
+    """Build a SuggestIndex from grouped route counts (three GROUP BY queries on the small integer keys)"""
+    names = {model: dict(model.objects.values_list('id', 'name')) for model in (Airport, AircraftType)}
+    counts = {}
+    for field, reference, model in REFERENCE_FIELDS:
+        rows = FlightRoute.objects.values_list(reference).annotate(routes=Count('id')).order_by()
+        counts[field] = {}
+        for pk, routes in rows:
+            if pk is None:
+                # Routes not linked yet (raw inserts): count them by name
+                unlinked = FlightRoute.objects.filter(**{f'{reference}__isnull': True})
+                rows = unlinked.values_list(field).annotate(routes=Count('id')).order_by()
+            else:
+                rows = [(names[model][pk], routes)]
+            for name, routes in rows:
+                counts[field][name] = counts[field].get(name, 0) + routes
+
+    cities = {}
+    for field in ('origin', 'destination'):
+        for name, routes in counts[field].items():
+            cities[name] = cities.get(name, 0) + routes
+    counts[CITY] = cities
+    return SuggestIndex(counts)
+
+
+_lock = threading.Lock()
+_state = {'index': None, 'version': None, 'stale': True, 'checked_at': 0.0}
+
+
+def mark_stale():
+    """Called when routes change: rebuild here on next use and tell the other workers"""
+    _state['stale'] = True
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def get_index():
+    """Return the current index, rebuilding it if the catalog has changed"""
+    now = time.monotonic()
+    if not _state['stale'] and now - _state['checked_at'] >= VERSION_CHECK_INTERVAL:
+        _state['checked_at'] = now
+        if cache.get(VERSION_KEY) != _state['version']:
+            _state['stale'] = True
+
+    if _state['stale'] or _state['index'] is None:
+        with _lock:
+            if _state['stale'] or _state['index'] is None:
+                version = cache.get(VERSION_KEY)
+                _state['stale'] = False
+                _state['index'] = build_index()
+                _state['version'] = version
+                _state['checked_at'] = now
+    return _state['index']
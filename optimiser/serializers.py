@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import FlightRoute, EmissionRecord, PassengerEcoScore
+from .uncertainty import SAMPLES, MAX_SAMPLES
 
 class FlightRouteSerializer(serializers.ModelSerializer):
     class Meta:
@@ -22,3 +23,7 @@ class OptimiseFlightSerializer(serializers.Serializer):
     origin = serializers.CharField(max_length=100)
     destination = serializers.CharField(max_length=100)
     aircraft_type = serializers.CharField(max_length=100)
+    # Optional Monte Carlo P5/P50/P95 bands (see optimiser/uncertainty.py)
+    uncertainty = serializers.BooleanField(required=False, default=False)
+    samples = serializers.IntegerField(required=False, min_value=100, max_value=MAX_SAMPLES, default=SAMPLES)
+    seed = serializers.IntegerField(required=False, min_value=0, allow_null=True, default=None)
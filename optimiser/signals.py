@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import FlightRoute, EmissionFactor, EmissionRecord, PassengerEcoScore, Airport, AircraftType
+from . import caching, factors, geo, matrix, search
+
+@receiver(post_save, sender=FlightRoute)
+@receiver(post_delete, sender=FlightRoute)
+def refresh_suggest_index(sender, **kwargs):
+    """Rebuild the typeahead index after the route catalog changes"""
+    search.mark_stale()
+
+@receiver(post_save, sender=FlightRoute)
+@receiver(post_delete, sender=FlightRoute)
+def refresh_efficiency_matrix(sender, instance, **kwargs):
+    """Re-query the efficiency matrix for the pairs the route was and is on"""
+    matrix.route_changed(instance)
+
+@receiver(post_save, sender=EmissionFactor)
+@receiver(post_delete, sender=EmissionFactor)
+def refresh_current_factor(sender, **kwargs):
+    """Pick up a new or corrected emission factor on the next calculation"""
+    factors.clear_current()
+
+@receiver(post_save, sender=FlightRoute)
+@receiver(post_delete, sender=FlightRoute)
+def refresh_cached_catalog(sender, **kwargs):
+    """Drop cached route, airport and aircraft lists"""
+    caching.bump(caching.CATALOG)
+
+# No post_delete receiver: it would stop Django deleting a route's emission records
+# with one DELETE. EmissionRecord and FlightRoute bump the namespace on delete instead.
+@receiver(post_save, sender=EmissionRecord)
+def refresh_cached_emissions(sender, **kwargs):
+    """Drop cached emission analytics"""
+    caching.bump(caching.EMISSIONS)
+
+@receiver(post_save, sender=PassengerEcoScore)
+@receiver(post_delete, sender=PassengerEcoScore)
+def refresh_cached_eco_score(sender, instance, **kwargs):
+    """Drop the passenger's cached eco score"""
+    caching.bump(caching.ECO_SCORE % instance.user_id)
+
+@receiver(post_save, sender=Airport)
+@receiver(post_save, sender=AircraftType)
+@receiver(post_delete, sender=Airport)
+@receiver(post_delete, sender=AircraftType)
+def refresh_reference_ids(sender, created=False, **kwargs):
+    """Forget the name -> id lookups of every process when a name is edited or removed"""
+    # A new name leaves every id already looked up valid
+    if not created:
+        caching.bump(caching.REFERENCES)
+        caching.bump(caching.CATALOG)
+
+@receiver(post_save, sender=Airport)
+@receiver(post_delete, sender=Airport)
+def refresh_geo_index(sender, **kwargs):
+    """Place cities at their new coordinates in the nearest-airport trees"""
+    transaction.on_commit(geo.mark_stale)
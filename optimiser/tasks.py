@@ -0,0 +1,46 @@
+"""
+Background job handlers run by `manage.py runworker`.
+"""
+import io
+
+from django.core.management import call_command
+
+from .jobs import job
+
+def _run_command(context, name, **options):
+    """Run a management command inside a job, keeping the tail of its output as the result"""
+    output = io.StringIO()
+    context.progress(0.05, f'Running {name}')
+    call_command(name, stdout=output, stderr=output, **options)
+    return {'output': output.getvalue().splitlines()[-20:]}
+
+@job('ensure_all_routes', concurrency=1)
+def ensure_all_routes(context, force=True):
+    """Create every missing origin/destination/aircraft combination"""
+    return _run_command(context, 'ensure_all_routes', force=force)
+
+@job('generate_report', concurrency=2)
+def generate_report(context, approximate=False):
+    """Render the sustainability report PDF and keep it on the job for download"""
+    from .reports import build_sustainability_report
+
+    pdf = build_sustainability_report(progress=context.progress, approximate=approximate)
+    context.save_artifact(pdf)
+    return {'filename': 'flight_sustainability_report.pdf', 'size': len(pdf)}
+
+@job('initialize_database', concurrency=1, max_attempts=5)
+def initialize_database(context):
+    """Verify tables and load sample data after deploy"""
+    return _run_command(context, 'initialize_database')
+
+@job('ensure_database_setup', concurrency=1, max_attempts=5)
+def ensure_database_setup(context):
+    """Check required tables exist and seed sample routes"""
+    return _run_command(context, 'ensure_database_setup')
+
+@job('refresh_forecasts', concurrency=1)
+def refresh_forecasts(context, levels=None):
+    """Refit the stored per-route and per-aircraft CO2 forecasts"""
+    from .forecasting import refresh_forecasts as refresh
+
+    return refresh(levels=levels, progress=context.progress)
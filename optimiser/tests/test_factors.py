@@ -0,0 +1,55 @@
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.test import TestCase
+
+from optimiser.factors import recompute_emissions
+from optimiser.models import EmissionFactor, EmissionRecord, FlightRoute
+
+
+def _at(year, month, day):
+    return datetime(year, month, day, 12, tzinfo=dt_timezone.utc)
+
+
+class RecomputeEmissionsTests(TestCase):
+    def setUp(self):
+        EmissionFactor.objects.all().delete()
+        self.old = EmissionFactor.objects.create(version='OLD', co2_per_kg_fuel=3.16, effective_from=date(2020, 1, 1))
+        self.new = EmissionFactor.objects.create(version='NEW', co2_per_kg_fuel=3.0, effective_from=date(2026, 1, 1))
+        route = FlightRoute.objects.create(origin='Arendelle', destination='Genovia', aircraft_type='Airbus A320',
+                                           distance_km=1000, fuel_consumption_kg=3400)
+        self.before = EmissionRecord.objects.create(route=route, calculation_date=_at(2025, 6, 1), co2_kg=316.0,
+                                                    factor=self.old)
+        self.after = [
+            EmissionRecord.objects.create(route=route, calculation_date=_at(2026, 3, day), co2_kg=316.0, factor=self.old)
+            for day in (1, 2, 3)
+        ]
+        # Written before factors were recorded: calculated with DEFAULT_CO2_PER_KG_FUEL
+        self.unfactored = EmissionRecord.objects.create(route=route, calculation_date=_at(2019, 6, 1), co2_kg=316.0)
+
+    def co2(self, record):
+        record.refresh_from_db()
+        return round(record.co2_kg, 6), record.factor_id
+
+    def test_restates_records_on_a_superseded_factor(self):
+        # chunk_size 2 so the records span several UPDATEs
+        self.assertEqual(recompute_emissions(chunk_size=2), 4)
+        for record in self.after:
+            self.assertEqual(self.co2(record), (300.0, self.new.pk))
+        self.assertEqual(self.co2(self.before), (316.0, self.old.pk))
+        # Older than the first factor: restated with it, which is the default value
+        self.assertEqual(self.co2(self.unfactored), (316.0, self.old.pk))
+
+    def test_second_run_changes_nothing(self):
+        recompute_emissions()
+        self.assertEqual(recompute_emissions(), 0)
+        self.assertEqual(self.co2(self.after[0]), (300.0, self.new.pk))
+
+    def test_dry_run_only_counts(self):
+        self.assertEqual(recompute_emissions(dry_run=True), 4)
+        self.assertEqual(self.co2(self.after[0]), (316.0, self.old.pk))
+
+    def test_date_range_and_records(self):
+        self.assertEqual(recompute_emissions(since=date(2026, 3, 2), until=date(2026, 3, 3)), 1)
+        self.assertEqual([self.co2(record)[0] for record in self.after], [316.0, 300.0, 316.0])
+        self.assertEqual(recompute_emissions(records=EmissionRecord.objects.filter(pk=self.after[0].pk)), 1)
+        self.assertEqual([self.co2(record)[0] for record in self.after], [300.0, 300.0, 316.0])
@@ -0,0 +1,69 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class ReferenceTablesMigrationTests(TransactionTestCase):
+    """0006_reference_tables rewrites spellings and merges the routes they duplicate"""
+    migrate_from = [('optimiser', '0005_route_efficiency')]
+    migrate_to = [('optimiser', '0006_reference_tables')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        apps = executor.loader.project_state(self.migrate_from).apps
+        FlightRoute = apps.get_model('optimiser', 'FlightRoute')
+        EmissionRecord = apps.get_model('optimiser', 'EmissionRecord')
+
+        def route(origin, destination, aircraft_type, records):
+            created = FlightRoute.objects.create(
+                origin=origin, destination=destination, aircraft_type=aircraft_type,
+                distance_km=1000, fuel_consumption_kg=3400, efficiency_kg_per_km=3.4,
+            )
+            EmissionRecord.objects.bulk_create([EmissionRecord(route=created, co2_kg=100.0 + i) for i in range(records)])
+            return created.pk
+
+        self.canonical = route('Nairobi', 'Entebbe', 'Airbus A320', 2)
+        self.duplicate = route('NAIROBI ', 'entebbe', 'Airbus A320', 1)
+        self.renamed = route('Nairobi', 'Kigali', 'airbus  a320', 1)
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.migrate_to)
+        self.apps = executor.loader.project_state(self.migrate_to).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicate_merged_with_its_emission_records(self):
+        FlightRoute = self.apps.get_model('optimiser', 'FlightRoute')
+        EmissionRecord = self.apps.get_model('optimiser', 'EmissionRecord')
+        self.assertFalse(FlightRoute.objects.filter(pk=self.duplicate).exists())
+        self.assertEqual(EmissionRecord.objects.count(), 4)
+        self.assertEqual(EmissionRecord.objects.filter(route_id=self.canonical).count(), 3)
+
+    def test_names_rewritten_to_most_used_spelling(self):
+        FlightRoute = self.apps.get_model('optimiser', 'FlightRoute')
+        renamed = FlightRoute.objects.get(pk=self.renamed)
+        self.assertEqual(renamed.aircraft_type, 'Airbus A320')
+        self.assertEqual(
+            sorted(FlightRoute.objects.values_list('origin', 'destination')),
+            [('Nairobi', 'Entebbe'), ('Nairobi', 'Kigali')],
+        )
+
+    def test_reference_tables_filled_and_linked(self):
+        FlightRoute = self.apps.get_model('optimiser', 'FlightRoute')
+        Airport = self.apps.get_model('optimiser', 'Airport')
+        AircraftType = self.apps.get_model('optimiser', 'AircraftType')
+        AircraftEfficiency = self.apps.get_model('optimiser', 'AircraftEfficiency')
+        self.assertEqual(sorted(Airport.objects.values_list('name', 'key')),
+                         [('Entebbe', 'entebbe'), ('Kigali', 'kigali'), ('Nairobi', 'nairobi')])
+        self.assertEqual(list(AircraftType.objects.values_list('name', flat=True)), ['Airbus A320'])
+        for route in FlightRoute.objects.all():
+            self.assertEqual(route.origin_airport.name, route.origin)
+            self.assertEqual(route.destination_airport.name, route.destination)
+            self.assertEqual(route.aircraft.name, route.aircraft_type)
+        self.assertEqual(
+            list(AircraftEfficiency.objects.values_list('aircraft_type', 'route_count')), [('Airbus A320', 2)]
+        )
@@ -0,0 +1,92 @@
+from django.db import connection
+from django.test import TestCase
+
+from optimiser.models import FlightRoute, Airport, AircraftType
+
+
+def _route(origin, destination, aircraft_type):
+    return FlightRoute.objects.create(
+        origin=origin, destination=destination, aircraft_type=aircraft_type,
+        distance_km=1000, fuel_consumption_kg=3400,
+    )
+
+
+def _raw_route(origin, destination, aircraft_type):
+    """Insert a route the way the synthesize fixtures do, skipping save() and the queryset hooks"""
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {qn(FlightRoute._meta.db_table)} '
+            f'(origin, destination, aircraft_type, distance_km, fuel_consumption_kg) VALUES (%s, %s, %s, %s, %s)',
+            [origin, destination, aircraft_type, 1000, 3400],
+        )
+    return FlightRoute.objects.get(origin=origin, destination=destination, aircraft_type=aircraft_type)
+
+
+class ReferenceNameTests(TestCase):
+    def test_save_uses_the_first_spelling_seen(self):
+        _route('Arendelle', 'Genovia', 'Airbus A320')
+        route = _route('  ARENDELLE ', 'latveria', 'airbus   a320')
+        self.assertEqual((route.origin, route.aircraft_type), ('Arendelle', 'Airbus A320'))
+        self.assertEqual(route.origin_airport, Airport.objects.get(name='Arendelle'))
+        self.assertEqual(AircraftType.objects.count(), 1)
+
+    def test_find_resolves_any_spelling_without_adding_names(self):
+        _route('Arendelle', 'Genovia', 'Airbus A320')
+        arendelle = Airport.objects.get(name='Arendelle').pk
+        for spelling in ('Arendelle', 'arendelle', ' ARENDELLE ', 'aReNdElLe'):
+            self.assertEqual(Airport.find(spelling), (arendelle, 'Arendelle'))
+        self.assertIsNone(Airport.find('Atlantis'))
+        self.assertFalse(Airport.objects.filter(key='atlantis').exists())
+
+
+class NamedTests(TestCase):
+    def setUp(self):
+        self.route = _route('Arendelle', 'Genovia', 'Airbus A320')
+        _route('Arendelle', 'Latveria', 'Airbus A320')
+        _route('Genovia', 'Arendelle', 'Boeing 737-800')
+
+    def test_every_spelling_finds_the_route(self):
+        for names in (('Arendelle', 'Genovia', 'Airbus A320'), ('arendelle', 'GENOVIA', ' airbus  a320 ')):
+            self.assertEqual(list(FlightRoute.objects.named(*names)), [self.route])
+
+    def test_partial_names(self):
+        self.assertEqual(FlightRoute.objects.named(origin='ARENDELLE').count(), 2)
+        self.assertEqual(FlightRoute.objects.named(aircraft_type='boeing 737-800').count(), 1)
+
+    def test_unknown_name_matches_nothing_without_a_query(self):
+        with self.assertNumQueries(1):
+            # The lookup of the unknown name in the Airport table only
+            self.assertEqual(list(FlightRoute.objects.named('Atlantis', 'Genovia')), [])
+        self.assertFalse(Airport.objects.filter(key='atlantis').exists())
+
+
+class LinkReferencesTests(TestCase):
+    def test_raw_inserts_are_linked(self):
+        _route('Arendelle', 'Genovia', 'Airbus A320')
+        raw = _raw_route('Arendelle', 'Latveria', 'Airbus A320')
+        self.assertIsNone(raw.origin_airport_id)
+        self.assertEqual(FlightRoute.objects.named('Arendelle', 'Latveria').count(), 0)
+
+        self.assertEqual(FlightRoute.objects.link_references(), 0)
+        raw.refresh_from_db()
+        self.assertEqual(raw.origin_airport, Airport.objects.get(name='Arendelle'))
+        self.assertEqual(raw.destination_airport, Airport.objects.get(name='Latveria'))
+        self.assertEqual(list(FlightRoute.objects.named('arendelle', 'latveria')), [raw])
+
+    def test_other_spellings_rewritten_to_the_canonical_one(self):
+        _route('Arendelle', 'Genovia', 'Airbus A320')
+        raw = _raw_route('ARENDELLE', 'Latveria', 'airbus a320')
+        self.assertEqual(FlightRoute.objects.link_references(), 2)
+        raw.refresh_from_db()
+        self.assertEqual((raw.origin, raw.aircraft_type), ('Arendelle', 'Airbus A320'))
+        self.assertEqual(raw.aircraft, AircraftType.objects.get(name='Airbus A320'))
+
+    def test_spelling_that_duplicates_a_route_is_left_alone(self):
+        existing = _route('Arendelle', 'Genovia', 'Airbus A320')
+        raw = _raw_route('ARENDELLE', 'Genovia', 'Airbus A320')
+        with self.assertLogs('optimiser.models', 'WARNING'):
+            self.assertEqual(FlightRoute.objects.link_references(), 0)
+        raw.refresh_from_db()
+        self.assertEqual(raw.origin, 'ARENDELLE')
+        self.assertTrue(FlightRoute.objects.filter(pk=existing.pk).exists())
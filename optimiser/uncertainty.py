@@ -0,0 +1,161 @@
+"""
+Monte Carlo uncertainty bands for emission estimates.
+
+estimate_emissions and calculate_optimization give single values. Their inputs are
+uncertain, so here each one is drawn SAMPLES times:
+  fuel burn        lognormal around the stored figure, drawn separately per aircraft
+  load factor      beta around LOAD_FACTOR, moving fuel by LOAD_ELASTICITY
+  distance flown   normal deviation from the planned distance (routing, holding)
+  emission factor  normal around the factor in force
+
+Every route and every sample is handled in one NumPy array operation of shape
+(routes, samples). Flights compared on the same city pair share the load,
+distance and emission factor draws, and differ only in fuel burn. Savings are
+therefore not widened by noise that affects both aircraft equally. Results are
+reported as P5/P50/P95.
+"""
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+
+from .caching import EMISSIONS, cached
+from .factors import current_co2_per_kg_fuel
+from .models import EmissionRecord
+
+SAMPLES = getattr(settings, 'UNCERTAINTY_SAMPLES', 10000)
+MAX_SAMPLES = getattr(settings, 'UNCERTAINTY_MAX_SAMPLES', 100000)
+FUEL_BURN_SIGMA = 0.05  # relative spread of actual against stored fuel burn
+LOAD_FACTOR = 0.82  # mean seat load factor the stored fuel burn assumes
+LOAD_FACTOR_SD = 0.08
+LOAD_ELASTICITY = 0.3  # relative fuel change per unit change of load factor
+DISTANCE_SD = 0.03  # relative deviation of the distance flown from the planned one
+EMISSION_FACTOR_SD = 0.01  # relative uncertainty of the CO2 per kg fuel factor
+PERCENTILES = (5, 50, 95)
+TOTALS_CACHE_TTL = 300
+
+
+def _beta_parameters(mean, sd):
+    k = mean * (1 - mean) / sd ** 2 - 1
+    return mean * k, (1 - mean) * k
+
+
+def _burn_draws(rows, samples, rng):
+    """Lognormal fuel burn of each row against its stored figure, mean 1"""
+    return rng.lognormal(-FUEL_BURN_SIGMA ** 2 / 2, FUEL_BURN_SIGMA, size=(rows, samples))
+
+
+def _shared_draws(samples, rng):
+    """Relative fuel from the load factor and the distance flown, shape (1, samples)"""
+    load = rng.beta(*_beta_parameters(LOAD_FACTOR, LOAD_FACTOR_SD), size=(1, samples))
+    distance = np.maximum(rng.normal(1.0, DISTANCE_SD, size=(1, samples)), 0.5)
+    return (1 + LOAD_ELASTICITY * (load - LOAD_FACTOR)) * distance
+
+
+def fuel_multipliers(rows, samples=SAMPLES, rng=None):
+    """
+    Relative fuel of each row in each sample, shape (rows, samples), with mean 1.
+    Fuel burn is drawn per row; load factor and distance once per sample, shared by every row.
+    """
+    rng = rng or np.random.default_rng()
+    burn = _burn_draws(rows, samples, rng)
+    return burn * _shared_draws(samples, rng)
+
+
+def emission_factors(co2_per_kg_fuel, samples=SAMPLES, rng=None):
+    rng = rng or np.random.default_rng()
+    return rng.normal(co2_per_kg_fuel, co2_per_kg_fuel * EMISSION_FACTOR_SD, size=(1, samples))
+
+
+def percentiles(draws):
+    """{'p5', 'p50', 'p95'} of a 1-d array, or a list of them for each row of a 2-d array"""
+    values = np.percentile(draws, PERCENTILES, axis=-1)
+    if values.ndim == 1:
+        return {f'p{p}': round(float(v), 2) for p, v in zip(PERCENTILES, values)}
+    return [
+        {f'p{p}': round(float(v), 2) for p, v in zip(PERCENTILES, column)}
+        for column in values.T
+    ]
+
+
+def simulate_co2(fuel_kg, samples=SAMPLES, seed=None, co2_per_kg_fuel=None):
+    """CO2 draws, shape (len(fuel_kg), samples), for aircraft flying the same city pair"""
+    rng = np.random.default_rng(seed)
+    fuel_kg = np.asarray(fuel_kg, dtype=float).reshape(-1, 1)
+    if co2_per_kg_fuel is None:
+        co2_per_kg_fuel = current_co2_per_kg_fuel()
+    return fuel_kg * fuel_multipliers(len(fuel_kg), samples, rng) * emission_factors(co2_per_kg_fuel, samples, rng)
+
+
+def optimisation_bands(original_fuel_kg, optimized_fuel_kg=None, default_saving=0.1, samples=SAMPLES, seed=None):
+    """
+    P5/P50/P95 of CO2 for the original and optimised aircraft and of the CO2 saved.
+    Without an optimised aircraft the saving is default_saving of the original, as in
+    calculate_optimization.
+    """
+    samples = min(max(int(samples), 100), MAX_SAMPLES)
+    fuel = [original_fuel_kg] if optimized_fuel_kg is None else [original_fuel_kg, optimized_fuel_kg]
+    co2 = simulate_co2(fuel, samples, seed)
+    optimized = co2[1] if optimized_fuel_kg is not None else co2[0] * (1 - default_saving)
+    bands = percentiles(co2)
+    return {
+        'samples': samples,
+        'seed': seed,
+        'original_co2_kg': bands[0],
+        'optimized_co2_kg': percentiles(optimized),
+        'co2_saved_kg': percentiles(co2[0] - optimized),
+    }
+
+
+@cached(EMISSIONS, ttl=TOTALS_CACHE_TTL)
+def _totals_by_aircraft():
+    return list(
+        EmissionRecord.objects.values_list('route__aircraft_type')
+        .annotate(co2=Sum('co2_kg'), fuel_saved=Sum('fuel_saved_kg'))
+        .order_by()
+    )
+
+
+def analytics_bands(samples=SAMPLES, seed=None):
+    """
+    P5/P50/P95 of total CO2 and fuel saved over all emission records.
+
+    Over thousands of flights the per-flight noise averages out. What is left is the
+    bias each aircraft type shares across all its flights, so fuel burn is drawn per
+    aircraft type on the per-type totals (one GROUP BY query, cached until emissions change).
+    A saving is the original aircraft's fuel less the fuel of the aircraft it was
+    compared with, each with its own burn draw and the same load and distance.
+    The totals do not say which aircraft that was, so the alternatives of one type
+    share a single burn draw. The original fuel is read back from co2_kg with the
+    factor in force.
+    """
+    samples = min(max(int(samples), 100), MAX_SAMPLES)
+    rng = np.random.default_rng(seed)
+    totals = _totals_by_aircraft()
+    if not totals:
+        return {'samples': samples, 'seed': seed, 'by_aircraft': []}
+
+    names = [row[0] for row in totals]
+    co2 = np.array([row[1] or 0.0 for row in totals]).reshape(-1, 1)
+    fuel_saved = np.array([row[2] or 0.0 for row in totals]).reshape(-1, 1)
+    co2_per_kg_fuel = current_co2_per_kg_fuel()
+    shared = _shared_draws(samples, rng)
+    original = _burn_draws(len(names), samples, rng) * shared
+    alternative = _burn_draws(len(names), samples, rng) * shared
+    # co2_kg was stored with a factor already, so only its relative uncertainty applies
+    factor_ratio = emission_factors(co2_per_kg_fuel, samples, rng) / co2_per_kg_fuel
+    co2_draws = co2 * original * factor_ratio
+    original_fuel = co2 / co2_per_kg_fuel
+    fuel_saved_draws = original_fuel * original - (original_fuel - fuel_saved) * alternative
+
+    co2_bands = percentiles(co2_draws)
+    return {
+        'samples': samples,
+        'seed': seed,
+        'total_co2_kg': percentiles(co2_draws.sum(axis=0)),
+        'total_fuel_saved_kg': percentiles(fuel_saved_draws.sum(axis=0)),
+        'total_co2_saved_kg': percentiles((fuel_saved_draws * co2_per_kg_fuel * factor_ratio).sum(axis=0)),
+        'by_aircraft': [
+            {'aircraft_type': name, 'co2_kg': band}
+            for name, band in sorted(zip(names, co2_bands), key=lambda item: -item[1]['p50'])
+        ],
+    }
@@ -8,14 +8,25 @@ urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     path('api/docs/', views.api_docs, name='api_docs'),
     path('api/routes/', views.RouteListView.as_view(), name='route-list'),
+    path('api/routes/changes/', views.RouteChangesView.as_view(), name='route-changes'),
     path('api/optimise-flight/', views.OptimiseFlightView.as_view(), name='optimise-flight'),
+    path('api/efficiency-matrix/', views.EfficiencyMatrixView.as_view(), name='efficiency-matrix'),
+    path('api/fleet-assignment/', views.FleetAssignmentView.as_view(), name='fleet-assignment'),
     path('api/passenger-score/', views.PassengerScoreView.as_view(), name='passenger-score'),
     path('api/check-route/<str:origin>/<str:destination>/<str:aircraft_type>/', views.check_route, name='check-route'),
+    path('api/suggest/', views.suggest, name='suggest'),
     path('api/available-routes/', views.available_routes, name='available-routes'),
     path('api/verify-routes/', views.verify_routes, name='verify-routes'),
     path('analytics/', views.analytics_dashboard, name='analytics'),
     path('generate-report/', views.generate_report, name='generate-report'),
     path('api/predictive-analysis/', views.predictive_analysis, name='predictive-analysis'),
+    path('api/analytics/uncertainty/', views.analytics_uncertainty, name='analytics-uncertainty'),
+    path('api/forecasts/', views.forecasts, name='forecasts'),
+    path('api/jobs/', views.job_list, name='job-list'),
+    path('api/jobs/<int:job_id>/', views.job_detail, name='job-status'),
+    path('api/jobs/<int:job_id>/download/', views.job_download, name='job-download'),
+    path('profiles/', views.profile_list, name='profiles'),
+    path('profiles/<str:profile_id>/<str:filename>', views.profile_download, name='profile-download'),
     path('health/', views.health_check, name='health_check'),
 ]
 
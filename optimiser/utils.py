@@ -1,18 +1,30 @@
 from .models import FlightRoute, EmissionRecord
+from .coalescing import coalesce
+from .factors import current_co2_per_kg_fuel
 
-def estimate_emissions(fuel_consumption_kg):
+def estimate_emissions(fuel_consumption_kg, co2_per_kg_fuel=None):
     """
     Calculate CO2 emissions based on fuel consumption
-    Using the conversion factor of 3.16 kg CO2 per kg of aviation fuel
+    Using the emission factor in force today (3.16 kg CO2 per kg of aviation fuel until one is recorded)
     """
-    return fuel_consumption_kg * 3.16
+    if co2_per_kg_fuel is None:
+        co2_per_kg_fuel = current_co2_per_kg_fuel()
+    return fuel_consumption_kg * co2_per_kg_fuel
 
 def compare_aircraft_efficiency(origin, destination):
     """
     Compare different aircraft types for the same route
     Returns a list of aircraft sorted by efficiency
+    Concurrent calls for the same pair share one query
     """
-    routes = FlightRoute.objects.filter(origin=origin, destination=destination)
+    return coalesce(
+        ('compare_aircraft', origin, destination),
+        lambda: _rank_aircraft(origin, destination)
+    )
+
+def _rank_aircraft(origin, destination):
+    """Rank the aircraft flying origin to destination by fuel consumption"""
+    routes = FlightRoute.objects.named(origin, destination)
     
     if not routes.exists():
         return []
@@ -1,14 +1,83 @@
-from django.shortcuts import render, redirect
-from django.http import JsonResponse
+import json
+import logging
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse, HttpResponse, Http404, FileResponse
+from django.urls import reverse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics
 from django.db import models
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from .models import FlightRoute, EmissionRecord, PassengerEcoScore
+from django.contrib.admin.views.decorators import staff_member_required
+from .models import FlightRoute, EmissionRecord, PassengerEcoScore, Job, EmissionForecast, AircraftEfficiency, Airport, AircraftType
 from .serializers import FlightRouteSerializer, EmissionRecordSerializer, PassengerEcoScoreSerializer, OptimiseFlightSerializer
 from .utils import estimate_emissions, compare_aircraft_efficiency, calculate_optimization
+from .coalescing import coalesce
+from .writebehind import emission_writer
+from .jobs import enqueue as enqueue_job, job_status
+from .search import get_index as get_suggest_index, CITY, FIELDS as SUGGEST_FIELDS
+from .geo import nearest_alternatives
+from .profiling import list_profiles, profile_file, PROFILE_DIR
+from .forecasting import forecast_payload, SERIES_ORDER
+from .factors import current_factor
+from .approx import analytics_summary
+from .fastjson import FieldPlan, FAST_RENDERERS
+from .warmup import last_report as last_warmup_report
+from .uncertainty import optimisation_bands, analytics_bands, SAMPLES as UNCERTAINTY_SAMPLES
+from .matrix import get_matrix, MAX_DENSE_CITIES
+from .fleet import assign_fleet, FleetInputError, HOURS_PER_AIRCRAFT as FLEET_HOURS_PER_AIRCRAFT, REQUEST_TIME_LIMIT as FLEET_TIME_LIMIT
+from .caching import cached, get_or_compute, CATALOG, EMISSIONS, ECO_SCORE
+from .changes import route_changes, ResyncRequired, DEFAULT_LIMIT as CHANGES_LIMIT
+
+logger = logging.getLogger(__name__)
+
+HOME_SUGGESTIONS = 20  # names per field rendered into the home page form
+NOT_FOUND_SUGGESTIONS = 5  # alternatives listed when a route does not exist
+CATALOG_TTL = 300  # seconds; cached catalog and analytics reads are also dropped when the data changes
+ECO_SCORE_TTL = 600
+
+
+@cached(CATALOG, ttl=CATALOG_TTL)
+def _route_catalog():
+    """Names in use and the number of routes"""
+    return {
+        'total_routes': FlightRoute.objects.count(),
+        'origins': list(Airport.objects.origins().values_list('name', flat=True)),
+        'destinations': list(Airport.objects.destinations().values_list('name', flat=True)),
+        'aircraft_types': list(AircraftType.objects.in_use().values_list('name', flat=True)),
+    }
+
+
+@cached(CATALOG, ttl=CATALOG_TTL)
+def _lowest_routes(order_by, limit):
+    """The first limit routes by order_by, skipping routes where it is NULL"""
+    return list(FlightRoute.objects.filter(**{f'{order_by}__isnull': False}).order_by(order_by)[:limit])
+
+
+@cached(CATALOG, ttl=CATALOG_TTL)
+def _top_aircraft(limit):
+    """(aircraft type, average kg/km) of the most efficient types"""
+    return list(AircraftEfficiency.objects.filter(
+        avg_efficiency_kg_per_km__isnull=False
+    ).order_by('avg_efficiency_kg_per_km').values_list('aircraft_type', 'avg_efficiency_kg_per_km')[:limit])
+
+
+@cached(EMISSIONS, ttl=CATALOG_TTL)
+def _recent_emissions(limit):
+    """The latest emission records with their routes, and their CO2 and fuel totals"""
+    recent = EmissionRecord.objects.select_related('route').order_by('-calculation_date')[:limit]
+    totals = recent.aggregate(total_co2=models.Sum('co2_kg'), total_fuel=models.Sum('fuel_saved_kg'))
+    return list(recent), totals
+
+
+def _eco_score(user):
+    """The user's eco score, created on first use"""
+    return get_or_compute(
+        ECO_SCORE % user.id, 'score',
+        lambda: PassengerEcoScore.objects.get_or_create(user_id=user.id)[0],
+        ECO_SCORE_TTL,
+    )
 
 def home(request):
     """Render the home page"""
@@ -23,10 +92,10 @@ def home(request):
             try:
                 cursor.execute("SELECT COUNT(*) FROM optimiser_flightroute")
                 count = cursor.fetchone()[0]
-                print(f"Found {count} routes in database")
+                logger.debug('Found %d routes in database', count, extra={'event': 'home.route_count', 'routes': count})
             except Exception as db_error:
-                print(f"Database error: {str(db_error)}")
-                print("Attempting emergency migration...")
+                logger.warning('Database error, attempting emergency table creation: %s', db_error,
+                               extra={'event': 'home.emergency_setup'})
                 try:
                     # Try to create the table directly
                     cursor.execute("""
@@ -49,19 +118,19 @@ def home(request):
                     ('NEW YORK', 'WASHINGTON', 'Embraer E190', 330, 1100)
                     ON CONFLICT DO NOTHING
                     """)
-                    print("Emergency table creation completed")
-                except Exception as create_error:
-                    print(f"Emergency table creation failed: {str(create_error)}")
-    except Exception as e:
-        print(f"Database setup error: {str(e)}")
+                    logger.warning('Emergency table creation completed', extra={'event': 'home.emergency_setup'})
+                except Exception:
+                    logger.exception('Emergency table creation failed', extra={'event': 'home.emergency_setup'})
+    except Exception:
+        logger.exception('Database setup error', extra={'event': 'home.emergency_setup'})
 
     # Get data with robust error handling
     try:
-        # Get data from database or use defaults if empty
-        from .models import FlightRoute
-        origins = list(FlightRoute.objects.values_list('origin', flat=True).distinct())
-        destinations = list(FlightRoute.objects.values_list('destination', flat=True).distinct())
-        aircraft_types = list(FlightRoute.objects.values_list('aircraft_type', flat=True).distinct())
+        # Only the most used names are sent up front; the rest come from /api/suggest/ as the user types
+        index = get_suggest_index()
+        origins = index.top('origin', HOME_SUGGESTIONS)
+        destinations = index.top('destination', HOME_SUGGESTIONS)
+        aircraft_types = index.top('aircraft_type', HOME_SUGGESTIONS)
     except Exception as e:
         # Provide default values if database error
         origins = ["ENTEBBE", "NAIROBI", "LONDON", "NEW YORK", "JOHANNESBURG", "PARIS", "BERLIN", 
@@ -73,10 +142,7 @@ def home(request):
                          "Airbus A320", "Airbus A350-900", "Airbus A330-300", "Airbus A220-300", 
                          "Embraer E190", "ATR 72-600", "Airbus A380"]
         
-        # Log the error
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f"Error fetching flight data: {str(e)}")
+        logger.error('Error fetching flight data: %s', e, extra={'event': 'home.suggestions'})
 
     # Provide default values if database is empty
     if not origins:
@@ -98,28 +164,141 @@ def home(request):
     }
     return render(request, 'optimiser/home.html', context)
 
+# Same output as FlightRouteSerializer, built straight from query tuples
+ROUTE_PLAN = FieldPlan(FlightRoute, FlightRouteSerializer.Meta.fields)
+
 class RouteListView(generics.ListAPIView):
     """API endpoint to list all available routes"""
     queryset = FlightRoute.objects.all()
     serializer_class = FlightRouteSerializer
+    renderer_classes = FAST_RENDERERS
+    
+    def list(self, request, *args, **kwargs):
+        return Response(ROUTE_PLAN.rows(self.filter_queryset(self.get_queryset())))
     
     def get_queryset(self):
         queryset = FlightRoute.objects.all()
         origin = self.request.query_params.get('origin')
         destination = self.request.query_params.get('destination')
         
-        if origin:
-            queryset = queryset.filter(origin=origin)
-        if destination:
-            queryset = queryset.filter(destination=destination)
+        if origin or destination:
+            queryset = queryset.named(origin or None, destination or None)
             
         return queryset
 
+class RouteChangesView(APIView):
+    """
+    API endpoint for the route catalog changes after a cursor, for clients that mirror it
+    ?since=<version>&after=<route id>&limit=<n>; start from since=0 and follow 'next'
+    """
+    renderer_classes = FAST_RENDERERS
+    
+    def get(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+            after = int(request.query_params['after']) if request.query_params.get('after') else None
+            limit = int(request.query_params.get('limit', CHANGES_LIMIT))
+        except ValueError:
+            return Response({'error': 'since, after and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if since < 0:
+            return Response({'error': 'since must not be negative'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response(route_changes(since, after, limit))
+        except ResyncRequired as e:
+            return Response({'error': str(e), 'resync': True}, status=status.HTTP_410_GONE)
+
+def _compute_optimisation(origin, destination, aircraft_type):
+    """
+    Find the requested route and its most efficient alternative.
+    Returns plain data (the response body plus the emission record to write) so that
+    concurrent requests for the same route can share one computation.
+    """
+    # The counts cost two queries, so they are only run when debug logging is on
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Looking up %s-%s', origin, destination, extra={
+            'event': 'optimise.lookup',
+            'total_routes': FlightRoute.objects.count(),
+            'pair_routes': FlightRoute.objects.named(origin, destination).count(),
+        })
+    
+    try:
+        # Find the requested route
+        original_route = FlightRoute.objects.named(origin, destination, aircraft_type).get()
+    except FlightRoute.DoesNotExist:
+        logger.info('Route not found: %s to %s with %s', origin, destination, aircraft_type, extra={
+            'event': 'optimise.not_found', 'origin': origin, 'destination': destination, 'aircraft_type': aircraft_type,
+        })
+        available_routes = list(FlightRoute.objects.named(origin, destination).values_list('aircraft_type', flat=True))
+        
+        # Suggest the closest served airports and routes instead of listing every one
+        alternatives = nearest_alternatives(origin, destination)
+        index = get_suggest_index()
+        available_origins = [item['name'] for item in alternatives['nearest_origins']] or \
+            [name for name, _ in index.suggest(origin, 'origin', limit=NOT_FOUND_SUGGESTIONS)] or \
+            index.top('origin', NOT_FOUND_SUGGESTIONS)
+        available_destinations = [item['name'] for item in alternatives['nearest_destinations']] or \
+            [name for name, _ in index.suggest(destination, 'destination', limit=NOT_FOUND_SUGGESTIONS)] or \
+            index.top('destination', NOT_FOUND_SUGGESTIONS)
+        
+        # Return available options rather than 404 error
+        return {
+            'emission_record': None,
+            'response': {
+                'error': f'Route not found: {origin} to {destination} with {aircraft_type}',
+                'available_aircraft': available_routes,
+                'suggestion': 'Try one of the available routes below',
+                'available_origins': available_origins,
+                'available_destinations': available_destinations,
+                **alternatives
+            },
+        }
+    
+    # Find optimization options
+    aircraft_options = compare_aircraft_efficiency(origin, destination)
+    logger.debug('Found route %s with %d aircraft options', original_route.id, len(aircraft_options),
+                 extra={'event': 'optimise.lookup', 'route_id': original_route.id, 'options': len(aircraft_options)})
+    
+    if aircraft_options and len(aircraft_options) > 0 and aircraft_options[0]['route'].id != original_route.id:
+        # We found a more efficient aircraft
+        optimized_route = aircraft_options[0]['route']
+        optimization = calculate_optimization(original_route, optimized_route)
+        
+        factor = current_factor()
+        return {
+            'emission_record': {
+                'route_id': original_route.id,
+                'co2_kg': estimate_emissions(
+                    original_route.fuel_consumption_kg,
+                    factor.co2_per_kg_fuel if factor else None
+                ),
+                'factor': factor,
+                'fuel_saved_kg': optimization['fuel_saved_kg'],
+                'percent_improvement': optimization['percent_improvement']
+            },
+            'response': {
+                'original_route': ROUTE_PLAN.one(original_route),
+                'optimized_route': ROUTE_PLAN.one(optimized_route),
+                'optimization': optimization
+            },
+        }
+    
+    # Apply default optimization
+    optimization = calculate_optimization(original_route)
+    
+    return {
+        'emission_record': None,
+        'response': {
+            'original_route': ROUTE_PLAN.one(original_route),
+            'optimization': optimization,
+            'message': 'No better aircraft found, applying standard optimization factor'
+        },
+    }
+
 class OptimiseFlightView(APIView):
     """API endpoint to optimize flight routes"""
+    renderer_classes = FAST_RENDERERS
     
     def post(self, request):
-        print("Received optimization request:", request.data)
         serializer = OptimiseFlightSerializer(data=request.data)
         
         if serializer.is_valid():
@@ -127,86 +306,48 @@ class OptimiseFlightView(APIView):
             destination = serializer.validated_data['destination']
             aircraft_type = serializer.validated_data['aircraft_type']
             
-            print(f"Finding route: {origin} to {destination} with {aircraft_type}")
-            
+            # Match the catalog spelling so "nairobi" finds NAIROBI without the not-found branch
+            index = get_suggest_index()
+            origin = index.resolve(origin, 'origin') or origin
+            destination = index.resolve(destination, 'destination') or destination
+            aircraft_type = index.resolve(aircraft_type, 'aircraft_type') or aircraft_type
+
+            # Only the resolved route is logged, never the raw request body
+            logger.info('Optimising %s to %s with %s', origin, destination, aircraft_type, extra={
+                'event': 'optimise.request', 'origin': origin, 'destination': destination, 'aircraft_type': aircraft_type,
+            })
+
             try:
-                # Check if route exists
-                routes_count = FlightRoute.objects.count()
-                print(f"Total routes in database: {routes_count}")
-                
-                available_routes = FlightRoute.objects.filter(
-                    origin=origin, 
-                    destination=destination
-                )
-                print(f"Available routes for {origin}-{destination}: {available_routes.count()}")
-                
-                # Find the requested route
-                original_route = FlightRoute.objects.get(
-                    origin=origin,
-                    destination=destination, 
-                    aircraft_type=aircraft_type
+                # Identical concurrent requests share a single lookup
+                result = coalesce(
+                    ('optimise', origin, destination, aircraft_type),
+                    lambda: _compute_optimisation(origin, destination, aircraft_type)
                 )
                 
-                print(f"Found original route: {original_route}")
+                # The emission record is still written once per request, batched in the background
+                if result['emission_record']:
+                    emission_writer.add(**result['emission_record'])
                 
-                # Find optimization options
-                aircraft_options = compare_aircraft_efficiency(origin, destination)
-                print(f"Aircraft options: {len(aircraft_options)}")
+                response = result['response']
+                if serializer.validated_data['uncertainty'] and 'original_route' in response:
+                    # The coalesced result is shared with other requests, so it is copied, not changed
+                    response = dict(response, uncertainty=optimisation_bands(
+                        response['original_route']['fuel_consumption_kg'],
+                        response['optimized_route']['fuel_consumption_kg'] if 'optimized_route' in response else None,
+                        samples=serializer.validated_data['samples'],
+                        seed=serializer.validated_data['seed'],
+                    ))
                 
-                if aircraft_options and len(aircraft_options) > 0 and aircraft_options[0]['route'].id != original_route.id:
-                    # We found a more efficient aircraft
-                    optimized_route = aircraft_options[0]['route']
-                    optimization = calculate_optimization(original_route, optimized_route)
+                # Return 200 even when the route is not found
+                return Response(response)
                     
-                    print(f"Found optimized route: {optimized_route}")
-                    
-                    # Create emission record
-                    EmissionRecord.objects.create(
-                        route=original_route,
-                        co2_kg=estimate_emissions(original_route.fuel_consumption_kg),
-                        fuel_saved_kg=optimization['fuel_saved_kg'],
-                        percent_improvement=optimization['percent_improvement']
-                    )
-                    
-                    return Response({
-                        'original_route': FlightRouteSerializer(original_route).data,
-                        'optimized_route': FlightRouteSerializer(optimized_route).data,
-                        'optimization': optimization
-                    })
-                else:
-                    # Apply default optimization
-                    optimization = calculate_optimization(original_route)
-                    
-                    print(f"No better aircraft found, applying standard optimization factor")
-                    
-                    return Response({
-                        'original_route': FlightRouteSerializer(original_route).data,
-                        'optimization': optimization,
-                        'message': 'No better aircraft found, applying standard optimization factor'
-                    })
-                    
-            except FlightRoute.DoesNotExist:
-                print(f"Route not found: {origin} to {destination} with {aircraft_type}")
-                available_routes = list(FlightRoute.objects.filter(origin=origin, destination=destination).values_list('aircraft_type', flat=True))
-                available_origins = list(FlightRoute.objects.values_list('origin', flat=True).distinct())
-                available_destinations = list(FlightRoute.objects.values_list('destination', flat=True).distinct())
-                
-                # Return available options rather than 404 error
-                return Response({
-                    'error': f'Route not found: {origin} to {destination} with {aircraft_type}',
-                    'available_aircraft': available_routes,
-                    'suggestion': 'Try one of the available routes below',
-                    'available_origins': available_origins,
-                    'available_destinations': available_destinations
-                }, status=status.HTTP_200_OK)  # Return 200 instead of 404
-                
             except Exception as e:
-                import traceback
-                print(f"Error in OptimiseFlightView: {str(e)}")
-                print(traceback.format_exc())
+                logger.exception('Error in OptimiseFlightView', extra={'event': 'optimise.error'})
                 return Response({'error': f'Optimization calculation error: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         else:
-            print(f"Serializer errors: {serializer.errors}")
+            logger.info('Invalid optimisation request', extra={
+                'event': 'optimise.invalid', 'fields': sorted(serializer.errors),
+            })
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class PassengerScoreView(APIView):
@@ -214,8 +355,7 @@ class PassengerScoreView(APIView):
     
     def get(self, request):
         if request.user.is_authenticated:
-            score, created = PassengerEcoScore.objects.get_or_create(user=request.user)
-            serializer = PassengerEcoScoreSerializer(score)
+            serializer = PassengerEcoScoreSerializer(_eco_score(request.user))
             return Response(serializer.data)
         return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
     
@@ -248,25 +388,74 @@ class PassengerScoreView(APIView):
         
         return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
 
+class FleetAssignmentView(APIView):
+    """
+    API endpoint assigning a limited fleet to routes with the lowest total CO2
+    POST {"fleet": {"Airbus A320": 12, ...}, "demand": [{"origin", "destination", "flights"}, ...]}
+    Optional: "objective" (co2|fuel), "hours_per_aircraft", "integer" (default true), "time_limit"
+    """
+    renderer_classes = FAST_RENDERERS
+    
+    def post(self, request):
+        if not request.user.is_authenticated:
+            return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+        data = request.data
+        try:
+            result = assign_fleet(
+                data.get('fleet'),
+                data.get('demand'),
+                objective=data.get('objective', 'co2'),
+                hours_per_aircraft=float(data.get('hours_per_aircraft', FLEET_HOURS_PER_AIRCRAFT)),
+                integer=bool(data.get('integer', True)),
+                # Callers may ask for less time, never more
+                time_limit=min(float(data.get('time_limit', FLEET_TIME_LIMIT)), FLEET_TIME_LIMIT),
+            )
+        except (FleetInputError, TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+class EfficiencyMatrixView(APIView):
+    """
+    API endpoint with the best kg-per-km and aircraft for every origin/destination pair
+    ?layout=dense (city x city lists) or ?layout=csr (compressed sparse rows); the default
+    is dense up to EFFICIENCY_MATRIX_MAX_DENSE cities. Send If-None-Match with the ETag to poll.
+    """
+    renderer_classes = FAST_RENDERERS
+    
+    def get(self, request):
+        matrix = get_matrix()
+        etag = matrix.etag
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        
+        layout = request.query_params.get('layout', 'auto')
+        cities = len(matrix.arrays()[0])
+        if layout == 'auto':
+            layout = 'dense' if cities <= MAX_DENSE_CITIES else 'csr'
+        if layout == 'dense':
+            if cities > MAX_DENSE_CITIES:
+                return Response(
+                    {'error': f'{cities} cities is too many for a dense matrix, use layout=csr'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            data = matrix.dense()
+        elif layout == 'csr':
+            data = matrix.sparse()
+        else:
+            return Response({'error': 'layout must be dense or csr'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data, headers={'ETag': etag})
+
 @login_required
 def dashboard(request):
     """Render the user dashboard page"""
     # Get user's eco score
-    eco_score, created = PassengerEcoScore.objects.get_or_create(user=request.user)
+    eco_score = _eco_score(request.user)
 
-    # Get recent emission records
-    recent_emissions = EmissionRecord.objects.filter(
-        route__in=FlightRoute.objects.all()
-    ).order_by('-calculation_date')[:5]
-
-    # Calculate total emissions saved
-    total_saved = recent_emissions.aggregate(
-        total_co2=models.Sum('co2_kg'),
-        total_fuel=models.Sum('fuel_saved_kg')
-    )
+    # Get recent emission records and the emissions saved by them
+    recent_emissions, total_saved = _recent_emissions(5)
 
     # Find most efficient routes
-    efficient_routes = FlightRoute.objects.all().order_by('fuel_consumption_kg')[:5]
+    efficient_routes = _lowest_routes('fuel_consumption_kg', 5)
 
     context = {
         'eco_score': eco_score,
@@ -308,11 +497,7 @@ def test_routes(request):
 
 def check_route(request, origin, destination, aircraft_type):
     """Simple API endpoint to check if a specific route exists"""
-    route_exists = FlightRoute.objects.filter(
-        origin__iexact=origin,
-        destination__iexact=destination,
-        aircraft_type__iexact=aircraft_type
-    ).exists()
+    route_exists = FlightRoute.objects.named(origin, destination, aircraft_type).exists()
     
     return JsonResponse({
         'origin': origin,
@@ -321,11 +506,35 @@ def check_route(request, origin, destination, aircraft_type):
         'route_exists': route_exists
     })
 
+def suggest(request):
+    """
+    Typeahead API endpoint for cities and aircraft types
+    ?q=<prefix>&field=origin|destination|aircraft_type|city&limit=<n>
+    """
+    import time
+    started = time.perf_counter()
+
+    field = request.GET.get('field', CITY)
+    if field not in SUGGEST_FIELDS + (CITY,):
+        return JsonResponse({'error': f'Unknown field: {field}'}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+
+    query = request.GET.get('q', '')
+    results = get_suggest_index().suggest(query, field=field, limit=limit)
+
+    return JsonResponse({
+        'query': query,
+        'field': field,
+        'results': [{'value': name, 'routes': routes} for name, routes in results],
+        'took_ms': round((time.perf_counter() - started) * 1000, 3),
+    })
+
 def available_routes(request):
     """API endpoint to get all available route combinations"""
-    origins = list(FlightRoute.objects.values_list('origin', flat=True).distinct())
-    destinations = list(FlightRoute.objects.values_list('destination', flat=True).distinct())
-    aircraft_types = list(FlightRoute.objects.values_list('aircraft_type', flat=True).distinct())
+    catalog = _route_catalog()
     
     # Get a sample of existing routes (limit to 20 to avoid huge response)
     sample_routes = [
@@ -333,23 +542,21 @@ def available_routes(request):
         for route in FlightRoute.objects.all()[:20]
     ]
     
-    # Count routes per origin-destination pair
-    route_counts = {}
-    for route in FlightRoute.objects.all():
-        key = f"{route.origin} → {route.destination}"
-        if key in route_counts:
-            route_counts[key] += 1
-        else:
-            route_counts[key] = 1
-            
+    # Count routes per origin-destination pair, in the order the pairs were first added
+    route_counts = (
+        FlightRoute.objects.values('origin', 'destination')
+        .annotate(count=models.Count('id'), first=models.Min('id'))
+        .order_by('first')[:20]
+    )
+    
     # Format the counts for display
-    formatted_counts = [f"{key}: {count} aircraft options" for key, count in route_counts.items()]
+    formatted_counts = [f"{row['origin']} → {row['destination']}: {row['count']} aircraft options" for row in route_counts]
     
     return JsonResponse({
-        'total_routes': FlightRoute.objects.count(),
-        'origins': origins,
-        'destinations': destinations, 
-        'aircraft_types': aircraft_types,
+        'total_routes': catalog['total_routes'],
+        'origins': catalog['origins'],
+        'destinations': catalog['destinations'],
+        'aircraft_types': catalog['aircraft_types'],
         'sample_routes': sample_routes,
         'route_counts': formatted_counts[:20]  # Limit to top 20
     })
@@ -359,9 +566,8 @@ def verify_routes(request):
     API endpoint to verify all route combinations exist and create missing ones
     """
     # Get all distinct origins, destinations and aircraft types
-    origins = list(FlightRoute.objects.values_list('origin', flat=True).distinct())
-    destinations = list(FlightRoute.objects.values_list('destination', flat=True).distinct())
-    aircraft_types = list(FlightRoute.objects.values_list('aircraft_type', flat=True).distinct())
+    catalog = _route_catalog()
+    origins, destinations, aircraft_types = catalog['origins'], catalog['destinations'], catalog['aircraft_types']
     
     # Calculate total possible combinations
     total_possible = len(origins) * len(destinations) * len(aircraft_types)
@@ -369,7 +575,7 @@ def verify_routes(request):
     total_possible -= len(origins) * len(aircraft_types)  # Skip routes to self
     
     # Count existing routes
-    existing_count = FlightRoute.objects.count()
+    existing_count = catalog['total_routes']
     
     # Check for missing routes
     missing_count = total_possible - existing_count
@@ -390,58 +596,43 @@ def verify_routes(request):
         'status': 'All routes exist' if missing_count <= 0 else f'{missing_count} routes missing'
     }
     
-    # Allow immediate fixing if requested
+    # Allow fixing if requested - route generation runs as a background job
     if request.GET.get('fix') == 'true':
-        from django.core.management import call_command
-        call_command('ensure_all_routes', force=True)
-        response['action'] = 'Routes fixed - refresh page to verify'
+        job = enqueue_job('ensure_all_routes', payload={'force': True}, user=request.user, unique=True)
+        response['action'] = 'Route generation queued - poll the job status URL and refresh when it has finished'
+        response['job'] = {
+            'id': job.id,
+            'status': job.status,
+            'status_url': reverse('optimiser:job-status', args=[job.id]),
+        }
     
     return JsonResponse(response)
 
 @login_required
 def analytics_dashboard(request):
-    """Render the advanced analytics dashboard"""
-    
-    # Get historical emission data
-    all_emissions = EmissionRecord.objects.all().order_by('-calculation_date')
+    """
+    Render the advanced analytics dashboard.
+    With ?approx=1 the totals and monthly trend are estimated from a sample (or taken
+    from a recent exact result) instead of scanning every emission record.
+    """
+    summary = analytics_summary(approximate=request.GET.get('approx') == '1')
     
     # Calculate total impact
-    total_co2_saved = all_emissions.aggregate(total=models.Sum('co2_kg'))['total'] or 0
-    total_fuel_saved = all_emissions.aggregate(total=models.Sum('fuel_saved_kg'))['total'] or 0
+    total_co2_saved = summary['total_co2_kg']['value']
+    total_fuel_saved = summary['total_fuel_saved_kg']['value']
     
     # Calculate equivalent environmental impact
     trees_planted = int(total_co2_saved / 21)  # 1 tree absorbs ~21kg CO2 annually
     car_km_avoided = int(total_co2_saved * 4.3)  # ~230g CO2 per km for average car
     
     # Most efficient routes
-    efficient_routes = FlightRoute.objects.all().annotate(
-        efficiency=models.F('fuel_consumption_kg') / models.F('distance_km')
-    ).order_by('efficiency')[:10]
+    efficient_routes = _lowest_routes('efficiency_kg_per_km', 10)
     
     # Monthly savings trends (last 12 months)
-    from django.db.models.functions import TruncMonth
-    monthly_data = EmissionRecord.objects.annotate(
-        month=TruncMonth('calculation_date')
-    ).values('month').annotate(
-        co2_saved=models.Sum('co2_kg'),
-        fuel_saved=models.Sum('fuel_saved_kg'),
-        count=models.Count('id')
-    ).order_by('-month')[:12]
-    
-    # Top aircraft by efficiency
-    aircraft_efficiency = {}
-    for route in FlightRoute.objects.all():
-        aircraft = route.aircraft_type
-        if aircraft not in aircraft_efficiency:
-            aircraft_efficiency[aircraft] = []
-        aircraft_efficiency[aircraft].append(route.fuel_consumption_kg / route.distance_km)
-    
-    # Calculate average efficiency for each aircraft
-    for aircraft, values in aircraft_efficiency.items():
-        aircraft_efficiency[aircraft] = sum(values) / len(values)
-    
-    # Sort by efficiency (lower is better)
-    top_aircraft = sorted(aircraft_efficiency.items(), key=lambda x: x[1])[:5]
+    monthly_data = summary['monthly']
+    
+    # Top aircraft by average efficiency (lower is better), maintained as routes change
+    top_aircraft = _top_aircraft(5)
     
     context = {
         'total_co2_saved': total_co2_saved,
@@ -449,165 +640,32 @@ def analytics_dashboard(request):
         'trees_planted': trees_planted,
         'car_km_avoided': car_km_avoided,
         'efficient_routes': efficient_routes,
-        'monthly_data': list(monthly_data),
+        'monthly_data': json.dumps(monthly_data),
         'top_aircraft': top_aircraft,
-        'emissions_count': all_emissions.count(),
+        'emissions_count': int(summary['count']['value']),
+        'summary': summary,
     }
     
     return render(request, 'optimiser/analytics_dashboard.html', context)
 
 @login_required
 def generate_report(request):
-    """Generate a sustainability report"""
+    """Queue a sustainability report and show its progress until the PDF is ready"""
     try:
-        # Try to import reportlab
-        from reportlab.lib.pagesizes import letter
-        from reportlab.lib import colors
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import inch
+        # Check reportlab is available before queueing the job
+        import reportlab  # noqa: F401
     except ImportError:
         # If reportlab is not available, show an error page with installation instructions
         return render(request, 'optimiser/report_error.html', {
             'error': "Missing required package: reportlab",
             'instructions': "Please install the reportlab package with: pip install reportlab"
         })
-        
-    from django.http import HttpResponse
-    import io
-    from datetime import datetime
-    
-    # Create a file-like buffer to receive PDF data
-    buffer = io.BytesIO()
-    
-    # Create the PDF object, using the buffer as its "file"
-    doc = SimpleDocTemplate(
-        buffer, 
-        pagesize=letter,
-        rightMargin=72, 
-        leftMargin=72,
-        topMargin=72, 
-        bottomMargin=72
-    )
-    
-    # Create styles
-    styles = getSampleStyleSheet()
-    title_style = styles['Title']
-    heading_style = styles['Heading1']
-    subheading_style = styles['Heading2']
-    normal_style = styles['Normal']
-    
-    # Add custom style for the green text
-    green_style = ParagraphStyle(
-        'GreenText', 
-        parent=normal_style,
-        textColor=colors.green
-    )
-    
-    # Container for elements to build the PDF
-    elements = []
-    
-    # Add title
-    elements.append(Paragraph("Flight Emissions Sustainability Report", title_style))
-    elements.append(Spacer(1, 0.25*inch))
-    
-    # Add date
-    elements.append(Paragraph(f"Generated on: {datetime.now().strftime('%B %d, %Y')}", normal_style))
-    elements.append(Spacer(1, 0.5*inch))
-    
-    # Add executive summary
-    elements.append(Paragraph("Executive Summary", heading_style))
-    
-    # Get summary data
-    total_co2_saved = EmissionRecord.objects.aggregate(total=models.Sum('co2_kg'))['total'] or 0
-    total_fuel_saved = EmissionRecord.objects.aggregate(total=models.Sum('fuel_saved_kg'))['total'] or 0
-    flights_optimized = EmissionRecord.objects.count()
-    
-    summary_text = f"""
-    This report summarizes the environmental impact of flight optimization activities.
-    To date, we have optimized {flights_optimized} flights, resulting in:
-    
-    • <b>{total_co2_saved:.2f} kg</b> of CO₂ emissions saved
-    • <b>{total_fuel_saved:.2f} kg</b> of aviation fuel saved
-    
-    This is equivalent to planting approximately <b>{int(total_co2_saved/21)}</b> trees or removing <b>{int(total_co2_saved/4600)}</b> cars from the road for one year.
-    """
-    
-    elements.append(Paragraph(summary_text, normal_style))
-    elements.append(Spacer(1, 0.25*inch))
-    
-    # Add most efficient routes section
-    elements.append(Paragraph("Most Efficient Routes", heading_style))
-    
-    efficient_routes = FlightRoute.objects.all().annotate(
-        efficiency=models.F('fuel_consumption_kg') / models.F('distance_km')
-    ).order_by('efficiency')[:5]
-    
-    # Create data for the table
-    route_data = [['Route', 'Aircraft', 'Distance (km)', 'Efficiency (kg/km)']]
-    
-    for route in efficient_routes:
-        efficiency = route.fuel_consumption_kg / route.distance_km
-        route_data.append([
-            f"{route.origin} → {route.destination}",
-            route.aircraft_type,
-            f"{route.distance_km}",
-            f"{efficiency:.2f}"
-        ])
-    
-    # Create the table
-    table = Table(route_data, colWidths=[2*inch, 1.5*inch, 1*inch, 1.5*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgreen),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(table)
-    elements.append(Spacer(1, 0.25*inch))
     
-    # Add recommendations
-    elements.append(Paragraph("Recommendations for Further Improvements", heading_style))
-    
-    recommendations = """
-    1. <b>Fleet Modernization:</b> Consider newer aircraft models with better fuel efficiency metrics.
-    
-    2. <b>Operational Optimizations:</b> Implement continuous descent approaches and reduced engine taxi procedures.
-    
-    3. <b>Route Planning:</b> Utilize meteorological data to plan routes that take advantage of favorable winds.
-    
-    4. <b>Sustainable Aviation Fuel:</b> Explore opportunities to incorporate sustainable aviation fuels into operations.
-    """
-    
-    elements.append(Paragraph(recommendations, normal_style))
-    elements.append(Spacer(1, 0.5*inch))
-    
-    # Certification statement
-    certification = """
-    This report is generated by the GreenFlight Optimizer platform. The data and analysis provided are based on industry-standard 
-    emissions calculations and actual flight data. This report can be used for internal sustainability tracking and external 
-    environmental impact reporting.
-    """
-    
-    elements.append(Paragraph(certification, green_style))
-    
-    # Build the PDF
-    doc.build(elements)
-    
-    # Get the value of the BytesIO buffer
-    pdf = buffer.getvalue()
-    buffer.close()
-    
-    # Create the HTTP response
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="flight_sustainability_report.pdf"'
-    response.write(pdf)
-    
-    return response
+    # ?approx=1 builds the report from sampled totals; month-end reports should use the exact default
+    payload = {'approximate': True} if request.GET.get('approx') == '1' else None
+    # Reloading the page returns the report already on its way instead of queueing another
+    job = enqueue_job('generate_report', payload, user=request.user, unique=True)
+    return render(request, 'optimiser/report_status.html', {'job': job})
 
 @login_required
 def predictive_analysis(request):
@@ -686,15 +744,15 @@ def predictive_analysis(request):
                 monthly_improvement = predicted_month_avg - current_month_avg
                 
                 # Get best aircraft recommendations based on data
-                best_aircraft = list(FlightRoute.objects.values('aircraft_type').annotate(
-                    avg_efficiency=models.Avg(models.F('fuel_consumption_kg') / models.F('distance_km'))
-                ).order_by('avg_efficiency')[:3].values_list('aircraft_type', flat=True))
+                best_aircraft = list(AircraftEfficiency.objects.filter(
+                    avg_efficiency_kg_per_km__isnull=False
+                ).order_by('avg_efficiency_kg_per_km').values_list('aircraft_type', flat=True)[:3])
             
             except ImportError:
                 # Handle case where scikit-learn is not available
                 predictions = [co2_values[-1] * 1.1 if co2_values else 100] * 6
                 monthly_improvement = 50
-                best_aircraft = list(FlightRoute.objects.values_list('aircraft_type', flat=True).distinct())[:3]
+                best_aircraft = list(AircraftType.objects.in_use().values_list('name', flat=True)[:3])
         else:
             # Not enough data for predictions
             predictions = [0] * 6
@@ -720,13 +778,94 @@ def predictive_analysis(request):
         })
             
     except Exception as e:
-        import traceback
-        print(traceback.format_exc())
+        logger.exception('Error generating predictive analysis', extra={'event': 'predictive_analysis.error'})
         return JsonResponse({
             'error': str(e),
             'message': 'Error generating predictive analysis'
         }, status=500)
 
+@login_required
+def analytics_uncertainty(request):
+    """
+    API endpoint for P5/P50/P95 of total CO2 and savings over all emission records
+    ?samples=N (default 10000) and ?seed= for reproducible draws
+    """
+    try:
+        samples = int(request.GET.get('samples', UNCERTAINTY_SAMPLES))
+        seed = int(request.GET['seed']) if request.GET.get('seed') else None
+    except ValueError:
+        return JsonResponse({'error': 'samples and seed must be integers'}, status=400)
+    if seed is not None and seed < 0:
+        return JsonResponse({'error': 'seed must not be negative'}, status=400)
+    return JsonResponse(analytics_bands(samples, seed))
+
+@login_required
+def forecasts(request):
+    """
+    API endpoint for stored monthly CO2 forecasts with prediction intervals
+    ?level=TOTAL|ROUTE|AIRCRAFT, optionally filtered by origin, destination or aircraft_type
+    """
+    level = request.GET.get('level', 'TOTAL').upper()
+    if level not in dict(EmissionForecast.LEVEL_CHOICES):
+        return JsonResponse({'error': f'Unknown level: {level}'}, status=400)
+
+    rows = EmissionForecast.objects.filter(level=level)
+    for field in ('origin', 'destination', 'aircraft_type'):
+        value = request.GET.get(field)
+        if value:
+            rows = rows.filter(**{f'{field}__iexact': value})
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 50)), 1), 500)
+    except ValueError:
+        limit = 50
+    # Each series has one row per forecast month
+    horizon = rows.values('month').distinct().count() or 1
+    series = forecast_payload(rows.order_by(*SERIES_ORDER)[:limit * horizon])
+
+    return JsonResponse({
+        'level': level,
+        'count': len(series),
+        'series': series,
+    })
+
+def _visible_jobs(request):
+    """Jobs the user may see: their own, or all jobs for staff. Jobs without a creator come from commands and are staff-only."""
+    jobs = Job.objects.defer('artifact')
+    if request.user.is_staff:
+        return jobs
+    if request.user.is_authenticated:
+        return jobs.filter(created_by=request.user)
+    return jobs.none()
+
+def job_list(request):
+    """API endpoint listing recent background jobs"""
+    jobs = _visible_jobs(request).order_by('-id')
+    kind = request.GET.get('kind')
+    if kind:
+        jobs = jobs.filter(kind=kind)
+    return JsonResponse({'jobs': [job_status(job) for job in jobs[:50]]})
+
+def job_detail(request, job_id):
+    """API endpoint reporting the status and progress of a background job"""
+    job = get_object_or_404(_visible_jobs(request), pk=job_id)
+    data = job_status(job)
+    if job.kind == 'generate_report' and job.status == 'SUCCEEDED':
+        data['download_url'] = reverse('optimiser:job-download', args=[job.id])
+    return JsonResponse(data)
+
+def job_download(request, job_id):
+    """Download the file produced by a finished background job"""
+    job = get_object_or_404(_visible_jobs(request), pk=job_id, status='SUCCEEDED')
+    artifact = Job.objects.filter(pk=job.pk).values_list('artifact', flat=True).first()
+    if not artifact:
+        raise Http404("This job did not produce a file")
+    
+    filename = (job.result or {}).get('filename', f'job_{job.id}.pdf')
+    response = HttpResponse(bytes(artifact), content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 def health_check(request):
     """Simple health check endpoint for deployment monitoring"""
     from django.http import JsonResponse
@@ -757,5 +896,23 @@ def health_check(request):
     return JsonResponse({
         "status": "healthy",
         "database": db_status,
+        "emission_writer": emission_writer.stats(),
+        "warmup": last_warmup_report(),
         "server_time": str(datetime.now()),
     })
+
+@staff_member_required
+def profile_list(request):
+    """Staff page listing recent request and command profiles"""
+    return render(request, 'optimiser/profiles.html', {
+        'profiles': list_profiles(),
+        'profile_dir': PROFILE_DIR,
+    })
+
+@staff_member_required
+def profile_download(request, profile_id, filename):
+    """Download the raw pstats, folded stacks or tracemalloc file of a profile"""
+    path = profile_file(profile_id, filename)
+    if path is None:
+        raise Http404("Profile file not found")
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename)
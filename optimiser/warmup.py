@@ -0,0 +1,128 @@
+"""
+Warm-up run in the gunicorn master before workers fork (see gunicorn.conf.py).
+
+With preload_app the master imports the application once. This module then does
+the slow first-request work there: importing numpy, sklearn and ReportLab,
+loading every URLconf and view module, compiling the optimiser templates into the
+cached template loader, and building the catalog indexes and the efficiency
+matrix. Forked workers inherit all of it copy-on-write. The database connections opened along the way are
+closed again, because a connection must never be shared across a fork.
+
+The timing of each step is kept in last_report() and shown by /health/.
+"""
+import importlib
+import logging
+import os
+import time
+
+from django.apps import apps
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+# Imported lazily by views, reports, forecasts and the nearest-airport search
+HEAVY_MODULES = [
+    'numpy',
+    'sklearn.linear_model',
+    'sklearn.neighbors',
+    'scipy.stats',
+    'reportlab.platypus',
+    'reportlab.lib.styles',
+    'reportlab.lib.pagesizes',
+    'pandas',
+]
+
+_report = None
+
+
+def _import_modules():
+    loaded = []
+    for name in HEAVY_MODULES:
+        try:
+            importlib.import_module(name)
+            loaded.append(name)
+        except ImportError:
+            logger.info('Warm-up: %s is not installed, skipping', name)
+    return f'{len(loaded)}/{len(HEAVY_MODULES)} modules'
+
+
+def _load_urlconf():
+    # Resolving the URLconf imports every view module and the modules they import
+    resolver = get_resolver()
+    resolver.reverse_dict
+    return f'{len(resolver.url_patterns)} url patterns'
+
+
+def _compile_templates():
+    template_dir = os.path.join(apps.get_app_config('optimiser').path, 'templates', 'optimiser')
+    names = sorted(name for name in os.listdir(template_dir) if name.endswith('.html'))
+    for name in names:
+        # get_template keeps the compiled template in the cached loader
+        get_template(f'optimiser/{name}')
+    return f'{len(names)} templates'
+
+
+def _build_catalogs():
+    from .factors import current_factor
+    from .geo import get_geo_index
+    from .matrix import get_matrix
+    from .search import get_index
+
+    index = get_index()
+    get_geo_index()
+    current_factor()
+    get_matrix().arrays()
+    return f'{len(index.top("city", None))} cities indexed'
+
+
+STEPS = [
+    ('imports', _import_modules),
+    ('urlconf', _load_urlconf),
+    ('templates', _compile_templates),
+    ('catalogs', _build_catalogs),
+]
+
+
+def warm_up(log=None):
+    """
+    Run every warm-up step and return the timing report. A failing step is logged and
+    skipped: a cold cache only makes the first requests slower, so it must not stop the server.
+    """
+    global _report
+    log = log or logger.info
+    started = time.perf_counter()
+    steps = []
+    for name, step in STEPS:
+        step_started = time.perf_counter()
+        try:
+            detail = step()
+            ok = True
+        except Exception as e:
+            detail = f'failed: {e}'
+            ok = False
+            logger.exception('Warm-up step %s failed', name)
+        steps.append({
+            'step': name,
+            'ms': round((time.perf_counter() - step_started) * 1000, 1),
+            'ok': ok,
+            'detail': detail,
+        })
+    # Workers must open their own connections
+    connections.close_all()
+
+    _report = {
+        'pid': os.getpid(),
+        'total_ms': round((time.perf_counter() - started) * 1000, 1),
+        'steps': steps,
+    }
+    log('Warm-up finished in %.0f ms: %s' % (
+        _report['total_ms'], ', '.join(f"{s['step']} {s['ms']:.0f} ms ({s['detail']})" for s in steps)
+    ))
+    return _report
+
+
+def last_report():
+    """Timing report of the warm-up this process ran or inherited, or None"""
+    return _report
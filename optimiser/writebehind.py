@@ -0,0 +1,186 @@
+"""
+Write-behind buffering for high-volume inserts.
+
+Rows are queued in memory and written with bulk_create by a background thread
+whenever the batch size or flush interval is reached, and once more when the
+worker process exits. The queue is bounded: when it is full callers block for a
+short time and the row is dropped (and counted) if space does not free up.
+A batch the database rejects is retried row by row, so one bad row does not
+lose the others.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections, connection
+
+from .models import EmissionRecord
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Bounded in-memory queue of unsaved model instances flushed in batches"""
+
+    def __init__(self, model, max_size=10000, batch_size=500, flush_interval=2.0, put_timeout=0.5, enabled=True):
+        self.model = model
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.enabled = enabled
+
+        self._start_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ['enqueued', 'written', 'dropped', 'failed_flushes', 'failed_rows'], 0
+        )
+        self._reset()
+
+    def _reset(self):
+        # Called again after a fork: the parent's thread does not exist in the child
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.max_size)
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._reset()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f'write-behind-{self.model._meta.model_name}', daemon=True
+                )
+                self._thread.start()
+
+    def _count(self, counter, amount=1):
+        with self._stats_lock:
+            self._counters[counter] += amount
+
+    def add(self, **fields):
+        """
+        Queue a new row for writing. The instance is built here, so field defaults
+        such as the creation time are those of the call, not of the flush. Returns
+        False if the row was dropped because the buffer stayed full for longer than
+        put_timeout.
+        """
+        if not self.enabled:
+            self.model.objects.create(**fields)
+            self._count('written')
+            return True
+
+        self._ensure_started()
+        try:
+            self._queue.put(self.model(**fields), timeout=self.put_timeout)
+        except queue.Full:
+            self._count('dropped')
+            logger.warning('Write-behind buffer for %s is full, dropping row', self.model.__name__)
+            return False
+
+        self._count('enqueued')
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """Write everything currently queued, returns the number of rows written"""
+        written = 0
+        with self._flush_lock:
+            close_old_connections()
+            while True:
+                batch = self._drain()
+                if not batch:
+                    break
+                try:
+                    self.model.objects.bulk_create(batch)
+                    written += len(batch)
+                    self._count('written', len(batch))
+                except Exception:
+                    self._count('failed_flushes')
+                    logger.exception('Failed to flush %d %s rows, retrying them one by one',
+                                     len(batch), self.model.__name__)
+                    rows, healthy = self._write_rows(batch)
+                    written += rows
+                    if not healthy:
+                        break
+        return written
+
+    def _write_rows(self, batch):
+        """
+        Write a batch that failed as a whole one row at a time, so a bad row only
+        loses itself. Returns (rows written, False if the database itself failed).
+        """
+        # Drop a possibly broken connection so the rows reconnect
+        connection.close()
+        written = 0
+        for index, row in enumerate(batch):
+            try:
+                self.model.objects.bulk_create([row])
+            except (IntegrityError, DataError):
+                self._count('failed_rows')
+                logger.exception('Dropping %s row that cannot be written', self.model.__name__)
+                continue
+            except Exception:
+                # Not the row: the rest would fail the same way
+                self._count('failed_rows', len(batch) - index)
+                logger.exception('Failed to write %d %s rows', len(batch) - index, self.model.__name__)
+                connection.close()
+                return written, False
+            written += 1
+            self._count('written')
+        return written, True
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+        connection.close()
+
+    def stop(self):
+        """Stop the background thread and flush what is left (used at worker shutdown)"""
+        if self._pid != os.getpid():
+            return
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self):
+        """Snapshot of the buffer counters and current queue depth"""
+        with self._stats_lock:
+            stats = dict(self._counters)
+        stats['queued'] = self._queue.qsize() if self._pid == os.getpid() else 0
+        return stats
+
+
+_options = getattr(settings, 'EMISSION_WRITE_BEHIND', {})
+
+emission_writer = WriteBehindBuffer(
+    EmissionRecord,
+    max_size=_options.get('MAX_SIZE', 10000),
+    batch_size=_options.get('BATCH_SIZE', 500),
+    flush_interval=_options.get('FLUSH_INTERVAL', 2.0),
+    put_timeout=_options.get('PUT_TIMEOUT', 0.5),
+    enabled=_options.get('ENABLED', True),
+)
+
+atexit.register(emission_writer.stop)